@@ -6,28 +6,54 @@ Writes to MongoDB (default DB: TW_Stock; collections: 每月營收 / 公司基
 
 Usage:
     py -3 python/fetch_monthly_revenue.py --year 2024 --month 11 --markets sii,otc,rotc
-Defaults to previous month and all three markets.
+    py -3 python/fetch_monthly_revenue.py --parser lxml --no-raw
+    py -3 python/fetch_monthly_revenue.py --from 2014-01 --to 2024-12 --workers 4 --rate 2
+Defaults to previous month and all three markets. --from/--to backfills every month in the range
+(inclusive) over one pooled session; requests run concurrently under --rate and writes are done by
+a background writer while the next pages download. Afterwards the touched companies are re-materialized
+into 每月營收_衍生 (python/revenue_derived.py) unless --no-derived is given.
 
 Dependencies:
     pip install requests beautifulsoup4 pymongo
+    pip install selectolax   # optional, fastest HTML backend (lxml is used next, then BeautifulSoup)
 """
 
 from __future__ import annotations
 
 import argparse
 import datetime as dt
-from typing import List, Dict, Any
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, List, Dict, Any, Optional, Tuple
 
 import requests
 import urllib3
 from bs4 import BeautifulSoup
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from revenue_coverage import RevenueCoverage
+from revenue_derived import DERIVED_COLLECTION, RevenueDerived
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:  # optional backend
+    SelectolaxParser = None
+
+try:
+    from lxml import html as lxml_html
+except ImportError:  # optional backend
+    lxml_html = None
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-MOPS_URL = "https://mops.twse.com.tw/mops/web/ajax_t21sc04_ifrs"
+# override with MOPS_BASE_URL to point at a local stand-in server (benchmarks/fake_mops_server.py)
+MOPS_BASE_URL = os.getenv("MOPS_BASE_URL", "https://mops.twse.com.tw").rstrip("/")
+MOPS_URL = f"{MOPS_BASE_URL}/mops/web/ajax_t21sc04_ifrs"
 
 MARKET_LABEL = {
     "sii": "上市",
@@ -40,6 +66,10 @@ BASIC_COLLECTION = "公司基本資料"
 STOCK_PRICE_COLLECTION = "歷史股價"
 DEFAULT_DB = "TW_Stock"
 
+# HTML parser backend: auto / selectolax / lxml / bs4 (override with MOPS_HTML_PARSER)
+PARSER_BACKENDS = ("selectolax", "lxml", "bs4")
+DEFAULT_PARSER = os.getenv("MOPS_HTML_PARSER", "auto")
+
 
 def to_minguo(year: int) -> int:
     return year - 1911
@@ -71,11 +101,8 @@ def resolve_header_index(headers: List[str], keywords: List[str]) -> int:
     return -1
 
 
-def parse_table(table, meta: Dict[str, Any]) -> List[Dict[str, Any]]:
-    header_cells = table.find_all("th")
-    headers = [h.get_text(strip=True).replace("\xa0", " ") for h in header_cells]
-
-    idx = {
+def build_column_index(headers: List[str]) -> Dict[str, int]:
+    return {
         "stockId": resolve_header_index(headers, ["公司代號"]),
         "companyName": resolve_header_index(headers, ["公司名稱"]),
         "revenue": resolve_header_index(headers, ["營業收入", "當月", "本月", "本期"]),
@@ -86,16 +113,45 @@ def parse_table(table, meta: Dict[str, Any]) -> List[Dict[str, Any]]:
         "cumulativeChangePercent": resolve_header_index(headers, ["累計增減百分比", "累計年增率"]),
     }
 
+
+# (Mongo field, column index key) for the numeric columns
+NUMBER_FIELDS = (
+    ("營業收入", "revenue"),
+    ("去年同月營收", "revenueLastYear"),
+    ("營收年增率(%)", "revenueChangePercent"),
+    ("本年累計營收", "cumulativeRevenue"),
+    ("去年累計營收", "cumulativeRevenueLastYear"),
+    ("累計年增率(%)", "cumulativeChangePercent"),
+)
+
+
+def build_records(
+    headers: List[str],
+    rows: Iterable[list],
+    meta: Dict[str, Any],
+    text: Callable[[Any], str],
+    strip_text: Callable[[Any], str],
+    keep_raw: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Convert the data rows of one table into revenue records (backend independent).
+
+    rows yields the <td> cells of each row after the header row; text / strip_text return
+    a cell's text like BeautifulSoup get_text() / get_text(strip=True).
+    """
+    idx = build_column_index(headers)
+    stock_idx, name_idx = idx["stockId"], idx["companyName"]
+    numbers = tuple((field, idx[key]) for field, key in NUMBER_FIELDS)
+
     records: List[Dict[str, Any]] = []
-    for tr in table.find_all("tr")[1:]:
-        tds = tr.find_all("td")
+    for tds in rows:
         if not tds:
             continue
 
-        stock_id = tds[idx["stockId"]].get_text(strip=True) if idx["stockId"] >= 0 else ""
-        company_name = tds[idx["companyName"]].get_text(strip=True) if idx["companyName"] >= 0 else ""
+        stock_id = strip_text(tds[stock_idx]) if stock_idx >= 0 else ""
         if not stock_id or stock_id == "合計":
             continue
+        company_name = strip_text(tds[name_idx]) if name_idx >= 0 else ""
 
         rec = {
             # for query/upsert
@@ -106,21 +162,107 @@ def parse_table(table, meta: Dict[str, Any]) -> List[Dict[str, Any]]:
             # Chinese field names for Mongo document
             "公司代號": stock_id,
             "公司名稱": company_name,
-            "營業收入": parse_number(tds[idx["revenue"]].get_text()) if idx["revenue"] >= 0 else 0,
-            "去年同月營收": parse_number(tds[idx["revenueLastYear"]].get_text()) if idx["revenueLastYear"] >= 0 else 0,
-            "營收年增率(%)": parse_number(tds[idx["revenueChangePercent"]].get_text()) if idx["revenueChangePercent"] >= 0 else 0,
-            "本年累計營收": parse_number(tds[idx["cumulativeRevenue"]].get_text()) if idx["cumulativeRevenue"] >= 0 else 0,
-            "去年累計營收": parse_number(tds[idx["cumulativeRevenueLastYear"]].get_text()) if idx["cumulativeRevenueLastYear"] >= 0 else 0,
-            "累計年增率(%)": parse_number(tds[idx["cumulativeChangePercent"]].get_text()) if idx["cumulativeChangePercent"] >= 0 else 0,
-            "createdAt": dt.datetime.utcnow(),
-            "raw": {headers[i]: tds[i].get_text(strip=True) for i in range(min(len(headers), len(tds)))},
         }
+        for field, i in numbers:
+            rec[field] = parse_number(text(tds[i])) if i >= 0 else 0
+        rec["createdAt"] = dt.datetime.utcnow()
+        if keep_raw:
+            rec["raw"] = {headers[i]: strip_text(tds[i]) for i in range(min(len(headers), len(tds)))}
         records.append(rec)
 
     return records
 
 
-def make_session() -> requests.Session:
+def _bs4_text(el) -> str:
+    return el.get_text()
+
+
+def _bs4_strip_text(el) -> str:
+    return el.get_text(strip=True)
+
+
+def parse_table(table, meta: Dict[str, Any], keep_raw: bool = True) -> List[Dict[str, Any]]:
+    """Parse one BeautifulSoup <table> (bs4 backend)."""
+    headers = [h.get_text(strip=True).replace("\xa0", " ") for h in table.find_all("th")]
+    rows = (tr.find_all("td") for tr in table.find_all("tr")[1:])
+    return build_records(headers, rows, meta, _bs4_text, _bs4_strip_text, keep_raw)
+
+
+def _lxml_text(el) -> str:
+    return "".join(el.itertext())
+
+
+def _lxml_strip_text(el) -> str:
+    return "".join(s.strip() for s in el.itertext())
+
+
+def _iter_tables_lxml(html: str) -> Iterable[Tuple[List[str], Iterable[list]]]:
+    doc = lxml_html.fromstring(html)
+    for table in doc.iter("table"):
+        headers = [_lxml_strip_text(th).replace("\xa0", " ") for th in table.iter("th")]
+        rows = (list(tr.iter("td")) for tr in list(table.iter("tr"))[1:])
+        yield headers, rows
+
+
+def _selectolax_text(node) -> str:
+    return node.text(deep=True, separator="", strip=False)
+
+
+def _selectolax_strip_text(node) -> str:
+    return node.text(deep=True, separator="", strip=True)
+
+
+def _iter_tables_selectolax(html: str) -> Iterable[Tuple[List[str], Iterable[list]]]:
+    tree = SelectolaxParser(html)
+    for table in tree.css("table"):
+        headers = [_selectolax_strip_text(th).replace("\xa0", " ") for th in table.css("th")]
+        rows = (tr.css("td") for tr in table.css("tr")[1:])
+        yield headers, rows
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    backend = backend or DEFAULT_PARSER
+    if backend == "auto":
+        if SelectolaxParser is not None:
+            return "selectolax"
+        if lxml_html is not None:
+            return "lxml"
+        return "bs4"
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"unknown parser backend: {backend} (available: auto, {', '.join(PARSER_BACKENDS)})")
+    if backend == "selectolax" and SelectolaxParser is None:
+        raise ImportError("selectolax is not installed (pip install selectolax)")
+    if backend == "lxml" and lxml_html is None:
+        raise ImportError("lxml is not installed (pip install lxml)")
+    return backend
+
+
+def parse_html(
+    html: str, meta: Dict[str, Any], backend: Optional[str] = None, keep_raw: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Parse every table of an ajax_t21sc04_ifrs response.
+
+    backend: auto / selectolax / lxml / bs4 (default MOPS_HTML_PARSER, auto picks the fastest installed)
+    keep_raw: store the per-row {header: cell text} dict under "raw"
+    """
+    backend = resolve_backend(backend)
+    records: List[Dict[str, Any]] = []
+    if backend == "bs4":
+        for t in BeautifulSoup(html, "html.parser").find_all("table"):
+            records.extend(parse_table(t, meta, keep_raw))
+        return records
+
+    if backend == "selectolax":
+        tables, text, strip_text = _iter_tables_selectolax(html), _selectolax_text, _selectolax_strip_text
+    else:
+        tables, text, strip_text = _iter_tables_lxml(html), _lxml_text, _lxml_strip_text
+    for headers, rows in tables:
+        records.extend(build_records(headers, rows, meta, text, strip_text, keep_raw))
+    return records
+
+
+def make_session(pool_size: int = 10) -> requests.Session:
     session = requests.Session()
     retry = Retry(
         total=3,
@@ -128,80 +270,111 @@ def make_session() -> requests.Session:
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["POST"],
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
     return session
 
 
-def fetch_monthly_revenue(year: int, month: int, market: str) -> List[Dict[str, Any]]:
+def fetch_monthly_revenue(
+    year: int,
+    month: int,
+    market: str,
+    backend: Optional[str] = None,
+    keep_raw: bool = True,
+    session: Optional[requests.Session] = None,
+) -> List[Dict[str, Any]]:
     form = build_form(year, month, market)
-    session = make_session()
+    session = session or make_session()
     resp = session.post(
         MOPS_URL,
         data=form,
         headers={
             "Content-Type": "application/x-www-form-urlencoded",
-            "Referer": "https://mops.twse.com.tw/mops/web/t21sc04_ifrs",
+            "Referer": f"{MOPS_BASE_URL}/mops/web/t21sc04_ifrs",
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         },
         timeout=60,
         verify=False,  # disable SSL verification to avoid cert issues on some hosts
     )
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-    tables = soup.find_all("table")
-
-    all_records: List[Dict[str, Any]] = []
-    for t in tables:
-        all_records.extend(parse_table(t, {"year": year, "month": month, "market": market}))
-    return all_records
+    return parse_html(resp.text, {"year": year, "month": month, "market": market}, backend, keep_raw)
 
 
 def save_monthly_revenue(client: MongoClient, records: List[Dict[str, Any]]) -> int:
     if not records:
         return 0
     col = client[DEFAULT_DB][REVENUE_COLLECTION]
-    ops = []
-    for r in records:
-        ops.append(
-            {
-                "updateOne": {
-                    "filter": {"stockId": r["stockId"], "year": r["year"], "month": r["month"], "market": r["market"]},
-                    "update": {"$set": r},
-                    "upsert": True,
-                }
-            }
+    ops = [
+        UpdateOne(
+            {"stockId": r["stockId"], "year": r["year"], "month": r["month"], "market": r["market"]},
+            {"$set": r},
+            upsert=True,
         )
+        for r in records
+    ]
     result = col.bulk_write(ops, ordered=False)
     return result.upserted_count + result.modified_count
 
 
-def find_missing_companies(client: MongoClient, records: List[Dict[str, Any]]) -> List[str]:
-    basic_col = client[DEFAULT_DB][BASIC_COLLECTION]
-    all_companies = list(basic_col.find({}, {"stock_id": 1, "_id": 0}))
-    if not all_companies:
-        return []
-    revenue_ids = {r["stockId"] for r in records}
-    return [c["stock_id"] for c in all_companies if c.get("stock_id") not in revenue_ids]
+def revenue_coverage(client: MongoClient) -> RevenueCoverage:
+    return RevenueCoverage(client[DEFAULT_DB][REVENUE_COLLECTION], client[DEFAULT_DB][BASIC_COLLECTION])
+
+
+def revenue_derived(client: MongoClient) -> RevenueDerived:
+    return RevenueDerived(client[DEFAULT_DB][REVENUE_COLLECTION], client[DEFAULT_DB][DERIVED_COLLECTION])
 
 
-def run(year: int, month: int, markets: List[str], client: MongoClient):
+def flush_derived(derived: Optional[RevenueDerived]) -> None:
+    if derived is None:
+        return
+    started = time.perf_counter()
+    written = derived.flush()
+    print(f"Derived metrics: {written} documents updated in {time.perf_counter() - started:.1f}s")
+
+
+def find_missing_companies(client: MongoClient, year: int, month: int, markets: List[str]) -> List[str]:
+    """Companies in 公司基本資料 without a revenue row for year/month in their market (computed in MongoDB)."""
+    rows = revenue_coverage(client).report([(year, month)], markets=markets)
+    return sorted({code for row in rows for code in row["missing"]})
+
+
+def print_coverage(client: MongoClient, months: List[Tuple[int, int]], markets: List[str]) -> None:
+    rows = revenue_coverage(client).report(months, markets=markets)
+    gaps = [row for row in rows if row["missing"]]
+    for row in gaps:
+        year, month = row["period"]
+        market = MARKET_LABEL.get(row["market"], row["market"] or "no market")
+        print(f"  {year}-{str(month).zfill(2)} {market}: {row['have']} with data, {len(row['missing'])} of "
+              f"{row['companies']} companies missing")
+    print(f"Coverage: {len(rows) - len(gaps)}/{len(rows)} month x market cells complete")
+
+
+def run(
+    year: int,
+    month: int,
+    markets: List[str],
+    client: MongoClient,
+    backend: Optional[str] = None,
+    keep_raw: bool = True,
+    derived: Optional[RevenueDerived] = None,
+):
     total_saved = 0
     per_market = {}
-    all_records: List[Dict[str, Any]] = []
+    session = make_session()
 
     for market in markets:
         label = MARKET_LABEL.get(market, market)
         print(f"Fetching {year}-{str(month).zfill(2)} {label} ({market}) ...")
-        records = fetch_monthly_revenue(year, month, market)
+        records = fetch_monthly_revenue(year, month, market, backend, keep_raw, session=session)
         saved = save_monthly_revenue(client, records)
+        if derived is not None:
+            derived.track(records, "mops")
         print(f"  pulled {len(records)} rows, saved {saved}")
         per_market[market] = len(records)
-        all_records.extend(records)
         total_saved += saved
 
-    missing = find_missing_companies(client, all_records)
+    missing = find_missing_companies(client, year, month, markets)
     if missing:
         print(f"Companies missing revenue data ({len(missing)}): {', '.join(missing)}")
     else:
@@ -209,6 +382,139 @@ def run(year: int, month: int, markets: List[str], client: MongoClient):
 
     print(f"Total saved: {total_saved}")
     print("Per market:", ", ".join(f"{MARKET_LABEL.get(k, k)}:{v}" for k, v in per_market.items()))
+    flush_derived(derived)
+
+
+def make_rate_limiter(rate: float, burst: int = 1):
+    """
+    Per-host adaptive limiter from TW_Stock/rate_limiter.py shared by the backfill workers.
+
+    Returns None when rate <= 0 (unlimited). The limiter halves its rate after failed requests
+    and creeps back up after consecutive successes.
+    """
+    if rate <= 0:
+        return None
+    tw_stock_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "TW_Stock")
+    if tw_stock_dir not in sys.path:
+        sys.path.append(tw_stock_dir)
+    from rate_limiter import create_rate_limiter
+
+    return create_rate_limiter(MOPS_BASE_URL, rate=rate, burst=burst, mongodb_uri=None)
+
+
+def parse_year_month(value: str) -> Tuple[int, int]:
+    """Parse "YYYY-MM" (Gregorian) into (year, month)."""
+    try:
+        year, month = (int(part) for part in value.split("-", 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+    if not 1 <= month <= 12:
+        raise argparse.ArgumentTypeError(f"month out of range: {value!r}")
+    return year, month
+
+
+def iter_months(start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """Every (year, month) from start to end inclusive."""
+    months = []
+    year, month = start
+    while (year, month) <= end:
+        months.append((year, month))
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return months
+
+
+def backfill(
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    markets: List[str],
+    client: MongoClient,
+    workers: int = 4,
+    rate: float = 2.0,
+    backend: Optional[str] = None,
+    keep_raw: bool = True,
+    derived: Optional[RevenueDerived] = None,
+):
+    """
+    Load every month x market in [start, end].
+
+    Downloads share one pooled session and run on `workers` threads under a shared rate limit;
+    a single writer thread saves each page while the following pages are downloading.
+    Months that fail are reported at the end and can be re-run with --year/--month.
+    With `derived`, the touched companies are re-materialized once after the last page is saved.
+    """
+    months = iter_months(start, end)
+    tasks = [(year, month, market) for year, month in months for market in markets]
+    if not tasks:
+        print("Nothing to fetch: --from is after --to")
+        return
+    print(f"Backfilling {len(months)} months x {len(markets)} markets = {len(tasks)} requests "
+          f"(workers={workers}, rate={rate}/s)")
+
+    session = make_session(pool_size=workers)
+    limiter = make_rate_limiter(rate, burst=workers)
+    pending: "queue.Queue[Optional[Tuple[Tuple[int, int, str], List[Dict[str, Any]]]]]" = queue.Queue(maxsize=workers * 2)
+    saved_by_task: Dict[Tuple[int, int, str], int] = {}
+    write_errors: Dict[Tuple[int, int, str], str] = {}
+
+    def writer():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            task, records = item
+            try:
+                saved_by_task[task] = save_monthly_revenue(client, records)
+                if derived is not None:
+                    derived.track(records, "mops")
+            except Exception as e:
+                write_errors[task] = str(e)
+
+    def fetch(task):
+        year, month, market = task
+        if limiter is None:
+            return fetch_monthly_revenue(year, month, market, backend, keep_raw, session=session)
+        limiter.acquire()
+        try:
+            records = fetch_monthly_revenue(year, month, market, backend, keep_raw, session=session)
+        except Exception:
+            limiter.report("error")
+            raise
+        limiter.report("success")
+        return records
+
+    writer_thread = threading.Thread(target=writer, name="revenue-writer", daemon=True)
+    writer_thread.start()
+    started = time.perf_counter()
+    pulled: Dict[Tuple[int, int, str], int] = {}
+    fetch_errors: Dict[Tuple[int, int, str], str] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(fetch, task): task for task in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                task = futures[future]
+                year, month, market = task
+                try:
+                    records = future.result()
+                except Exception as e:
+                    fetch_errors[task] = str(e)
+                    print(f"[{done}/{len(tasks)}] {year}-{str(month).zfill(2)} {market}: failed ({e})")
+                    continue
+                pulled[task] = len(records)
+                pending.put((task, records))
+                print(f"[{done}/{len(tasks)}] {year}-{str(month).zfill(2)} {market}: pulled {len(records)} rows")
+    finally:
+        pending.put(None)
+        writer_thread.join()
+        session.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Total pulled: {sum(pulled.values())}, saved: {sum(saved_by_task.values())} "
+          f"in {elapsed:.1f}s ({len(tasks) / elapsed:.2f} req/s)")
+    failed = sorted(set(fetch_errors) | set(write_errors))
+    if failed:
+        print(f"Failed ({len(failed)}): " + ", ".join(f"{y}-{str(m).zfill(2)} {mk}" for y, m, mk in failed))
+    print_coverage(client, months, markets)
+    flush_derived(derived)
 
 
 def parse_args():
@@ -221,6 +527,30 @@ def parse_args():
     parser.add_argument("--markets", type=str, default="sii,otc,rotc", help="comma separated markets: sii,otc,rotc")
     parser.add_argument("--mongo-uri", type=str, default="mongodb://localhost:27017", help="MongoDB connection uri")
     parser.add_argument("--mongo-db", type=str, default=DEFAULT_DB, help="MongoDB database name (default TW_Stock)")
+    parser.add_argument(
+        "--parser",
+        type=str,
+        default=DEFAULT_PARSER,
+        choices=("auto",) + PARSER_BACKENDS,
+        help="HTML parser backend (default: MOPS_HTML_PARSER or auto = selectolax > lxml > bs4)",
+    )
+    parser.add_argument("--no-raw", action="store_true", help="do not store the per-row raw cell dict")
+    parser.add_argument(
+        "--from",
+        dest="start",
+        type=parse_year_month,
+        help="backfill start month YYYY-MM (Gregorian); ignores --year/--month",
+    )
+    parser.add_argument(
+        "--to",
+        dest="end",
+        type=parse_year_month,
+        default=(now.year, now.month),
+        help="backfill end month YYYY-MM, inclusive (default: previous month)",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests in backfill mode")
+    parser.add_argument("--rate", type=float, default=2.0, help="max requests per second in backfill mode (0: unlimited)")
+    parser.add_argument("--no-derived", action="store_true", help=f"do not update {DERIVED_COLLECTION} after saving")
     return parser.parse_args()
 
 
@@ -231,7 +561,18 @@ def main():
 
     client = MongoClient(args.mongo_uri)
     try:
-        run(args.year, args.month, [m.strip() for m in args.markets.split(",") if m.strip()], client)
+        markets = [m.strip() for m in args.markets.split(",") if m.strip()]
+        revenue_coverage(client).ensure_index()
+        derived = None
+        if not args.no_derived:
+            derived = revenue_derived(client)
+            derived.ensure_indexes()
+        if args.start:
+            backfill(args.start, args.end, markets, client, workers=args.workers, rate=args.rate,
+                     backend=args.parser, keep_raw=not args.no_raw, derived=derived)
+        else:
+            run(args.year, args.month, markets, client, backend=args.parser, keep_raw=not args.no_raw,
+                derived=derived)
     finally:
         client.close()
 
@@ -0,0 +1,206 @@
+"""
+Server-side monthly revenue coverage: which companies in 公司基本資料 have no revenue row for a period.
+
+The revenue side only touches the (period, market, code) index: each requested period is matched and
+grouped into a code set on the server, and the missing codes are computed there with $setDifference
+against the company code set (itself built by a server-side $group). Neither collection is loaded
+into Python, so the cost grows with the number of requested periods, not with the size of 每月營收.
+
+Rows are split per period x market by default: companies whose market is recorded in 公司基本資料 are
+checked against that market only; companies without one are checked against every market of the period
+and reported in a row with market None.
+
+Usage:
+    coverage = RevenueCoverage(db["每月營收"], db["公司基本資料"])
+    coverage.ensure_index()
+    for row in coverage.report([(2024, 10), (2024, 11)], markets=["sii", "otc"]):
+        print(row["period"], row["market"], row["have"], len(row["missing"]))
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+
+
+class RevenueCoverage:
+    def __init__(
+        self,
+        revenue_col: Collection,
+        company_col: Collection,
+        *,
+        code_field: str = "stockId",
+        period_fields: Sequence[str] = ("year", "month"),
+        market_field: Optional[str] = "market",
+        company_code_field: str = "stock_id",
+        company_market_field: Optional[str] = "market",
+        market_map: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        revenue_col / company_col:
+            revenue collection and company master collection
+        code_field / period_fields / market_field:
+            company code, period key and market fields of a revenue document (market_field None: no market)
+        company_code_field / company_market_field:
+            company code and market fields of a company document. With company_market_field set (default),
+            each market is checked against its own companies and rows are reported per market; companies
+            without a market value, or all companies when company_market_field is None, are checked per
+            period against every market, with per-market row counts in "markets".
+        market_map:
+            revenue market value -> company market value (e.g. {"sii": "listed"}), default identity
+        """
+        self.revenue_col = revenue_col
+        self.company_col = company_col
+        self.code_field = code_field
+        self.period_fields = tuple(period_fields)
+        self.market_field = market_field
+        self.company_code_field = company_code_field
+        self.company_market_field = company_market_field if market_field else None
+        self.market_map = market_map or {}
+
+    def ensure_index(self) -> str:
+        """Index that lets the coverage match/group run from the index alone."""
+        keys = [(f, ASCENDING) for f in self.period_fields]
+        if self.market_field:
+            keys.append((self.market_field, ASCENDING))
+        keys.append((self.code_field, ASCENDING))
+        return self.revenue_col.create_index(keys)
+
+    def company_codes(self) -> Dict[Any, List[Any]]:
+        """{company market value (None when not split by market): [codes]} built on the server."""
+        group_key = f"${self.company_market_field}" if self.company_market_field else None
+        pipeline = [
+            {"$match": {self.company_code_field: {"$nin": [None, ""]}}},
+            {"$group": {"_id": group_key, "codes": {"$addToSet": f"${self.company_code_field}"}}},
+        ]
+        return {doc["_id"]: doc["codes"] for doc in self.company_col.aggregate(pipeline)}
+
+    def _period_match(self, periods: Optional[Iterable[Sequence[Any]]], markets: Optional[Sequence[Any]]):
+        match: Dict[str, Any] = {}
+        if periods is not None:
+            match["$or"] = [dict(zip(self.period_fields, period)) for period in periods]
+        if markets is not None and self.market_field:
+            match[self.market_field] = {"$in": list(markets)}
+        return match
+
+    def pipeline(
+        self,
+        companies: Dict[Any, List[Any]],
+        periods: Optional[Iterable[Sequence[Any]]] = None,
+        markets: Optional[Sequence[Any]] = None,
+        split: Optional[bool] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Aggregation over the revenue collection producing one coverage row per period x market
+        (split, the default when company_market_field is set) or per period.
+        """
+        if split is None:
+            split = self.company_market_field is not None
+        period_id = {f: f"${f}" for f in self.period_fields}
+        group_id = dict(period_id)
+        if self.market_field:
+            group_id["market"] = f"${self.market_field}"
+
+        stages: List[Dict[str, Any]] = []
+        match = self._period_match(periods, markets)
+        if match:
+            stages.append({"$match": match})
+        stages.append({"$group": {"_id": group_id, "codes": {"$addToSet": f"${self.code_field}"}}})
+
+        if split:
+            # each market against its own company list
+            branches = [
+                {"case": {"$eq": ["$_id.market", market]},
+                 "then": {"$literal": companies.get(self.market_map.get(market, market), [])}}
+                for market in self._revenue_markets(companies, markets)
+            ]
+            expected = {"$switch": {"branches": branches, "default": []}} if branches else {"$literal": []}
+            stages.append({"$project": {"codes": 1, "_expected": expected}})
+        else:
+            if self.market_field:
+                # union of the per-market code sets, keeping each market's row count
+                stages.append({"$project": {
+                    "codes": 1, "_market": {"k": {"$toString": "$_id.market"}, "v": {"$size": "$codes"}},
+                }})
+                stages.append({"$unwind": "$codes"})
+                stages.append({"$group": {
+                    "_id": {f: f"$_id.{f}" for f in self.period_fields},
+                    "markets": {"$addToSet": "$_market"},
+                    "codes": {"$addToSet": "$codes"},
+                }})
+                stages.append({"$project": {"markets": {"$arrayToObject": "$markets"}, "codes": 1}})
+            all_codes = [code for codes in companies.values() for code in codes]
+            stages.append({"$project": {"codes": 1, "markets": 1, "_expected": {"$literal": all_codes}}})
+
+        stages.append({"$project": {
+            "_id": 1,
+            "markets": 1,
+            "have": {"$size": "$codes"},
+            "companies": {"$size": "$_expected"},
+            "missing": {"$setDifference": ["$_expected", "$codes"]},
+        }})
+        stages.append({"$sort": {f"_id.{f}": ASCENDING for f in group_id}})
+        return stages
+
+    def _revenue_markets(self, companies: Dict[Any, List[Any]], markets: Optional[Sequence[Any]]) -> List[Any]:
+        if markets is not None:
+            return list(markets)
+        reverse = {v: k for k, v in self.market_map.items()}
+        return [reverse.get(market, market) for market in companies]
+
+    def report(
+        self,
+        periods: Optional[Iterable[Sequence[Any]]] = None,
+        markets: Optional[Sequence[Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Coverage rows: {"period": (..), "market": value or None, "have": n, "companies": n, "missing": [codes]}
+        (plus "markets": {market: rows} when not split by market).
+
+        Requested periods / markets with no revenue row at all are reported with every company missing.
+        """
+        periods = [tuple(p) for p in periods] if periods is not None else None
+        companies = self.company_codes()
+        # companies without a market value are checked against every market of the period
+        unassigned = {None: companies.pop(None)} if self.company_market_field and None in companies else {}
+        rows = []
+        passes = []
+        if self.company_market_field and companies:
+            passes.append((companies, True))
+        if unassigned or not self.company_market_field:
+            passes.append((unassigned or companies, False))
+
+        for expected_codes, split in passes:
+            pipeline = self.pipeline(expected_codes, periods, markets, split)
+            for doc in self.revenue_col.aggregate(pipeline, allowDiskUse=True):
+                row = {
+                    "period": tuple(doc["_id"][f] for f in self.period_fields),
+                    "market": doc["_id"].get("market") if split else None,
+                    "have": doc["have"],
+                    "companies": doc["companies"],
+                    "missing": sorted(doc["missing"]),
+                }
+                if "markets" in doc:
+                    row["markets"] = doc["markets"]
+                rows.append(row)
+
+            if periods is not None:
+                expected_markets = self._revenue_markets(expected_codes, markets) if split else [None]
+                seen = {(row["period"], row["market"]) for row in rows}
+                for period in periods:
+                    for market in expected_markets:
+                        if (period, market) in seen:
+                            continue
+                        if split:
+                            expected = expected_codes.get(self.market_map.get(market, market), [])
+                        else:
+                            expected = [code for codes in expected_codes.values() for code in codes]
+                        row = {"period": period, "market": market, "have": 0,
+                               "companies": len(expected), "missing": sorted(expected)}
+                        if not split and self.market_field:
+                            row["markets"] = {}
+                        rows.append(row)
+        rows.sort(key=lambda row: (row["period"], row["market"] is None, str(row["market"])))
+        return rows
@@ -0,0 +1,193 @@
+"""
+Materialized monthly revenue metrics: 每月營收_衍生 holds one document per company-month with YoY, cumulative
+YoY, 3/12-month rolling sums and growth streaks, so readers do a single indexed lookup instead of
+recomputing from raw 每月營收.
+
+Crawlers call track() with the documents they just wrote and flush() at the end of a run. Only the
+companies touched by the run are recomputed: their full history is loaded (all three 每月營收 layouts, see
+revenue_screener.py) into one companies x months array, every metric is computed vectorized across them,
+and documents are upserted from the earliest touched month onward (later months depend on it through the
+rolling windows and streaks).
+
+Usage:
+    derived = RevenueDerived(db["每月營收"], db["每月營收_衍生"])
+    derived.ensure_indexes()
+    derived.track(records, "mops")
+    derived.flush()
+    derived.get("2330", 2024, 11)
+
+    py -3 python/revenue_derived.py --rebuild                  # every company
+    py -3 python/revenue_derived.py --codes 2330,2317 --since 2024-01
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReplaceOne
+from pymongo.collection import Collection
+
+from revenue_screener import DEFAULT_DB, METRICS, REVENUE_COLLECTION, SOURCES, load_cells, month_key, month_of, \
+    to_matrix
+
+DERIVED_COLLECTION = "每月營收_衍生"
+
+# output field -> revenue_screener metric
+FIELDS = {
+    "營收": "revenue",
+    "營收月增率": "mom",
+    "營收年增率": "yoy",
+    "累計營收": "ytd",
+    "累計營收年增率": "ytd_yoy",
+    "近3月營收": "r3",
+    "近3月營收年增率": "r3_yoy",
+    "近12月營收": "ttm",
+    "近12月營收年增率": "ttm_yoy",
+    "年增連續月數": "yoy_streak",
+    "年減連續月數": "yoy_decline_streak",
+}
+STREAK_FIELDS = ("年增連續月數", "年減連續月數")
+
+
+class RevenueDerived:
+    def __init__(
+        self,
+        revenue_col: Collection,
+        derived_col: Collection,
+        sources: Optional[Iterable[str]] = None,
+        batch_companies: int = 500,
+    ):
+        """
+        revenue_col / derived_col: raw 每月營收 and the materialized collection
+        sources: 每月營收 layouts to read (revenue_screener.SOURCES names, default all)
+        batch_companies: companies loaded and computed per round
+        """
+        self.revenue_col = revenue_col
+        self.derived_col = derived_col
+        self.sources = list(sources or SOURCES)
+        self.batch_companies = batch_companies
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self) -> List[str]:
+        """Per-company lookup and per-month cross-section lookups."""
+        return [
+            self.derived_col.create_index([("公司代號", ASCENDING), ("年月", ASCENDING)], unique=True),
+            self.derived_col.create_index([("年月", ASCENDING), ("營收年增率", DESCENDING)]),
+        ]
+
+    # ---- change tracking ----
+
+    def track(self, documents: Iterable[Dict[str, Any]], source: str) -> int:
+        """Remember the companies / earliest months written by a crawler (documents in the `source` layout)."""
+        cells = SOURCES[source].cells(documents)
+        with self._lock:
+            for code, key, _ in cells:
+                if key < self._pending.get(code, key + 1):
+                    self._pending[code] = key
+        return len(cells)
+
+    def flush(self) -> int:
+        """Recompute every tracked company; returns the number of documents written."""
+        with self._lock:
+            changes, self._pending = self._pending, {}
+        return self.materialize(changes) if changes else 0
+
+    # ---- computation ----
+
+    def documents(self, codes: List[str], start: int, values: np.ndarray, since: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Derived documents for the months >= since[code] that have revenue."""
+        metrics = {}
+        for field, metric in FIELDS.items():
+            array = METRICS[metric](values, start)
+            if field in STREAK_FIELDS:
+                metrics[field] = array.astype(np.int64).tolist()
+            else:
+                # NaN -> None in one pass so documents are built from plain Python lists
+                metrics[field] = np.where(np.isnan(array), None, array).tolist()
+        now = dt.datetime.now()
+        docs = []
+        for row, code in enumerate(codes):
+            first = max(since.get(code, start) - start, 0)
+            for column in (np.flatnonzero(~np.isnan(values[row, first:])) + first).tolist():
+                year, month = month_of(start + column)
+                doc = {"_id": f"{code}:{year}{month:02d}", "公司代號": code, "年月": year * 100 + month,
+                       "年": year, "月": month}
+                for field, rows in metrics.items():
+                    doc[field] = rows[row][column]
+                doc["更新時間"] = now
+                docs.append(doc)
+        return docs
+
+    def materialize(self, changes: Optional[Dict[str, int]] = None) -> int:
+        """
+        Recompute derived documents.
+
+        changes: {code: earliest changed month key (revenue_screener.month_key)}; None rebuilds every company.
+        """
+        if changes is None:
+            codes = sorted({code for code, _, _ in load_cells(self.revenue_col, self.sources)})
+            changes = {code: 0 for code in codes}
+        codes = sorted(changes)
+        written = 0
+        for i in range(0, len(codes), self.batch_companies):
+            batch = codes[i: i + self.batch_companies]
+            batch_codes, start, values = to_matrix(load_cells(self.revenue_col, self.sources, codes=batch))
+            docs = self.documents(batch_codes, start, values, changes)
+            if docs:
+                ops = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs]
+                self.derived_col.bulk_write(ops, ordered=False)
+                written += len(docs)
+        return written
+
+    # ---- reading ----
+
+    def get(self, code: str, year: int, month: int) -> Optional[Dict[str, Any]]:
+        """Derived metrics of one company-month (Gregorian year)."""
+        return self.derived_col.find_one({"公司代號": code, "年月": year * 100 + month})
+
+
+def parse_year_month(value: str) -> Tuple[int, int]:
+    year, month = (int(part) for part in value.split("-", 1))
+    return year, month
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Materialize derived monthly revenue metrics.")
+    parser.add_argument("--mongo-uri", type=str, default="mongodb://localhost:27017", help="MongoDB connection uri")
+    parser.add_argument("--mongo-db", type=str, default=DEFAULT_DB, help="MongoDB database name (default TW_Stock)")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every company")
+    parser.add_argument("--codes", type=str, help="comma separated company codes to recompute")
+    parser.add_argument("--since", type=parse_year_month, help="with --codes: first month YYYY-MM to rewrite")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not args.rebuild and not args.codes:
+        print("Nothing to do: pass --rebuild or --codes")
+        return
+
+    client = MongoClient(args.mongo_uri)
+    try:
+        db = client[args.mongo_db]
+        derived = RevenueDerived(db[REVENUE_COLLECTION], db[DERIVED_COLLECTION])
+        derived.ensure_indexes()
+        started = time.perf_counter()
+        if args.rebuild:
+            written = derived.materialize()
+        else:
+            since = month_key(*args.since) if args.since else 0
+            written = derived.materialize({code.strip(): since for code in args.codes.split(",") if code.strip()})
+        print(f"Wrote {written} derived documents in {time.perf_counter() - started:.1f}s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+"""
+Cross-sectional monthly revenue screener over a memory-mapped companies x months array.
+
+每月營收 is loaded once into a dense float64 array (rows: companies, columns: Gregorian months, NaN = no
+data) stored on disk as a memmap; later refreshes only re-read the last few months. Screens such as
+"top 50 by YoY this month" then run as NumPy operations over the whole cross-section instead of a
+collection scan.
+
+每月營收 is written by three crawlers with different document layouts; each is a RevenueSource:
+    mops     python/fetch_monthly_revenue.py          stockId, year (Gregorian), month, 營業收入
+    openapi  revenue_crawler.py (OpenAPI t187ap05)    公司代號, 資料年月 ("11310"), 營業收入-當月營收 (text)
+    t21sc03  TW_Stock/monthly_revenue_scraper.py       公司代號, 年度 (ROC), 月份, 營業收入_當月營收
+
+Usage:
+    py -3 python/revenue_screener.py --refresh                       # incremental (last --months-back months)
+    py -3 python/revenue_screener.py --refresh --full                 # reload everything (after a backfill)
+    py -3 python/revenue_screener.py --top yoy --month 2024-11 -n 50 --min-revenue 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import MongoClient
+from pymongo.collection import Collection
+
+DEFAULT_DB = "TW_Stock"
+REVENUE_COLLECTION = "每月營收"
+DEFAULT_CUBE_DIR = os.getenv("REVENUE_CUBE_DIR", "revenue_cube")
+
+# extra rows / columns allocated whenever the memmap has to grow
+ROW_PAD = 256
+MONTH_PAD = 24
+
+
+def month_key(year: int, month: int) -> int:
+    """Gregorian (year, month) -> absolute month number."""
+    return int(year) * 12 + int(month) - 1
+
+
+def month_of(key: int) -> Tuple[int, int]:
+    year, month = divmod(int(key), 12)
+    return year, month + 1
+
+
+def to_float(value: Any) -> float:
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return np.nan
+
+
+class RevenueSource:
+    """One document layout of 每月營收: how to find, filter and read its documents."""
+
+    def __init__(
+        self,
+        name: str,
+        match: Dict[str, Any],
+        code_field: str,
+        projection: Iterable[str],
+        to_cell: Callable[[Dict[str, Any]], Optional[Tuple[str, int, float]]],
+        since: Callable[[int, int], Dict[str, Any]],
+    ):
+        self.name = name
+        self.match = match
+        self.code_field = code_field
+        self.projection = {field: 1 for field in projection}
+        self.projection["_id"] = 0
+        self.to_cell = to_cell
+        self.since = since
+
+    def query(self, since: Optional[Tuple[int, int]] = None, codes: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        clauses = [self.match]
+        if since is not None:
+            clauses.append(self.since(*since))
+        if codes is not None:
+            clauses.append({self.code_field: {"$in": list(codes)}})
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def cells(self, documents: Iterable[Dict[str, Any]]) -> List[Tuple[str, int, float]]:
+        """(code, month key, revenue) of each readable document."""
+        cells = []
+        for doc in documents:
+            try:
+                cell = self.to_cell(doc)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if cell is not None:
+                cells.append(cell)
+        return cells
+
+
+def _mops_cell(doc):
+    return str(doc["stockId"]), month_key(doc["year"], doc["month"]), to_float(doc.get("營業收入"))
+
+
+def _openapi_cell(doc):
+    period = str(doc["資料年月"]).strip()
+    if len(period) < 4 or not period.isdigit():
+        return None
+    return str(doc["公司代號"]).strip(), month_key(int(period[:-2]) + 1911, int(period[-2:])), \
+        to_float(doc.get("營業收入-當月營收"))
+
+
+def _t21sc03_cell(doc):
+    return str(doc["公司代號"]), month_key(int(doc["年度"]) + 1911, doc["月份"]), to_float(doc.get("營業收入_當月營收"))
+
+
+SOURCES = {
+    "mops": RevenueSource(
+        "mops",
+        {"stockId": {"$exists": True}},
+        "stockId",
+        ("stockId", "year", "month", "營業收入"),
+        _mops_cell,
+        lambda y, m: {"$or": [{"year": {"$gt": y}}, {"year": y, "month": {"$gte": m}}]},
+    ),
+    "openapi": RevenueSource(
+        "openapi",
+        {"資料年月": {"$exists": True}},
+        "公司代號",
+        ("公司代號", "資料年月", "營業收入-當月營收"),
+        _openapi_cell,
+        # 資料年月 is ROC text; OpenAPI only serves ROC 100+ so the strings compare in order
+        lambda y, m: {"資料年月": {"$gte": f"{y - 1911}{m:02d}"}},
+    ),
+    "t21sc03": RevenueSource(
+        "t21sc03",
+        {"年度": {"$exists": True}, "月份": {"$exists": True}, "stockId": {"$exists": False}},
+        "公司代號",
+        ("公司代號", "年度", "月份", "營業收入_當月營收"),
+        _t21sc03_cell,
+        lambda y, m: {"$or": [{"年度": {"$gt": y - 1911}}, {"年度": y - 1911, "月份": {"$gte": m}}]},
+    ),
+}
+
+
+def load_cells(
+    collection: Collection,
+    sources: Optional[Iterable[str]] = None,
+    since: Optional[Tuple[int, int]] = None,
+    codes: Optional[Iterable[str]] = None,
+) -> List[Tuple[str, int, float]]:
+    """(code, month key, revenue) from every source layout, optionally limited to months >= since / some codes."""
+    codes = list(codes) if codes is not None else None
+    cells: List[Tuple[str, int, float]] = []
+    for name in sources or SOURCES:
+        source = SOURCES[name]
+        cells.extend(source.cells(collection.find(source.query(since, codes), source.projection)))
+    return cells
+
+
+def to_matrix(cells: List[Tuple[str, int, float]]) -> Tuple[List[str], int, np.ndarray]:
+    """In-memory (codes, first month key, companies x months array) from load_cells output."""
+    if not cells:
+        return [], 0, np.empty((0, 0))
+    codes = sorted({code for code, _, _ in cells})
+    row_of = {code: row for row, code in enumerate(codes)}
+    keys = np.fromiter((key for _, key, _ in cells), dtype=np.int64, count=len(cells))
+    start = int(keys.min())
+    values = np.full((len(codes), int(keys.max()) - start + 1), np.nan)
+    rows = np.fromiter((row_of[code] for code, _, _ in cells), dtype=np.int64, count=len(cells))
+    values[rows, keys - start] = np.fromiter((value for _, _, value in cells), dtype=np.float64, count=len(cells))
+    return codes, start, values
+
+
+# ---- vectorized operators (2-D arrays: companies x months, NaN = missing) ----
+
+def shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """Value `periods` months earlier in the same row (NaN where it falls before the first month)."""
+    out = np.full_like(values, np.nan)
+    if periods < values.shape[1]:
+        out[:, periods:] = values[:, : values.shape[1] - periods]
+    return out
+
+
+def pct_change(values: np.ndarray, periods: int) -> np.ndarray:
+    """Percent change against `periods` months earlier; NaN when either side is missing or the base is 0."""
+    base = shift(values, periods)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (values - base) / np.abs(base) * 100.0
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def yoy(values: np.ndarray) -> np.ndarray:
+    return pct_change(values, 12)
+
+
+def mom(values: np.ndarray) -> np.ndarray:
+    return pct_change(values, 1)
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum of the last `window` months; NaN unless every month in the window has data."""
+    present = ~np.isnan(values)
+    sums = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(np.where(present, values, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(present, axis=1)], axis=1)
+    out = np.full_like(values, np.nan)
+    if window <= values.shape[1]:
+        window_sums = sums[:, window:] - sums[:, :-window]
+        window_counts = counts[:, window:] - counts[:, :-window]
+        window_sums[window_counts < window] = np.nan
+        out[:, window - 1:] = window_sums
+    return out
+
+
+def ttm(values: np.ndarray) -> np.ndarray:
+    """Trailing twelve months revenue."""
+    return rolling_sum(values, 12)
+
+
+def year_to_date(values: np.ndarray, start: int) -> np.ndarray:
+    """Cumulative revenue since January of the same year; NaN unless every month so far has data."""
+    present = ~np.isnan(values)
+    zeros = np.zeros((values.shape[0], 1))
+    sums = np.concatenate([zeros, np.cumsum(np.where(present, values, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([zeros, np.cumsum(present, axis=1)], axis=1)
+    columns = np.arange(values.shape[1])
+    month_index = (start + columns) % 12  # 0 = January
+    january = np.maximum(columns - month_index, 0)
+    out = sums[:, 1:] - sums[:, january]
+    out[(counts[:, 1:] - counts[:, january]) < month_index + 1] = np.nan
+    return out
+
+
+def streak(mask: np.ndarray) -> np.ndarray:
+    """Consecutive months (ending at each month) for which mask holds; 0 where it does not."""
+    runs = np.cumsum(mask, axis=1)
+    return (runs - np.maximum.accumulate(np.where(mask, 0, runs), axis=1)).astype(np.float64)
+
+
+def rank(column: np.ndarray, descending: bool = True) -> np.ndarray:
+    """1-based rank within a cross-section (NaN stays NaN)."""
+    out = np.full(column.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(column))
+    order = np.argsort(-column[valid] if descending else column[valid], kind="stable")
+    out[valid[order]] = np.arange(1, len(valid) + 1)
+    return out
+
+
+# metric name -> f(values, first month key)
+METRICS: Dict[str, Callable[[np.ndarray, int], np.ndarray]] = {
+    "revenue": lambda values, start: values,
+    "yoy": lambda values, start: yoy(values),
+    "mom": lambda values, start: mom(values),
+    "ytd": year_to_date,
+    "ytd_yoy": lambda values, start: yoy(year_to_date(values, start)),
+    "r3": lambda values, start: rolling_sum(values, 3),
+    "r3_yoy": lambda values, start: yoy(rolling_sum(values, 3)),
+    "ttm": lambda values, start: ttm(values),
+    "ttm_yoy": lambda values, start: yoy(ttm(values)),
+    "yoy_streak": lambda values, start: streak(yoy(values) > 0),
+    "yoy_decline_streak": lambda values, start: streak(yoy(values) < 0),
+}
+
+
+class RevenueCube:
+    """Companies x months revenue array backed by a memmap under `path`."""
+
+    def __init__(self, path: str = DEFAULT_CUBE_DIR):
+        self.path = path
+        self.meta_path = os.path.join(path, "meta.json")
+        self.data_path = os.path.join(path, "revenue.f8")
+        self.codes: List[str] = []
+        self.start = 0  # absolute month number of column 0
+        self.n_months = 0
+        self.capacity = (0, 0)
+        self.refreshed_at: Optional[float] = None
+        self._data: Optional[np.memmap] = None
+        self._metrics: Dict[str, np.ndarray] = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.codes = meta["codes"]
+            self.start = meta["start"]
+            self.n_months = meta["n_months"]
+            self.capacity = tuple(meta["capacity"])
+            self.refreshed_at = meta.get("refreshed_at")
+            self._data = np.memmap(self.data_path, dtype="<f8", mode="r+", shape=self.capacity)
+        self.row_of = {code: row for row, code in enumerate(self.codes)}
+
+    # ---- layout ----
+
+    @property
+    def values(self) -> np.ndarray:
+        """companies x months view (memmap slice, NaN = no data)."""
+        if self._data is None:
+            return np.empty((0, 0))
+        return self._data[: len(self.codes), : self.n_months]
+
+    @property
+    def months(self) -> List[Tuple[int, int]]:
+        return [month_of(self.start + i) for i in range(self.n_months)]
+
+    def column(self, year: int, month: int) -> int:
+        index = month_key(year, month) - self.start
+        if not 0 <= index < self.n_months:
+            raise KeyError(f"{year}-{month:02d} is outside the loaded range")
+        return index
+
+    def _save_meta(self) -> None:
+        meta = {
+            "codes": self.codes,
+            "start": self.start,
+            "n_months": self.n_months,
+            "capacity": list(self.capacity),
+            "refreshed_at": self.refreshed_at,
+        }
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, self.meta_path)
+
+    def _reshape(self, n_codes: int, start: int, end: int) -> None:
+        """Make room for n_codes rows and months [start, end); rewrites the file only when it must grow."""
+        if self._data is not None and n_codes <= self.capacity[0] and start >= self.start \
+                and end - self.start <= self.capacity[1]:
+            self.n_months = max(self.n_months, end - self.start)
+            return
+
+        new_start = min(start, self.start) if self._data is not None else start
+        new_end = max(end, self.start + self.n_months) if self._data is not None else end
+        capacity = (n_codes + ROW_PAD, new_end - new_start + MONTH_PAD)
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self.data_path + ".tmp"
+        grown = np.memmap(tmp_path, dtype="<f8", mode="w+", shape=capacity)
+        grown[:] = np.nan
+        if self._data is not None:
+            offset = self.start - new_start
+            grown[: len(self.codes), offset: offset + self.n_months] = self.values
+            self._data.flush()
+            del self._data
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.data_path)
+        self._data = np.memmap(self.data_path, dtype="<f8", mode="r+", shape=capacity)
+        self.capacity = capacity
+        self.start = new_start
+        self.n_months = new_end - new_start
+
+    # ---- loading ----
+
+    def refresh(
+        self,
+        collection: Collection,
+        sources: Optional[Iterable[str]] = None,
+        months_back: int = 2,
+        full: bool = False,
+    ) -> int:
+        """
+        Load 每月營收 into the cube.
+
+        Incremental refreshes re-read only the last `months_back` loaded months and anything newer
+        (late filings and corrections land in recent months); use full=True after backfilling history.
+        Returns the number of cells written.
+        """
+        since = None
+        if not full and self.n_months:
+            since = month_of(self.start + self.n_months - max(1, months_back))
+        if full:
+            self._metrics = {}
+
+        cells = load_cells(collection, sources, since)
+        if not cells:
+            return 0
+
+        for code, _, _ in cells:
+            if code not in self.row_of:
+                self.row_of[code] = len(self.codes)
+                self.codes.append(code)
+        keys = np.fromiter((key for _, key, _ in cells), dtype=np.int64, count=len(cells))
+        self._reshape(len(self.codes), int(keys.min()), int(keys.max()) + 1)
+
+        rows = np.fromiter((self.row_of[code] for code, _, _ in cells), dtype=np.int64, count=len(cells))
+        revenue = np.fromiter((value for _, _, value in cells), dtype=np.float64, count=len(cells))
+        if full:
+            self._data[:] = np.nan
+        self._data[rows, keys - self.start] = revenue
+        self._data.flush()
+        self.refreshed_at = time.time()
+        self._save_meta()
+        self._metrics = {}
+        return len(cells)
+
+    # ---- screening ----
+
+    def metric(self, name: str) -> np.ndarray:
+        """Full companies x months array of a metric (computed once per refresh)."""
+        if name not in METRICS:
+            raise KeyError(f"unknown metric: {name} (available: {', '.join(METRICS)})")
+        if name not in self._metrics:
+            self._metrics[name] = METRICS[name](np.asarray(self.values), self.start)
+        return self._metrics[name]
+
+    def cross_section(self, name: str, year: int, month: int) -> np.ndarray:
+        """One month of a metric across all companies (aligned with self.codes)."""
+        return self.metric(name)[:, self.column(year, month)]
+
+    def top(
+        self,
+        name: str,
+        year: int,
+        month: int,
+        n: int = 50,
+        ascending: bool = False,
+        where: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Best n companies by a metric in one month.
+
+        where: optional boolean mask over self.codes, e.g. cube.cross_section("revenue", y, m) >= 1e5
+        """
+        column = self.cross_section(name, year, month).copy()
+        if where is not None:
+            column[~where] = np.nan
+        valid = np.flatnonzero(~np.isnan(column))
+        if not len(valid):
+            return []
+        keyed = column[valid] if ascending else -column[valid]
+        n = min(n, len(valid))
+        picked = valid[np.argpartition(keyed, n - 1)[:n]] if n < len(valid) else valid
+        picked = picked[np.argsort(column[picked] if ascending else -column[picked], kind="stable")]
+        return [(self.codes[row], float(column[row])) for row in picked]
+
+    def rank(self, name: str, year: int, month: int, descending: bool = True) -> Dict[str, float]:
+        """{code: rank} for one month of a metric (companies without data are omitted)."""
+        ranks = rank(self.cross_section(name, year, month), descending)
+        return {code: float(r) for code, r in zip(self.codes, ranks) if not np.isnan(r)}
+
+
+def parse_year_month(value: str) -> Tuple[int, int]:
+    year, month = (int(part) for part in value.split("-", 1))
+    return year, month
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Screen monthly revenue across all companies.")
+    parser.add_argument("--mongo-uri", type=str, default="mongodb://localhost:27017", help="MongoDB connection uri")
+    parser.add_argument("--mongo-db", type=str, default=DEFAULT_DB, help="MongoDB database name (default TW_Stock)")
+    parser.add_argument("--collection", type=str, default=REVENUE_COLLECTION, help="revenue collection")
+    parser.add_argument("--cube-dir", type=str, default=DEFAULT_CUBE_DIR, help="memmap directory (REVENUE_CUBE_DIR)")
+    parser.add_argument("--sources", type=str, default=",".join(SOURCES), help="document layouts to load")
+    parser.add_argument("--refresh", action="store_true", help="update the cube from MongoDB before screening")
+    parser.add_argument("--full", action="store_true", help="with --refresh: reload every month")
+    parser.add_argument("--months-back", type=int, default=2, help="months re-read by an incremental refresh")
+    parser.add_argument("--top", type=str, choices=tuple(METRICS), help="metric to rank by")
+    parser.add_argument("--month", type=parse_year_month, help="YYYY-MM to screen (default: latest loaded month)")
+    parser.add_argument("-n", type=int, default=50, help="number of companies to list")
+    parser.add_argument("--ascending", action="store_true", help="list the lowest values instead")
+    parser.add_argument("--min-revenue", type=float, default=None, help="only companies with at least this month revenue")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    cube = RevenueCube(args.cube_dir)
+
+    if args.refresh:
+        client = MongoClient(args.mongo_uri)
+        try:
+            started = time.perf_counter()
+            sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+            written = cube.refresh(client[args.mongo_db][args.collection], sources, args.months_back, args.full)
+            print(f"Loaded {written} cells in {time.perf_counter() - started:.1f}s: "
+                  f"{len(cube.codes)} companies x {cube.n_months} months")
+        finally:
+            client.close()
+
+    if args.top:
+        if not cube.n_months:
+            print("Cube is empty, run with --refresh first")
+            return
+        year, month = args.month or cube.months[-1]
+        where = None
+        if args.min_revenue is not None:
+            where = np.nan_to_num(cube.cross_section("revenue", year, month)) >= args.min_revenue
+        started = time.perf_counter()
+        result = cube.top(args.top, year, month, args.n, args.ascending, where)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"Top {len(result)} by {args.top} for {year}-{month:02d} ({elapsed:.2f} ms)")
+        for position, (code, value) in enumerate(result, 1):
+            print(f"{position:>4}  {code:<8} {value:>16,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,21 +14,27 @@ from __future__ import annotations
 
 import argparse
 import logging
+import os
 import ssl
+import sys
 import urllib3
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
 
 import requests
 from pymongo import MongoClient
 from pymongo.collection import Collection
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "python"))
+from revenue_coverage import RevenueCoverage  # noqa: E402
+from revenue_derived import DERIVED_COLLECTION, RevenueDerived  # noqa: E402
+
 # Setup SSL bypass
 ssl._create_default_https_context = ssl._create_unverified_context
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# TWSE and TPEx OpenAPI base URLs
-TWSE_API_BASE = "https://openapi.twse.com.tw/v1"
-TPEX_API_BASE = "https://www.tpex.org.tw/openapi/v1"
+# TWSE and TPEx OpenAPI base URLs (overridable to point at a local stand-in server)
+TWSE_API_BASE = os.getenv("TWSE_API_BASE", "https://openapi.twse.com.tw/v1").rstrip("/")
+TPEX_API_BASE = os.getenv("TPEX_API_BASE", "https://www.tpex.org.tw/openapi/v1").rstrip("/")
 
 # Revenue endpoints
 REVENUE_ENDPOINTS = {
@@ -38,6 +44,9 @@ REVENUE_ENDPOINTS = {
     "emerging": (TPEX_API_BASE, "/t187ap05_R"),  # 興櫃公司每月營業收入彙總表
 }
 
+# Endpoint category stored on each document so coverage can be reported per market
+MARKET_FIELD = "市場別"
+
 
 def fetch_revenue_data(base_url: str, endpoint: str, verify_ssl: bool = False) -> List[Dict]:
     """Fetch monthly revenue data from TWSE/TPEx OpenAPI.
@@ -123,9 +132,15 @@ def persist_revenue_to_mongo(
 
 def check_data_coverage(
     revenue_col: Collection,
-    company_col: Collection
+    company_col: Collection,
+    periods: Iterable[str],
+    markets: Optional[List[str]] = None,
 ) -> None:
-    """Check which companies from 公司基本資料 have revenue data.
+    """Check which companies from 公司基本資料 have revenue data, per 資料年月 and market.
+
+    Only the given periods are checked; the missing codes are computed in MongoDB on the
+    (資料年月, 市場別, 公司代號) index (see python/revenue_coverage.py), so neither collection
+    is scanned into Python.
 
     Parameters
     ----------
@@ -133,28 +148,42 @@ def check_data_coverage(
         MongoDB collection containing revenue data
     company_col:
         MongoDB collection containing company basic data
+    periods:
+        資料年月 values to check (e.g. the months just fetched)
+    markets:
+        市場別 values to check (default: every market found)
     """
-    logging.info("Checking data coverage...")
-
-    # Get all company codes from 公司基本資料
-    all_companies = set(company_col.distinct("公司 代號"))
-    logging.info(f"Total companies in 公司基本資料: {len(all_companies)}")
-
-    # Get companies with revenue data
-    companies_with_revenue = set(revenue_col.distinct("公司代號"))
-    logging.info(f"Companies with revenue data: {len(companies_with_revenue)}")
-
-    # Find missing companies
-    missing = all_companies - companies_with_revenue
-    if missing:
-        logging.warning(f"Companies missing revenue data: {len(missing)}")
-        # Show first 20 missing company codes
-        missing_list = sorted(list(missing))[:20]
-        logging.warning(f"Sample missing codes: {missing_list}")
-        if len(missing) > 20:
-            logging.warning(f"... and {len(missing) - 20} more")
-    else:
-        logging.info("All companies have revenue data!")
+    periods = sorted(set(periods))
+    if not periods:
+        logging.warning("No periods to check")
+        return
+    logging.info(f"Checking data coverage for {', '.join(periods)}...")
+
+    coverage = RevenueCoverage(
+        revenue_col,
+        company_col,
+        code_field="公司代號",
+        period_fields=("資料年月",),
+        market_field=MARKET_FIELD,
+        company_code_field="公司 代號",
+        company_market_field=MARKET_FIELD,
+    )
+    coverage.ensure_index()
+    rows = coverage.report([(period,) for period in periods], markets=markets)
+
+    for row in rows:
+        label = f"{row['period'][0]} {row['market'] or 'all markets'}"
+        missing = row["missing"]
+        logging.info(f"[{label}] Companies in 公司基本資料: {row['companies']}, "
+                     f"companies with revenue data: {row['have']}")
+        if missing:
+            logging.warning(f"[{label}] Companies missing revenue data: {len(missing)}")
+            # Show first 20 missing company codes
+            logging.warning(f"[{label}] Sample missing codes: {missing[:20]}")
+            if len(missing) > 20:
+                logging.warning(f"... and {len(missing) - 20} more")
+        else:
+            logging.info(f"[{label}] All companies have revenue data!")
 
 
 def parse_args() -> argparse.Namespace:
@@ -196,6 +225,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Check which companies from 公司基本資料 have revenue data.",
     )
+    parser.add_argument(
+        "--no-derived",
+        action="store_true",
+        help=f"Do not update {DERIVED_COLLECTION} after saving.",
+    )
     return parser.parse_args()
 
 
@@ -214,6 +248,8 @@ def main() -> None:
     for category, (base_url, endpoint) in REVENUE_ENDPOINTS.items():
         try:
             data = fetch_revenue_data(base_url, endpoint, verify_ssl=args.verify_ssl)
+            for doc in data:
+                doc[MARKET_FIELD] = category
             all_documents.extend(data)
             logging.info(f"Fetched {len(data)} records from {category}")
         except Exception as e:
@@ -238,10 +274,18 @@ def main() -> None:
     # Persist to MongoDB
     persist_revenue_to_mongo(revenue_col, all_documents)
 
+    # Re-materialize derived metrics for the companies just written
+    if not args.no_derived:
+        derived = RevenueDerived(revenue_col, db[DERIVED_COLLECTION])
+        derived.ensure_indexes()
+        derived.track(all_documents, "openapi")
+        logging.info(f"Derived metrics: {derived.flush()} documents updated in {DERIVED_COLLECTION}")
+
     # Check coverage if requested
     if args.check_coverage:
         company_col = db["公司基本資料"]
-        check_data_coverage(revenue_col, company_col)
+        periods = {str(doc["資料年月"]) for doc in all_documents if doc.get("資料年月")}
+        check_data_coverage(revenue_col, company_col, periods, markets=list(REVENUE_ENDPOINTS))
 
     logging.info("Completed successfully")
 
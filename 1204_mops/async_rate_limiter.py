@@ -0,0 +1,93 @@
+"""
+非同步請求限速器
+以 token bucket 控制所有並發請求合計的每秒請求數，
+遇到 429 / 5xx / 逾時時速率減半，連續成功後逐步調升
+"""
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 視為主機過載的狀態碼
+BACKOFF_STATUS = {429, 500, 502, 503, 504}
+
+
+class AsyncRateLimiter:
+    """單一事件迴圈內共用的自適應限速器"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        min_rate: float = 0.1,
+        max_rate: float = None,
+        increase_step: float = 0.1,
+        increase_every: int = 20,
+        cooldown: float = 5.0
+    ):
+        """
+        初始化限速器
+
+        Args:
+            rate: 初始每秒請求數（所有並發請求合計）
+            burst: 可連續立即送出的請求數
+            min_rate: 速率下限
+            max_rate: 速率上限（預設為初始速率的 4 倍）
+            increase_step: 每次調升的每秒請求數
+            increase_every: 連續成功幾次後調升一次
+            cooldown: 兩次調降之間的最短秒數
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.increase_step = increase_step
+        self.increase_every = increase_every
+        self.cooldown = cooldown
+        self.tat = 0.0  # 下一個請求理論上可送出的時間
+        self.decreased_at = 0.0
+        self.successes = 0
+
+    async def acquire(self) -> float:
+        """
+        等待直到可以送出下一個請求
+
+        Returns:
+            float: 實際等待秒數
+        """
+        now = time.monotonic()
+        interval = 1.0 / self.rate
+        self.tat = max(self.tat, now) + interval
+        wait = self.tat - interval - (self.burst - 1) * interval - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+            return wait
+        return 0.0
+
+    def report(self, status, retry_after=None):
+        """
+        回報請求結果以調整速率
+
+        Args:
+            status: HTTP 狀態碼，或 'error'（逾時、連線錯誤）
+            retry_after: 伺服器回應的 Retry-After 秒數
+        """
+        now = time.monotonic()
+        if status == 'error' or status in BACKOFF_STATUS:
+            self.successes = 0
+            try:
+                pause = float(retry_after) if retry_after else 0.0
+            except ValueError:
+                pause = 0.0
+            self.tat = max(self.tat, now + pause)
+            if now - self.decreased_at > self.cooldown:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.decreased_at = now
+                logger.warning(f"請求限速調降為每秒 {self.rate:.2f} 次 (狀態: {status})")
+            return
+
+        self.successes += 1
+        if self.successes >= self.increase_every:
+            self.successes = 0
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
@@ -17,9 +17,16 @@ MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '5'))
 REQUEST_DELAY = float(os.getenv('REQUEST_DELAY', '2'))
 RETRY_TIMES = int(os.getenv('RETRY_TIMES', '3'))
 TIMEOUT = int(os.getenv('TIMEOUT', '30'))
+# 所有並發請求合計的每秒請求數（預設約等於原本每個並發請求間隔 REQUEST_DELAY 秒）
+RATE_LIMIT_RPS = float(os.getenv('RATE_LIMIT_RPS', str(MAX_CONCURRENT_REQUESTS / max(REQUEST_DELAY, 0.1))))
+# items 數值儲存方式：raw（清理後的字串，預設）/ typed（Int64 / Decimal128）
+# 既有資料需先執行 TW_Stock/migrate_collections.py mops1204_items 轉換後再改為 typed，避免同一 collection 新舊型別混存
+ITEMS_SCHEMA_MODE = os.getenv('ITEMS_SCHEMA_MODE', 'raw')
 
-# MOPS API 配置
-MOPS_BASE_URL = 'https://mops.twse.com.tw/mops/web/ajax_t163sb05'
+# MOPS API 配置 (MOPS_BASE_URL 可指向本機模擬伺服器，例如 http://127.0.0.1:8800)
+MOPS_SITE_URL = os.getenv('MOPS_BASE_URL', 'https://mops.twse.com.tw').rstrip('/')
+MOPS_BASE_URL = f'{MOPS_SITE_URL}/mops/web/ajax_t163sb05'
+MOPS_PAGE_URL = f'{MOPS_SITE_URL}/mops/web/t163sb05'
 MOPS_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -27,6 +34,6 @@ MOPS_HEADERS = {
     'Accept-Encoding': 'gzip, deflate, br',
     'Connection': 'keep-alive',
     'Content-Type': 'application/x-www-form-urlencoded',
-    'Referer': 'https://mops.twse.com.tw/mops/web/t163sb05',
-    'Origin': 'https://mops.twse.com.tw',
+    'Referer': MOPS_PAGE_URL,
+    'Origin': MOPS_SITE_URL,
 }
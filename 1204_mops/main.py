@@ -43,7 +43,7 @@ async def main():
 
         # 2. 使用爬蟲抓取所有公司的資產負債表
         logger.info("\n[步驟 2/3] 開始爬取資產負債表資料...")
-        logger.info(f"設定: 並發數={MAX_CONCURRENT_REQUESTS}, 請求延遲={REQUEST_DELAY}秒")
+        logger.info(f"設定: 並發數={MAX_CONCURRENT_REQUESTS}, 限速={RATE_LIMIT_RPS} 次/秒")
 
         async with MOPSScraper() as scraper:
             # 可以指定起始年份，預設從民國 102 年 (2013) 開始
@@ -85,7 +85,7 @@ async def main():
 
 if __name__ == '__main__':
     # 匯入配置
-    from config import MAX_CONCURRENT_REQUESTS, REQUEST_DELAY
+    from config import MAX_CONCURRENT_REQUESTS, RATE_LIMIT_RPS
 
     # 執行主程式
     asyncio.run(main())
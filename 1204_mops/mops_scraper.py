@@ -9,14 +9,21 @@ from typing import List, Dict, Any, Optional
 from bs4 import BeautifulSoup
 import logging
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from bson.int64 import Int64
+from bson.decimal128 import Decimal128
 from config import (
     MOPS_BASE_URL,
+    MOPS_PAGE_URL,
     MOPS_HEADERS,
     MAX_CONCURRENT_REQUESTS,
     REQUEST_DELAY,
     RETRY_TIMES,
-    TIMEOUT
+    TIMEOUT,
+    RATE_LIMIT_RPS,
+    ITEMS_SCHEMA_MODE
 )
+from async_rate_limiter import AsyncRateLimiter
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,13 +32,67 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def clean_number_text(text: str) -> Optional[str]:
+    """
+    移除金額文字中的逗號與空白
+
+    Args:
+        text: 儲存格文字
+
+    Returns:
+        清理後的字串，空值回傳 None
+    """
+    clean_value = text.replace(',', '').replace(' ', '')
+    if not clean_value or clean_value == '-':
+        return None
+    return clean_value
+
+
+def to_typed_number(text: str) -> Any:
+    """
+    將金額文字轉為 MongoDB 數值型別（整數仟元為 Int64，含小數為 Decimal128）
+
+    Args:
+        text: 儲存格文字
+
+    Returns:
+        Int64 / Decimal128，空值與無限大回傳 None，非數值保留原字串
+    """
+    clean_value = clean_number_text(text)
+    if clean_value is None:
+        return None
+    # 會計格式的負數，例如 (1,234)
+    if clean_value.startswith('(') and clean_value.endswith(')'):
+        clean_value = '-' + clean_value[1:-1]
+    try:
+        number = Decimal(clean_value)
+    except InvalidOperation:
+        return text
+    if not number.is_finite():
+        return None
+    if number == number.to_integral_value():
+        return Int64(int(number))
+    return Decimal128(number)
+
+
 class MOPSScraper:
     """MOPS 資產負債表爬蟲類別"""
 
-    def __init__(self):
-        """初始化爬蟲"""
+    def __init__(self, items_mode: Optional[str] = None):
+        """
+        初始化爬蟲
+
+        Args:
+            items_mode: items 數值儲存方式 "raw"（字串）/ "typed"（Int64 / Decimal128），
+                        None 時讀取 ITEMS_SCHEMA_MODE（預設 raw）
+        """
+        self.items_mode = items_mode or ITEMS_SCHEMA_MODE
+        if self.items_mode not in ('raw', 'typed'):
+            raise ValueError(f"未知的 items 儲存方式: {self.items_mode} (可用: raw, typed)")
         self.session: Optional[aiohttp.ClientSession] = None
         self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        # 所有並發請求共用的限速器（取代每個請求完成後固定等待 REQUEST_DELAY）
+        self.rate_limiter = AsyncRateLimiter(RATE_LIMIT_RPS, burst=MAX_CONCURRENT_REQUESTS)
         self.request_count = 0
         self.success_count = 0
         self.error_count = 0
@@ -59,8 +120,7 @@ class MOPSScraper:
 
         # 重要：先訪問頁面取得 cookies（參考 gemini.py 的做法）
         try:
-            page_url = 'https://mops.twse.com.tw/mops/web/t163sb05'
-            async with self.session.get(page_url) as resp:
+            async with self.session.get(MOPS_PAGE_URL) as resp:
                 await resp.text()
                 logger.info("成功訪問 MOPS 頁面並取得 cookies")
                 await asyncio.sleep(1)  # 模擬真人操作
@@ -132,7 +192,9 @@ class MOPSScraper:
                 self.request_count += 1
 
                 # 發送 POST 請求
+                await self.rate_limiter.acquire()
                 async with self.session.post(MOPS_BASE_URL, data=data) as response:
+                    self.rate_limiter.report(response.status, response.headers.get('Retry-After'))
                     if response.status != 200:
                         logger.warning(
                             f"股票 {stock_code} {year}Q{season} 回應狀態碼: {response.status}"
@@ -159,13 +221,11 @@ class MOPSScraper:
                         )
                     else:
                         logger.debug(f"股票 {stock_code} {year}Q{season} 無資料")
-
-                    # 請求延遲，避免過於頻繁
-                    await asyncio.sleep(REQUEST_DELAY)
                     return result
 
             except asyncio.TimeoutError:
                 logger.warning(f"股票 {stock_code} {year}Q{season} 請求逾時")
+                self.rate_limiter.report('error')
                 if retry_count < RETRY_TIMES:
                     await asyncio.sleep(REQUEST_DELAY * 2)
                     return await self._fetch_balance_sheet(
@@ -176,6 +236,7 @@ class MOPSScraper:
 
             except Exception as e:
                 logger.error(f"抓取 {stock_code} {year}Q{season} 時發生錯誤: {e}")
+                self.rate_limiter.report('error')
                 if retry_count < RETRY_TIMES:
                     await asyncio.sleep(REQUEST_DELAY * 2)
                     return await self._fetch_balance_sheet(
@@ -238,14 +299,13 @@ class MOPSScraper:
 
                         # 過濾標題列
                         if item_name and item_value and not item_name.startswith('會計項目'):
-                            # 清理數值（移除逗號等）
-                            try:
-                                # 嘗試轉換為數值
-                                clean_value = item_value.replace(',', '').replace(' ', '')
-                                if clean_value and clean_value != '-':
-                                    balance_sheet_data['items'][item_name] = clean_value
-                            except:
-                                balance_sheet_data['items'][item_name] = item_value
+                            # typed 模式數值存為 Int64 / Decimal128，否則存清理後的字串；空值不存
+                            if self.items_mode == 'typed':
+                                value = to_typed_number(item_value)
+                            else:
+                                value = clean_number_text(item_value)
+                            if value is not None:
+                                balance_sheet_data['items'][item_name] = value
 
             # 如果沒有解析到任何項目，返回 None
             if not balance_sheet_data['items']:
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資料覆蓋率點陣索引
+每個資料集、每家公司一份文件 (_coverage)，每個期間 (季 / 月) 一個位元：
+    {_id: "revenue:2330", 資料集, 公司代號, 位元: {"0": Int64, "1": Int64, ...}, 更新時間}
+位元以 64 位元一組存成 Int64，由民國 BASE_YEAR 年第一期起算
+
+每次批次寫入後以 $bit or 更新 (多進程同時寫入也不會互相覆蓋)，
+規劃增量執行、進度報告與覆蓋率稽核時一次載入為 NumPy 布林矩陣，之後只在記憶體中查詢，
+不必再對各 collection 逐一 find_one / count_documents
+
+Usage:
+    python coverage_index.py --rebuild              # 由現有資料重建所有資料集的索引
+    python coverage_index.py --report revenue       # 各年度覆蓋率
+"""
+
+import os
+import argparse
+from datetime import datetime
+from collections import defaultdict
+import numpy as np
+from bson.int64 import Int64
+from pymongo import MongoClient, UpdateOne, ReplaceOne
+
+COVERAGE_COLLECTION = "_coverage"
+
+# 期間編號的起始民國年 (該年第一季 / 一月為第 0 個位元)
+BASE_YEAR = 90
+
+WORD_BITS = 64
+
+
+class CoverageDataset:
+    def __init__(self, name, collection, period_fields, periods_per_year, code_field="公司代號"):
+        """
+        資料集描述
+
+        Args:
+            name: 資料集名稱 (索引文件 _id 的前綴)
+            collection: 資料所在的 collection
+            period_fields: (年度欄位, 季別或月份欄位)
+            periods_per_year: 每年期數 (季: 4，月: 12)
+            code_field: 公司代號欄位
+        """
+        self.name = name
+        self.collection = collection
+        self.period_fields = tuple(period_fields)
+        self.periods_per_year = periods_per_year
+        self.code_field = code_field
+
+    def period_index(self, year, period):
+        """民國年度 + 季別 / 月份 → 位元位置 (BASE_YEAR 之前返回 -1)"""
+        index = (int(year) - BASE_YEAR) * self.periods_per_year + int(period) - 1
+        return index if index >= 0 else -1
+
+    def period_of(self, index):
+        """位元位置 → (民國年度, 季別 / 月份)"""
+        year, period = divmod(index, self.periods_per_year)
+        return BASE_YEAR + year, period + 1
+
+
+# 已支援的資料集，新增資料集只需在此加入描述
+DATASETS = {
+    "balance_sheet": CoverageDataset("balance_sheet", "上市櫃公司資產負債表", ("年度", "季別"), 4),
+    "income": CoverageDataset("income", "上市櫃公司綜合損益表", ("年度", "季別"), 4),
+    "cashflow": CoverageDataset("cashflow", "上市櫃公司現金流量表", ("年度", "季別"), 4),
+    "revenue": CoverageDataset("revenue", "每月營收", ("年度", "月份"), 12),
+    "insider": CoverageDataset("insider", "內部人持股異動事後申報表", ("查詢年度", "查詢月份"), 12),
+    "insider_bucket": CoverageDataset("insider_bucket", "內部人持股異動事後申報表_月", ("查詢年度", "查詢月份"), 12),
+}
+
+DATASET_BY_COLLECTION = {dataset.collection: dataset for dataset in DATASETS.values()}
+
+
+def coverage_enabled():
+    """環境變數 COVERAGE_INDEX=0 時停用寫入時的索引更新"""
+    return os.getenv("COVERAGE_INDEX", "1") != "0"
+
+
+def _signed(word):
+    """無號 64 位元 → Int64 (最高位元為負數)"""
+    return Int64(word - (1 << WORD_BITS) if word >= 1 << (WORD_BITS - 1) else word)
+
+
+def _words_of(indices):
+    """位元位置 → {字組編號: 無號 64 位元}"""
+    words = defaultdict(int)
+    for index in indices:
+        word, bit = divmod(index, WORD_BITS)
+        words[word] |= 1 << bit
+    return words
+
+
+def mark_batch(coverage, dataset, records):
+    """
+    寫入資料後更新索引 (索引更新失敗只顯示警告，不影響已完成的資料寫入)
+
+    Args:
+        coverage: CoverageIndex (None: 停用)
+        dataset: 資料集名稱或 collection 名稱
+        records: 剛寫入的資料字典列表
+
+    Returns:
+        int: 更新的公司數
+    """
+    if coverage is None or not records:
+        return 0
+    try:
+        return coverage.mark(dataset, records)
+    except Exception as e:
+        print(f"  ⚠ 更新覆蓋率索引失敗: {e}")
+        return 0
+
+
+class CoverageIndex:
+    def __init__(self, db, collection=COVERAGE_COLLECTION):
+        """
+        初始化覆蓋率索引
+
+        Args:
+            db: MongoDB database 物件
+            collection: 索引 collection 名稱
+        """
+        self.db = db
+        self.collection = db[collection]
+        self.collection.create_index([("資料集", 1), ("公司代號", 1)])
+
+    @staticmethod
+    def _dataset(dataset):
+        if isinstance(dataset, CoverageDataset):
+            return dataset
+        if dataset in DATASETS:
+            return DATASETS[dataset]
+        if dataset in DATASET_BY_COLLECTION:
+            return DATASET_BY_COLLECTION[dataset]
+        raise KeyError(f"未知的資料集: {dataset} (可用: {', '.join(DATASETS)})")
+
+    def mark(self, dataset, records):
+        """
+        將一批已寫入的資料標記為已存在 (每家公司一次 $bit or)
+
+        Args:
+            dataset: 資料集名稱、collection 名稱或 CoverageDataset
+            records: 含公司代號與期間欄位的資料字典列表
+
+        Returns:
+            int: 更新的公司數
+        """
+        dataset = self._dataset(dataset)
+        year_field, period_field = dataset.period_fields
+        indices = defaultdict(set)
+        for record in records:
+            code = record.get(dataset.code_field)
+            year, period = record.get(year_field), record.get(period_field)
+            if code is None or year is None or period is None:
+                continue
+            index = dataset.period_index(year, period)
+            if index >= 0:
+                indices[str(code)].add(index)
+        if not indices:
+            return 0
+
+        now = datetime.now()
+        ops = [
+            UpdateOne(
+                {"_id": f"{dataset.name}:{code}"},
+                {
+                    "$bit": {f"位元.{word}": {"or": _signed(bits)} for word, bits in _words_of(code_indices).items()},
+                    "$set": {"資料集": dataset.name, "公司代號": code, "更新時間": now},
+                },
+                upsert=True,
+            )
+            for code, code_indices in indices.items()
+        ]
+        self.collection.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    def rebuild(self, dataset, batch_size=1000):
+        """
+        由資料 collection 重建某資料集的索引 (只讀取唯一鍵欄位)
+
+        Args:
+            dataset: 資料集名稱
+
+        Returns:
+            int: 公司數
+        """
+        dataset = self._dataset(dataset)
+        year_field, period_field = dataset.period_fields
+        pipeline = [
+            {"$match": {dataset.code_field: {"$ne": None}, year_field: {"$ne": None}, period_field: {"$ne": None}}},
+            {"$group": {"_id": f"${dataset.code_field}",
+                        "periods": {"$addToSet": {"y": f"${year_field}", "p": f"${period_field}"}}}},
+        ]
+        now = datetime.now()
+        seen = []
+        ops = []
+        for doc in self.db[dataset.collection].aggregate(pipeline, allowDiskUse=True):
+            code = str(doc["_id"])
+            indices = [dataset.period_index(p["y"], p["p"]) for p in doc["periods"]]
+            words = _words_of(index for index in indices if index >= 0)
+            ops.append(ReplaceOne(
+                {"_id": f"{dataset.name}:{code}"},
+                {"資料集": dataset.name, "公司代號": code,
+                 "位元": {str(word): _signed(bits) for word, bits in words.items()}, "更新時間": now},
+                upsert=True,
+            ))
+            seen.append(f"{dataset.name}:{code}")
+            if len(ops) >= batch_size:
+                self.collection.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+        # 移除資料已不存在的公司
+        self.collection.delete_many({"資料集": dataset.name, "_id": {"$nin": seen}})
+        return len(seen)
+
+    def load(self, dataset, company_codes=None):
+        """
+        載入某資料集的索引為 CoverageMatrix
+
+        Args:
+            dataset: 資料集名稱
+            company_codes: 只載入這些公司 (None: 全部)，矩陣列順序與此相同，沒有資料的公司為全 False
+
+        Returns:
+            CoverageMatrix
+        """
+        dataset = self._dataset(dataset)
+        query = {"資料集": dataset.name}
+        if company_codes is not None:
+            company_codes = [str(code) for code in company_codes]
+            query["公司代號"] = {"$in": company_codes}
+        docs = {doc["公司代號"]: doc.get("位元", {})
+                for doc in self.collection.find(query, {"_id": 0, "公司代號": 1, "位元": 1})}
+
+        codes = company_codes if company_codes is not None else sorted(docs)
+        n_words = max((int(word) + 1 for words in docs.values() for word in words), default=0)
+        packed = np.zeros((len(codes), n_words), dtype="<u8")
+        for row, code in enumerate(codes):
+            for word, value in docs.get(code, {}).items():
+                packed[row, int(word)] = int(value) & ((1 << WORD_BITS) - 1)
+        bits = np.unpackbits(packed.view(np.uint8), axis=1, bitorder="little").astype(bool)
+        return CoverageMatrix(dataset, codes, bits)
+
+
+class CoverageMatrix:
+    def __init__(self, dataset, codes, bits):
+        """
+        記憶體中的覆蓋率矩陣 (列: 公司，欄: 期間)
+
+        Args:
+            dataset: CoverageDataset
+            codes: 公司代號列表 (列順序)
+            bits: NumPy 布林矩陣 shape=(公司數, 期數)
+        """
+        self.dataset = dataset
+        self.codes = list(codes)
+        self.bits = bits
+        self.row_of = {code: row for row, code in enumerate(self.codes)}
+
+    def _columns(self, periods):
+        return np.array([self.dataset.period_index(year, period) for year, period in periods], dtype=np.int64)
+
+    def _view(self, periods):
+        """取出指定期間的欄 (超出矩陣範圍的期間視為沒有資料)"""
+        columns = self._columns(periods)
+        view = np.zeros((len(self.codes), len(columns)), dtype=bool)
+        valid = (columns >= 0) & (columns < self.bits.shape[1])
+        view[:, valid] = self.bits[:, columns[valid]]
+        return view
+
+    def has(self, company_code, year, period):
+        """某公司某期間是否有資料"""
+        row = self.row_of.get(str(company_code))
+        index = self.dataset.period_index(year, period)
+        if row is None or index < 0 or index >= self.bits.shape[1]:
+            return False
+        return bool(self.bits[row, index])
+
+    def missing(self, periods, company_codes=None):
+        """
+        缺少資料的 (公司代號, 年度, 期間)，依公司、期間排序
+
+        Args:
+            periods: [(year, period), ...]
+            company_codes: 只檢查這些公司 (None: 矩陣中所有公司)
+
+        Returns:
+            list: [(公司代號, 年度, 期間), ...]
+        """
+        periods = list(periods)
+        view = self._view(periods)
+        codes = self.codes
+        if company_codes is not None:
+            company_codes = [str(code) for code in company_codes]
+            rows = [self.row_of.get(code, -1) for code in company_codes]
+            present = np.array([row >= 0 for row in rows], dtype=bool)
+            sub = np.zeros((len(rows), len(periods)), dtype=bool)
+            sub[present] = view[[row for row in rows if row >= 0]]
+            view, codes = sub, company_codes
+        rows, cols = np.nonzero(~view)
+        return [(codes[r], periods[c][0], periods[c][1]) for r, c in zip(rows.tolist(), cols.tolist())]
+
+    def progress(self, periods):
+        """
+        各期間有資料的公司數
+
+        Returns:
+            dict: {(year, period): 公司數}
+        """
+        periods = list(periods)
+        counts = self._view(periods).sum(axis=0)
+        return {period: int(count) for period, count in zip(periods, counts)}
+
+    def company_counts(self):
+        """各公司有資料的期數 {公司代號: 期數}"""
+        return dict(zip(self.codes, self.bits.sum(axis=1).tolist()))
+
+    def covered_periods(self):
+        """至少有一家公司有資料的期間列表"""
+        return [self.dataset.period_of(index) for index in np.flatnonzero(self.bits.any(axis=0)).tolist()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintain and inspect the per-company coverage bitmap index.")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection string")
+    parser.add_argument("--database", default="TW_Stock", help="database name")
+    parser.add_argument("--rebuild", nargs="*", metavar="DATASET",
+                        help="rebuild from the data collections (no name: all datasets)")
+    parser.add_argument("--report", metavar="DATASET", help="print per-year coverage of a dataset")
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    args = parse_args()
+    client = MongoClient(args.uri)
+    try:
+        index = CoverageIndex(client[args.database])
+        if args.rebuild is not None:
+            for name in args.rebuild or DATASETS:
+                companies = index.rebuild(name)
+                print(f"✓ {name}: {companies} 家公司")
+
+        if args.report:
+            matrix = index.load(args.report)
+            periods = matrix.covered_periods()
+            if not periods:
+                print(f"⊙ {args.report}: 沒有資料")
+                return
+            print(f"{args.report}: {len(matrix.codes)} 家公司，{len(periods)} 期")
+            progress = matrix.progress(periods)
+            by_year = defaultdict(list)
+            for (year, period), count in progress.items():
+                by_year[year].append(count)
+            for year, counts in sorted(by_year.items()):
+                print(f"  {year} 年: " + " ".join(f"{count:>5}" for count in counts))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
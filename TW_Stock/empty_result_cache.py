@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+query6_1 查無資料快取與預測
+大部分公司月份的查詢結果都是「查無資料」，但每次仍要填表並輪詢 sessionStorage；
+將空結果記錄在 MongoDB (_query6_1_empty)，增量執行時略過已確認為空且已結案的月份，
+並將長期沒有申報資料的公司排到最後
+
+輪詢逾時 (主機過載，結果未知) 另外記錄在 逾時次數 / 逾時時間，只供觀察，不會成為略過查詢的依據
+"""
+
+from datetime import date, datetime, timedelta
+
+# 申報期限過後才視為已結案 (事後申報於次月 15 日前，再保留一段緩衝期給補申報)
+DEFAULT_CLOSE_DAYS = 45
+
+
+def month_close_date(year, month, close_days=DEFAULT_CLOSE_DAYS):
+    """
+    計算某民國年月的結案日期 (次月 1 日 + close_days)
+
+    Args:
+        year: 民國年度
+        month: 月份
+        close_days: 次月 1 日後幾天視為結案
+
+    Returns:
+        date: 結案日期
+    """
+    next_year, next_month = (year + 1911, month + 1) if month < 12 else (year + 1912, 1)
+    return date(next_year, next_month, 1) + timedelta(days=close_days)
+
+
+class EmptyResultCache:
+    def __init__(self, db, collection="_query6_1_empty"):
+        """
+        初始化查無資料快取
+
+        Args:
+            db: MongoDB database 物件
+            collection: 快取 collection 名稱
+        """
+        self.collection = db[collection]
+
+    @staticmethod
+    def _key(company_code, year, month):
+        return f"{company_code}_{year}_{month}"
+
+    def record_empty(self, company_code, year, month):
+        """
+        記錄一次確認的空結果 (頁面顯示查無資料)
+
+        Args:
+            company_code: 公司代號
+            year: 民國年度
+            month: 月份
+        """
+        self.collection.update_one(
+            {"_id": self._key(company_code, year, month)},
+            {"$set": {"公司代號": company_code, "年度": year, "月份": month,
+                      "狀態": "empty", "檢查時間": datetime.now()},
+             "$inc": {"次數": 1}},
+            upsert=True,
+        )
+
+    def record_timeout(self, company_code, year, month):
+        """
+        記錄一次輪詢逾時 (結果未知，與確認的空結果分開存放，不影響 狀態 / 次數 / 檢查時間)
+
+        Args:
+            company_code: 公司代號
+            year: 民國年度
+            month: 月份
+        """
+        self.collection.update_one(
+            {"_id": self._key(company_code, year, month)},
+            {"$set": {"公司代號": company_code, "年度": year, "月份": month, "逾時時間": datetime.now()},
+             "$inc": {"逾時次數": 1}},
+            upsert=True,
+        )
+
+    def clear(self, company_code, year, month):
+        """查到資料時移除快取"""
+        self.collection.delete_one({"_id": self._key(company_code, year, month)})
+
+    def load(self, company_codes=None):
+        """
+        一次載入快取
+
+        Args:
+            company_codes: 只載入這些公司 (None: 全部)
+
+        Returns:
+            dict: {(公司代號, 年度, 月份): (狀態, 次數, 檢查時間)}，只有逾時紀錄的月份 狀態 為 None
+        """
+        query = {"公司代號": {"$in": list(company_codes)}} if company_codes is not None else {}
+        projection = {"_id": 0, "公司代號": 1, "年度": 1, "月份": 1, "狀態": 1, "次數": 1, "檢查時間": 1}
+        return {
+            (doc["公司代號"], doc["年度"], doc["月份"]): (doc.get("狀態"), doc.get("次數", 0), doc.get("檢查時間"))
+            for doc in self.collection.find(query, projection)
+        }
+
+
+class EmptyPredictor:
+    def __init__(self, entries, today=None, close_days=DEFAULT_CLOSE_DAYS, streak_threshold=24):
+        """
+        依快取判斷哪些公司月份不需要再查詢
+
+        Args:
+            entries: EmptyResultCache.load() 的結果
+            today: 判斷結案的基準日 (預設今天)
+            close_days: 次月 1 日後幾天視為結案
+            streak_threshold: 最近連續幾個月查無資料的公司降低優先順序
+        """
+        self.entries = entries
+        self.today = today or date.today()
+        self.close_days = close_days
+        self.streak_threshold = streak_threshold
+
+    def is_closed(self, year, month):
+        """該月份的申報期限 (含緩衝期) 是否已過"""
+        return self.today >= month_close_date(year, month, self.close_days)
+
+    def is_known_empty(self, company_code, year, month):
+        """快取中是否已確認為空 (只有頁面顯示查無資料才算；逾時不算)"""
+        entry = self.entries.get((company_code, year, month))
+        return entry is not None and entry[0] == "empty"
+
+    def should_skip(self, company_code, year, month):
+        """
+        是否略過查詢：已確認為空，且最後一次檢查是在結案之後 (之後不會再有補申報)
+
+        Returns:
+            bool
+        """
+        if not self.is_known_empty(company_code, year, month) or not self.is_closed(year, month):
+            return False
+        checked_at = self.entries[(company_code, year, month)][2]
+        if checked_at is None:
+            return False
+        checked_on = checked_at.date() if isinstance(checked_at, datetime) else checked_at
+        return checked_on >= month_close_date(year, month, self.close_days)
+
+    def empty_streak(self, company_code, year_month_list):
+        """
+        從最近一個查詢過的月份往回計算連續查無資料的月數 (尚未查詢過的新月份不中斷計算)
+
+        Args:
+            company_code: 公司代號
+            year_month_list: [(year, month), ...]
+
+        Returns:
+            int: 連續月數
+        """
+        streak = 0
+        for year, month in sorted(year_month_list, reverse=True):
+            if streak == 0 and (company_code, year, month) not in self.entries:
+                continue
+            if not self.is_known_empty(company_code, year, month):
+                break
+            streak += 1
+        return streak
+
+    def plan(self, company_codes, year_month_list):
+        """
+        產生增量執行計畫
+
+        Args:
+            company_codes: 公司代號列表
+            year_month_list: [(year, month), ...]
+
+        Returns:
+            tuple: (略過的任務 set[(公司代號, 年度, 月份)], 降低優先順序的公司 set)
+        """
+        skip = {
+            (code, year, month)
+            for code in company_codes
+            for year, month in year_month_list
+            if self.should_skip(code, year, month)
+        }
+        low_priority = {
+            code for code in company_codes
+            if self.empty_streak(code, year_month_list) >= self.streak_threshold
+        }
+        return skip, low_priority
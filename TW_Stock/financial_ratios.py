@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+財務比率計算引擎
+一次載入一季的資產負債表、綜合損益表、現金流量表，對齊成以公司代號為索引的 DataFrame，
+整季向量化計算比率後以單次 bulk_write 寫入「財務比率」
+
+- 三種文件結構 (raw / typed / packed，statement_schema.py) 都可讀取，表頭經 normalize_header 對應到固定欄位
+- 增量模式依各報表的 更新時間 高水位，只重算有報表新增或更新的 (公司, 年度, 季別)，
+  例如現金流量表晚到時只重算這些公司的比率；高水位存為掃描開始時間減去安全邊際
+  (爬蟲在寫入前就設定 更新時間，較晚完成的寫入可能帶有比已掃描文件更早的時間)
+- 損益表與現金流量表為年初至當季的累計數，獲利比率為累計值 (未年化)
+
+Usage:
+    python financial_ratios.py --year 113 --season 2
+    python financial_ratios.py --incremental             # 只重算上次執行後有更新的報表
+    python financial_ratios.py --year 113 --season 2 --ratios 流動比率,負債比率
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from bson.decimal128 import Decimal128
+from pymongo import MongoClient, ASCENDING
+
+from mongodb_helper import bulk_upsert
+from statement_schema import StatementSchema, normalize_header
+
+RATIO_COLLECTION = "財務比率"
+STATE_COLLECTION = "_financial_ratio_state"
+KEY_FIELDS = ("公司代號", "年度", "季別")
+
+# 增量高水位的安全邊際：更新時間 在 (掃描開始 - 邊際) 之後的文件下次會再檢查一次 (重算結果相同)
+WATERMARK_MARGIN = timedelta(minutes=10)
+
+# 報表鍵值與 statement_scraper.STATEMENTS 相同 (這裡不需要載入 Selenium)：{報表: (報表名稱, collection)}
+STATEMENT_COLLECTIONS = {
+    "balance_sheet": ("資產負債表", "上市櫃公司資產負債表"),
+    "income": ("綜合損益表", "上市櫃公司綜合損益表"),
+    "cashflow": ("現金流量表", "上市櫃公司現金流量表"),
+}
+
+
+class RatioDefinition:
+    def __init__(self, name, numerator, denominator, scale=100.0):
+        """
+        財務比率定義 (分子 / 分母 x scale)
+
+        Args:
+            name: 比率名稱 (寫入的欄位名稱)
+            numerator: (報表, 欄位, 備用欄位...) 報表為 STATEMENT_COLLECTIONS 的鍵值，依序取第一個有值的欄位
+            denominator: 同 numerator
+            scale: 倍數 (百分比為 100，倍數為 1)
+        """
+        self.name = name
+        self.numerator = tuple(numerator)
+        self.denominator = tuple(denominator)
+        self.scale = scale
+
+    def fields(self):
+        """此比率用到的 (報表, 欄位)"""
+        return [(terms[0], field) for terms in (self.numerator, self.denominator) for field in terms[1:]]
+
+
+# 可計算的比率，新增比率只需在此加入定義
+RATIOS = {
+    ratio.name: ratio for ratio in (
+        RatioDefinition("流動比率", ("balance_sheet", "流動資產"), ("balance_sheet", "流動負債")),
+        RatioDefinition("負債比率", ("balance_sheet", "負債總計"), ("balance_sheet", "資產總計")),
+        RatioDefinition(
+            "股東權益報酬率",
+            ("income", "淨利(淨損)歸屬於母公司業主", "本期淨利(淨損)"),
+            ("balance_sheet", "歸屬於母公司業主之權益合計", "權益總計"),
+        ),
+        RatioDefinition("資產報酬率", ("income", "本期淨利(淨損)"), ("balance_sheet", "資產總計")),
+        RatioDefinition("毛利率", ("income", "營業毛利(毛損)"), ("income", "營業收入")),
+        RatioDefinition("營業利益率", ("income", "營業利益(損失)"), ("income", "營業收入")),
+        RatioDefinition("淨利率", ("income", "本期淨利(淨損)"), ("income", "營業收入")),
+        RatioDefinition(
+            "營業現金流量對淨利比",
+            ("cashflow", "營業活動之淨現金流入(流出)"),
+            ("income", "本期淨利(淨損)"),
+            scale=1.0,
+        ),
+    )
+}
+
+
+def _to_float(value):
+    """將 float / Int64 / Decimal128 / 數值字串轉為 float，無法轉換則為 NaN"""
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, str):
+        text = value.replace(",", "").strip()
+        try:
+            return float(text)
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+class FinancialRatioEngine:
+    def __init__(self, connection_string="mongodb://localhost:27017/", ratios=None, watermark_margin=WATERMARK_MARGIN):
+        """
+        初始化財務比率引擎
+
+        Args:
+            connection_string: MongoDB 連線字串
+            ratios: 要計算的比率名稱列表 (None: RATIOS 全部)
+            watermark_margin: 增量高水位的安全邊際 (timedelta)，應大於爬蟲設定 更新時間 到寫入完成的最長時間
+        """
+        self.client = MongoClient(connection_string)
+        self.db = self.client['TW_Stock']
+        self.ratio_collection = self.db[RATIO_COLLECTION]
+        self.state_collection = self.db[STATE_COLLECTION]
+        self.schema = StatementSchema(self.db)
+        self.ratios = [RATIOS[name] for name in (ratios or RATIOS)]
+        self.watermark_margin = watermark_margin
+
+        # 各報表需要載入的欄位
+        self.fields = {}
+        for ratio in self.ratios:
+            for statement, field in ratio.fields():
+                self.fields.setdefault(statement, [])
+                if field not in self.fields[statement]:
+                    self.fields[statement].append(field)
+        # 原始表頭 → 正規化欄位名稱 (raw 模式的表頭在各季幾乎相同，只正規化一次)
+        self._header_names = {}
+
+        self._create_indexes()
+
+    def _create_indexes(self):
+        """建立索引 (比率唯一鍵、報表 更新時間 供增量掃描)"""
+        try:
+            self.ratio_collection.create_index([(field, ASCENDING) for field in KEY_FIELDS], unique=True)
+            for statement in self.fields:
+                self.db[STATEMENT_COLLECTIONS[statement][1]].create_index([("更新時間", ASCENDING)])
+        except Exception as e:
+            print(f"建立索引時發生警告: {e}")
+
+    def _normalized(self, header):
+        name = self._header_names.get(header)
+        if name is None:
+            name = self._header_names[header] = normalize_header(header)
+        return name
+
+    def load_statement(self, statement, year, season, company_codes=None):
+        """
+        載入一季的單一報表，只保留比率需要的欄位
+
+        Args:
+            statement: STATEMENT_COLLECTIONS 的鍵值
+            year: 民國年度
+            season: 季別
+            company_codes: 只載入這些公司 (None: 全部)
+
+        Returns:
+            pd.DataFrame: 以公司代號為索引，欄位為需要的欄位與 更新時間
+        """
+        wanted = self.fields[statement]
+        position = {field: i for i, field in enumerate(wanted)}
+        query = {"年度": year, "季別": season}
+        if company_codes is not None:
+            query["公司代號"] = {"$in": list(company_codes)}
+
+        codes, updated, rows = [], [], []
+        for document in self.db[STATEMENT_COLLECTIONS[statement][1]].find(query):
+            document = self.schema.unpack_document(document)
+            row = [np.nan] * len(wanted)
+            for header, value in document.items():
+                i = position.get(self._normalized(header))
+                if i is not None:
+                    row[i] = _to_float(value)
+            codes.append(str(document["公司代號"]))
+            updated.append(document.get("更新時間"))
+            rows.append(row)
+
+        frame = pd.DataFrame(rows, index=pd.Index(codes, name="公司代號"), columns=wanted, dtype="float64")
+        frame["更新時間"] = pd.to_datetime(pd.Series(updated, index=frame.index, dtype="object"))
+        return frame
+
+    def load_quarter(self, year, season, company_codes=None):
+        """
+        載入一季的三張報表並以公司代號對齊 (任一報表有資料的公司都會出現，缺少的欄位為 NaN)
+
+        Returns:
+            pd.DataFrame: 欄位為 (報表, 欄位) 的 MultiIndex
+        """
+        frames = {statement: self.load_statement(statement, year, season, company_codes) for statement in self.fields}
+        return pd.concat(frames, axis=1, join="outer").sort_index()
+
+    @staticmethod
+    def _pick(frame, terms):
+        """(報表, 欄位, 備用欄位...) → 依序取第一個有值的欄位"""
+        statement, fields = terms[0], terms[1:]
+        values = pd.Series(np.nan, index=frame.index)
+        for field in fields:
+            if (statement, field) in frame.columns:
+                values = values.fillna(frame[(statement, field)])
+        return values
+
+    def compute(self, frame):
+        """
+        整季向量化計算比率 (分母為 0 或缺值時為 NaN)
+
+        Args:
+            frame: load_quarter 的結果
+
+        Returns:
+            pd.DataFrame: 以公司代號為索引，欄位為比率名稱
+        """
+        result = pd.DataFrame(index=frame.index)
+        for ratio in self.ratios:
+            numerator = self._pick(frame, ratio.numerator).to_numpy()
+            denominator = self._pick(frame, ratio.denominator).to_numpy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = numerator / denominator * ratio.scale
+            values[~np.isfinite(values)] = np.nan
+            result[ratio.name] = values
+        return result
+
+    def compute_quarter(self, year, season, company_codes=None):
+        """
+        計算並寫入一季的比率
+
+        Args:
+            year: 民國年度
+            season: 季別
+            company_codes: 只重算這些公司 (None: 全部)
+
+        Returns:
+            int: 寫入的筆數
+        """
+        frame = self.load_quarter(year, season, company_codes)
+        if frame.empty:
+            return 0
+        ratios = self.compute(frame)
+
+        now = datetime.now()
+        sources = {statement: frame[(statement, "更新時間")] for statement in self.fields}
+        values = ratios.astype(object).where(ratios.notna(), None)
+        records = []
+        for code, row in zip(values.index, values.itertuples(index=False, name=None)):
+            record = {"公司代號": code, "年度": year, "季別": season}
+            record.update(zip(values.columns, row))
+            record["來源更新時間"] = {
+                STATEMENT_COLLECTIONS[statement][0]: (None if pd.isna(series[code]) else series[code].to_pydatetime())
+                for statement, series in sources.items()
+            }
+            record["計算時間"] = now
+            records.append(record)
+        return bulk_upsert(self.ratio_collection, records, KEY_FIELDS)
+
+    def _changed_since_watermark(self):
+        """
+        依各報表 更新時間 高水位找出需要重算的公司
+
+        Returns:
+            tuple: ({(年度, 季別): set(公司代號)}, {報表: 新的高水位})
+
+        新的高水位為掃描開始時間減去 watermark_margin，而不是掃描到的最大 更新時間：
+        更新時間 在寫入前設定，掃描期間才完成的寫入可能比已掃描到的文件更早
+        """
+        state = self.state_collection.find_one({"_id": "watermark"}) or {}
+        mark = datetime.now() - self.watermark_margin
+        changed, marks = {}, {}
+        for statement in self.fields:
+            since = state.get(statement)
+            query = {"更新時間": {"$gt": since}} if since else {"更新時間": {"$exists": True}}
+            projection = {"公司代號": 1, "年度": 1, "季別": 1, "更新時間": 1, "_id": 0}
+            for doc in self.db[STATEMENT_COLLECTIONS[statement][1]].find(query, projection):
+                changed.setdefault((doc["年度"], doc["季別"]), set()).add(str(doc["公司代號"]))
+            # 不讓高水位倒退 (例如縮小 watermark_margin 後)
+            marks[statement] = max(mark, since) if since else mark
+        return changed, marks
+
+    def update(self):
+        """
+        增量重算：只重算上次執行後有任一報表新增或更新的 (公司, 年度, 季別)
+
+        Returns:
+            int: 寫入的筆數
+        """
+        changed, marks = self._changed_since_watermark()
+        total = 0
+        for (year, season), codes in sorted(changed.items()):
+            saved = self.compute_quarter(year, season, codes)
+            total += saved
+            print(f"  ✓ {year}年 Q{season}: 重算 {len(codes)} 家公司，寫入 {saved} 筆")
+        if marks:
+            self.state_collection.update_one({"_id": "watermark"}, {"$set": marks}, upsert=True)
+        return total
+
+    def close(self):
+        """關閉 MongoDB 連線"""
+        if self.client:
+            self.client.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compute financial ratios from TW_Stock statement collections.")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/", help="MongoDB connection uri")
+    parser.add_argument("--year", type=int, help="ROC year, e.g. 113")
+    parser.add_argument("--season", type=int, choices=(1, 2, 3, 4), help="quarter (1-4)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="recompute only statements added or updated since the last run (更新時間)")
+    parser.add_argument("--ratios", default=",".join(RATIOS),
+                        help="comma separated ratio names (default: all)")
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    args = parse_args()
+    names = [name.strip() for name in args.ratios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RATIOS]
+    if unknown:
+        print(f"✗ 未知的比率: {', '.join(unknown)} (可用: {', '.join(RATIOS)})")
+        return
+
+    engine = FinancialRatioEngine(args.mongo_uri, names)
+    try:
+        if args.incremental:
+            total = engine.update()
+            print(f"✓ 增量重算完成，寫入 {total} 筆{RATIO_COLLECTION}")
+        elif args.year and args.season:
+            total = engine.compute_quarter(args.year, args.season)
+            print(f"✓ {args.year}年 Q{args.season}: 寫入 {total} 筆{RATIO_COLLECTION}")
+        else:
+            print("請指定 --year 與 --season，或使用 --incremental")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+內部人持股異動明細的分桶儲存
+每個公司月份只存一份文件，明細以陣列 (每列一個值陣列) 儲存，
+欄位名稱依 titles 簽章只在 _query6_1_columns 存一次
+
+titles 在所有公司、月份幾乎都相同，TitleSchemaCache 依簽章只展開一次欄位名稱，
+之後每列明細只需 zip 預先建立的欄位 tuple
+
+文件結構:
+    {公司代號, 查詢年度, 查詢月份, 市場別, 公司簡稱, 欄位表, 筆數, 明細: [[...], ...], 更新時間}
+"""
+
+import json
+import hashlib
+from datetime import datetime
+from pymongo import ASCENDING
+
+BUCKET_COLLECTION = "內部人持股異動事後申報表_月"
+COLUMNS_COLLECTION = "_query6_1_columns"
+
+# 每份明細文件都會帶的基本欄位
+BASE_FIELDS = ("公司代號", "查詢年度", "查詢月份", "市場別", "公司簡稱")
+
+
+def flatten_titles(titles):
+    """
+    將巢狀 titles 展開為欄位名稱列表 (有 sub 的欄位展開為「主欄位-子欄位」)
+
+    Args:
+        titles: titles 陣列
+
+    Returns:
+        list: 欄位名稱列表
+    """
+    columns = []
+    for title in titles:
+        main = title.get('main', '')
+        if title.get('sub'):
+            columns.extend(f"{main}-{sub.get('main', '')}" for sub in title['sub'])
+        else:
+            columns.append(main)
+    return columns
+
+
+def title_signature(titles):
+    """
+    計算 titles 結構的簽章 (相同表頭的查詢結果共用同一個欄位表)
+
+    Args:
+        titles: query6_1 回傳的 titles 陣列
+
+    Returns:
+        str: 簽章 (12 碼 hex)
+    """
+    text = json.dumps(titles, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class TitleSchema:
+    __slots__ = ("signature", "columns")
+
+    def __init__(self, signature, columns):
+        """
+        單一 titles 簽章的欄位對應 (每個簽章只建立一次)
+
+        Args:
+            signature: titles 簽章
+            columns: 展開後的欄位名稱 tuple
+        """
+        self.signature = signature
+        self.columns = tuple(columns)
+
+    def to_document(self, base, row):
+        """
+        將一列明細轉為文件 (欄位數多於值時忽略多出的欄位，值多於欄位時忽略多出的值)
+
+        Args:
+            base: 基本欄位字典
+            row: 明細值陣列
+
+        Returns:
+            dict
+        """
+        document = base.copy()
+        document.update(zip(self.columns, row))
+        return document
+
+
+class TitleSchemaCache:
+    def __init__(self, columns_collection=None):
+        """
+        依 titles 簽章快取欄位對應，可選擇同步存入 MongoDB (與分桶儲存共用 _query6_1_columns)
+
+        Args:
+            columns_collection: 欄位表 collection (None: 只快取在記憶體)
+        """
+        self.columns_collection = columns_collection
+        self._schemas = {}
+
+    def get(self, titles):
+        """
+        取得 titles 對應的欄位結構 (第一次遇到新簽章時展開並存入欄位表)
+
+        Args:
+            titles: titles 陣列
+
+        Returns:
+            TitleSchema
+        """
+        signature = title_signature(titles)
+        schema = self._schemas.get(signature)
+        if schema is None:
+            schema = TitleSchema(signature, flatten_titles(titles))
+            if self.columns_collection is not None:
+                self.columns_collection.update_one(
+                    {"_id": signature},
+                    {"$setOnInsert": {"titles": titles, "欄位": list(schema.columns), "建立時間": datetime.now()}},
+                    upsert=True,
+                )
+            self._schemas[signature] = schema
+        return schema
+
+    def by_signature(self, signature):
+        """
+        依簽章取得欄位結構 (記憶體中沒有時由欄位表載入)
+
+        Args:
+            signature: titles 簽章
+
+        Returns:
+            TitleSchema
+        """
+        schema = self._schemas.get(signature)
+        if schema is None:
+            doc = self.columns_collection.find_one({"_id": signature}) if self.columns_collection is not None else None
+            if doc is None:
+                raise KeyError(f"找不到欄位表: {signature}")
+            schema = TitleSchema(signature, doc["欄位"])
+            self._schemas[signature] = schema
+        return schema
+
+
+class InsiderBucketStore:
+    def __init__(self, db, collection=BUCKET_COLLECTION, columns_collection=COLUMNS_COLLECTION):
+        """
+        初始化分桶儲存
+
+        Args:
+            db: MongoDB database 物件
+            collection: 分桶明細 collection 名稱
+            columns_collection: 欄位表 collection 名稱
+        """
+        self.collection = db[collection]
+        self.columns_collection = db[columns_collection]
+        self.schemas = TitleSchemaCache(self.columns_collection)
+        self.collection.create_index(
+            [("公司代號", ASCENDING), ("查詢年度", ASCENDING), ("查詢月份", ASCENDING)],
+            unique=True,
+        )
+
+    def save(self, data):
+        """
+        將一個公司月份的查詢結果存成單一文件 (重複執行時覆蓋)
+
+        Args:
+            data: scrape_company_data 的結果
+
+        Returns:
+            int: 存入的明細筆數
+        """
+        signature = self.schemas.get(data["標題"]).signature
+        rows = [list(row) for row in data["明細資料"]]
+        key = {field: data[field] for field in ("公司代號", "查詢年度", "查詢月份")}
+        self.collection.update_one(
+            key,
+            {"$set": {
+                "市場別": data["市場別"],
+                "公司簡稱": data["公司簡稱"],
+                "欄位表": signature,
+                "筆數": len(rows),
+                "明細": rows,
+                "更新時間": datetime.now(),
+            }},
+            upsert=True,
+        )
+        return len(rows)
+
+    def iter_rows(self, query=None):
+        """
+        展開分桶文件，逐筆產生與原本每列一份文件相同格式的字典
+
+        Args:
+            query: 分桶文件的查詢條件 (例如 {"公司代號": "2330", "查詢年度": 113})
+
+        Yields:
+            dict: 基本欄位 + 明細欄位
+        """
+        projection = {field: 1 for field in BASE_FIELDS}
+        projection.update({"欄位表": 1, "明細": 1, "_id": 0})
+        for bucket in self.collection.find(query or {}, projection):
+            schema = self.schemas.by_signature(bucket["欄位表"])
+            base = {field: bucket.get(field) for field in BASE_FIELDS}
+            for row in bucket["明細"]:
+                yield schema.to_document(base, row)
+
+    def unwind_pipeline(self, match=None):
+        """
+        在 MongoDB 端展開分桶的 aggregation pipeline (結果格式同 iter_rows)
+
+        Args:
+            match: 分桶文件的查詢條件
+
+        Returns:
+            list: pipeline
+        """
+        pipeline = [{"$match": match}] if match else []
+        pipeline += [
+            {"$lookup": {"from": self.columns_collection.name, "localField": "欄位表",
+                         "foreignField": "_id", "as": "_columns"}},
+            {"$unwind": "$明細"},
+            {"$replaceRoot": {"newRoot": {"$mergeObjects": [
+                {field: f"${field}" for field in BASE_FIELDS},
+                {"$arrayToObject": {"$zip": {"inputs": [
+                    {"$arrayElemAt": ["$_columns.欄位", 0]}, "$明細",
+                ]}}},
+            ]}}},
+        ]
+        return pipeline
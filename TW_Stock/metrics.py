@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+爬蟲共用監控指標模組
+提供 Counter / Gauge / Histogram，透過本機 /metrics HTTP 端點 (Prometheus 文字格式)
+及 JSON 快照檔輸出，用來判斷長時間回補是受限於網路、瀏覽器、CPU 還是 MongoDB
+
+環境變數:
+    METRICS_PORT: 設定後啟動 /metrics HTTP 端點 (例如: 9108)
+    METRICS_SNAPSHOT: 設定後定期寫入 JSON 快照檔 (例如: metrics.json)
+    METRICS_SNAPSHOT_INTERVAL: 快照間隔秒數 (預設: 15)
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延遲類指標的預設區間 (秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 批次大小類指標的預設區間 (筆)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2000, 5000, 10000)
+
+
+def _label_key(label_names, labels):
+    """將標籤字典轉為固定順序的 tuple"""
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def _format_labels(label_names, key, extra=None):
+    pairs = list(zip(label_names, key))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        """累加計數"""
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": dict(zip(self.label_names, key)), "value": value}
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        """設定目前數值"""
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    render = Counter.render
+    snapshot = Counter.snapshot
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """記錄一次觀測值"""
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """以 with 區塊計時並記錄"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for upper, count in zip(self.buckets, state["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', upper)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {state['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {state['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {state['count']}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            result = []
+            for key, state in sorted(self._values.items()):
+                result.append({
+                    "labels": dict(zip(self.label_names, key)),
+                    "count": state["count"],
+                    "sum": state["sum"],
+                    "mean": state["sum"] / state["count"] if state["count"] else 0.0,
+                    "buckets": dict(zip([str(b) for b in self.buckets], state["counts"])),
+                })
+            return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """指標註冊表 (同名指標只建立一次)"""
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get_or_create(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def render_prometheus(self):
+        """輸出 Prometheus 文字格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """輸出可序列化為 JSON 的快照"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "timestamp": time.time(),
+            "pid": os.getpid(),
+            "metrics": {m.name: {"type": m.type_name, "help": m.help_text, "values": m.snapshot()}
+                        for m in metrics},
+        }
+
+    def write_snapshot(self, path):
+        """寫入 JSON 快照檔 (先寫暫存檔再取代，避免讀到寫一半的檔案)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+# 共用指標
+REQUEST_SECONDS = REGISTRY.histogram(
+    "scraper_request_seconds", "Request latency per endpoint", ("endpoint",))
+REQUESTS_TOTAL = REGISTRY.counter(
+    "scraper_requests_total", "Requests per endpoint and outcome", ("endpoint", "status"))
+PARSE_SECONDS = REGISTRY.histogram(
+    "scraper_parse_seconds", "Time spent parsing responses", ("parser",))
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    "scraper_db_write_seconds", "MongoDB write latency per collection", ("collection",))
+DB_BATCH_SIZE = REGISTRY.histogram(
+    "scraper_db_batch_size", "Documents per MongoDB write batch", ("collection",), buckets=SIZE_BUCKETS)
+RECORDS_TOTAL = REGISTRY.counter(
+    "scraper_records_total", "Records written per collection", ("collection",))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "scraper_queue_depth", "Items waiting in a pipeline queue", ("queue",))
+WORKER_ALIVE = REGISTRY.gauge(
+    "scraper_worker_alive", "1 if the worker is alive, 0 otherwise", ("worker",))
+WORKER_HEARTBEAT = REGISTRY.gauge(
+    "scraper_worker_heartbeat_timestamp", "Unix time of the last worker heartbeat", ("worker",))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = json.dumps(self.registry.snapshot(), ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        elif self.path.startswith("/metrics"):
+            body = self.registry.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不輸出每次抓取的存取記錄
+        pass
+
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    在背景執行緒啟動 /metrics 與 /metrics.json 端點
+
+    Args:
+        port: 連接埠
+        host: 綁定位址 (預設只開放本機)
+        registry: 指標註冊表
+
+    Returns:
+        ThreadingHTTPServer: 伺服器實例
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"✓ 監控指標端點: http://{host}:{port}/metrics")
+    return server
+
+
+def start_snapshot_writer(path, interval=15, registry=REGISTRY):
+    """
+    在背景執行緒定期寫入 JSON 快照
+
+    Args:
+        path: 快照檔路徑
+        interval: 間隔秒數
+        registry: 指標註冊表
+
+    Returns:
+        threading.Event: 設定後停止寫入 (停止前會再寫入一次)
+    """
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.wait(interval):
+            try:
+                registry.write_snapshot(path)
+            except Exception as e:
+                print(f"✗ 寫入監控快照失敗: {e}")
+        registry.write_snapshot(path)
+
+    threading.Thread(target=run, daemon=True).start()
+    return stop_event
+
+
+def start_from_env(snapshot_path=None):
+    """
+    依環境變數啟動監控輸出
+
+    Args:
+        snapshot_path: 未設定 METRICS_SNAPSHOT 時使用的快照路徑 (None: 不寫快照)
+
+    Returns:
+        threading.Event | None: 快照寫入器的停止事件
+    """
+    port = os.getenv("METRICS_PORT")
+    if port:
+        try:
+            start_http_server(int(port))
+        except OSError as e:
+            print(f"✗ 無法啟動監控指標端點 (port {port}): {e}")
+
+    path = os.getenv("METRICS_SNAPSHOT", snapshot_path)
+    if path:
+        interval = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "15"))
+        return start_snapshot_writer(path, interval)
+    return None
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+歷史資料 collection 批次轉換工具
+依 _id 範圍將 collection 切成多段，各段由獨立進程以游標讀取、轉換並以 bulk_write 寫回，
+每批寫入後將進度存入 _migrations，中斷後重新執行會從上次的 _id 繼續
+
+轉換後的文件帶有 _schema_version，已是目標版本的文件不會重複處理
+
+寫回時以讀取到的原始文件為條件 (有 更新時間 時比對 _id + 更新時間，否則比對所有頂層欄位)，
+轉換期間被爬蟲改寫的文件不會被舊內容覆蓋，而是重新讀取後再轉換 (重試 retries 次後記為衝突，下次執行再處理)
+
+Usage:
+    python migrate_collections.py --list
+    python migrate_collections.py statement_typed --collection 上市櫃公司資產負債表 --workers 8
+    python migrate_collections.py mops1204_items --dry-run
+"""
+
+import re
+import sys
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError
+from statement_schema import normalize_header, typed_value, StatementSchema
+
+CHECKPOINT_COLLECTION = "_migrations"
+VERSION_FIELD = "_schema_version"
+TIMESTAMP_FIELD = "更新時間"
+
+
+def _statement_typed(doc):
+    """TW_Stock 財報: 原始表頭 + float/字串 → 正規化欄位 + Int64/Decimal128"""
+    if "欄位表" in doc:
+        # 已是 packed 文件
+        return None
+    return StatementSchema().normalize_record(doc, ("_id", "公司代號", "年度", "季別", VERSION_FIELD))
+
+
+def _mops1204_items(doc):
+    """1204_mops 資產負債表: items 字串數值 → Int64/Decimal128，並補上 公司代號/年度/季別"""
+    if "stock_code" not in doc:
+        return None
+    doc = dict(doc)
+    items = {}
+    for name, value in (doc.get("items") or {}).items():
+        value = typed_value(value)
+        if value is not None:
+            items[normalize_header(name)] = value
+    doc["items"] = items
+    # 保留 stock_code/year/season (1204_mops 以此 upsert)，另補 TW_Stock 的鍵欄位方便跨來源查詢
+    doc.setdefault("公司代號", doc["stock_code"])
+    doc.setdefault("年度", int(doc["year"]))
+    doc.setdefault("季別", int(doc["season"]))
+    return doc
+
+
+def _revenue_keys(doc):
+    """fetch_monthly_revenue 每月營收: stockId/year(西元)/month(字串) → 補上 公司代號/年度(民國)/月份 並轉換數值"""
+    if "stockId" not in doc and "年度" in doc:
+        return None
+    doc = dict(doc)
+    if "stockId" in doc:
+        year = int(doc["year"])
+        doc.setdefault("公司代號", doc["stockId"])
+        doc.setdefault("年度", year - 1911 if year > 1911 else year)
+        doc.setdefault("月份", int(doc["month"]))
+    for field in ("營業收入", "去年同月營收", "本年累計營收", "去年累計營收", "營收年增率(%)", "累計年增率(%)"):
+        if field in doc:
+            value = typed_value(doc[field])
+            if value is None:
+                del doc[field]
+            else:
+                doc[field] = value
+    return doc
+
+
+class Migration:
+    def __init__(self, name, version, transform, database, collection, description):
+        """
+        轉換定義
+
+        Args:
+            name: 轉換名稱
+            version: 轉換後的 _schema_version
+            transform: 轉換函式 (doc → 新文件；None 表示不需轉換，只標記版本)，需為模組層級函式以便傳給子進程
+            database: 預設資料庫
+            collection: 預設 collection
+            description: 說明
+        """
+        self.name = name
+        self.version = version
+        self.transform = transform
+        self.database = database
+        self.collection = collection
+        self.description = description
+
+
+MIGRATIONS = {
+    migration.name: migration for migration in (
+        Migration("statement_typed", 1, _statement_typed, "TW_Stock", "上市櫃公司資產負債表",
+                  "財報欄位正規化與型別化 (statement_schema typed 模式)"),
+        Migration("mops1204_items", 1, _mops1204_items, "TW_Stock", "歷史負債資料",
+                  "1204_mops items 字串數值轉型別並補上中文鍵欄位"),
+        Migration("revenue_keys", 1, _revenue_keys, "TW_Stock", "每月營收",
+                  "每月營收 stockId/year/month 補上 公司代號/年度/月份 並轉換數值"),
+    )
+}
+
+
+def split_id_ranges(collection, parts, sample_size=None):
+    """
+    以抽樣的 _id 分位數將 collection 切成多段
+
+    Args:
+        collection: MongoDB collection
+        parts: 段數
+        sample_size: 抽樣數 (預設為段數的 20 倍)
+
+    Returns:
+        list: [(lower, upper), ...]，lower/upper 為 None 表示無下限/上限
+    """
+    if parts <= 1:
+        return [(None, None)]
+    sample_size = sample_size or parts * 20
+    ids = sorted(doc["_id"] for doc in collection.aggregate([
+        {"$sample": {"size": sample_size}},
+        {"$project": {"_id": 1}},
+    ]))
+    if len(ids) < parts:
+        return [(None, None)]
+
+    step = len(ids) / parts
+    bounds = []
+    for i in range(1, parts):
+        bound = ids[int(i * step)]
+        if not bounds or bound != bounds[-1]:
+            bounds.append(bound)
+    edges = [None] + bounds + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _range_filter(lower, upper, after=None):
+    condition = {}
+    if after is not None:
+        condition["$gt"] = after
+    elif lower is not None:
+        condition["$gte"] = lower
+    if upper is not None:
+        condition["$lt"] = upper
+    return {"_id": condition} if condition else {}
+
+
+def _snapshot_filter(doc):
+    """ReplaceOne 條件：只在文件仍與讀取時相同時才寫入"""
+    if TIMESTAMP_FIELD in doc:
+        return {"_id": doc["_id"], TIMESTAMP_FIELD: doc[TIMESTAMP_FIELD]}
+    return dict(doc)
+
+
+def _converted(migration, doc):
+    new_doc = migration.transform(doc)
+    if new_doc is None:
+        new_doc = dict(doc)
+    else:
+        new_doc["_id"] = doc["_id"]
+    new_doc[VERSION_FIELD] = migration.version
+    return new_doc
+
+
+def migrate_range(collection, checkpoints, migration, range_index, lower, upper,
+                  batch_size=1000, dry_run=False, retries=3):
+    """
+    轉換單一 _id 範圍 (依 _id 排序，每批寫入後更新檢查點)
+
+    Args:
+        collection: 目標 collection
+        checkpoints: 檢查點 collection (_migrations)
+        migration: Migration
+        range_index: 範圍編號
+        lower: _id 下限 (含)
+        upper: _id 上限 (不含)
+        batch_size: 每批 bulk_write 筆數
+        dry_run: 只計算需轉換的筆數，不寫入
+        retries: 文件在讀取後被改寫時，重新讀取並轉換的次數
+
+    Returns:
+        dict: {"scanned", "written", "errors", "conflicts"}
+    """
+    checkpoint_id = f"{migration.name}:{collection.full_name}:v{migration.version}:{range_index}"
+    state = checkpoints.find_one({"_id": checkpoint_id}) or {}
+    stats = {key: state.get(key, 0) for key in ("scanned", "written", "errors", "conflicts")}
+    if state.get("done"):
+        return stats
+
+    query = _range_filter(lower, upper, state.get("last_id"))
+    query[VERSION_FIELD] = {"$not": {"$gte": migration.version}}
+    cursor = collection.find(query, sort=[("_id", 1)], batch_size=batch_size, no_cursor_timeout=True)
+
+    def write(docs):
+        """條件式寫回一批文件，返回條件不符 (讀取後被改寫) 的文件 _id"""
+        operations = [ReplaceOne(_snapshot_filter(doc), _converted(migration, doc)) for doc in docs]
+        failed = set()
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            stats["written"] += result.modified_count
+            matched = result.matched_count
+        except BulkWriteError as bwe:
+            # 例如轉換後與既有文件的唯一索引衝突；其餘文件已寫入
+            stats["written"] += bwe.details.get("nModified", 0)
+            stats["errors"] += len(bwe.details.get("writeErrors", []))
+            matched = bwe.details.get("nMatched", 0)
+            failed = {docs[error["index"]]["_id"] for error in bwe.details.get("writeErrors", [])}
+        if matched + len(failed) >= len(docs):
+            return []
+        return [doc["_id"] for doc in docs if doc["_id"] not in failed]
+
+    def flush(docs, last_id):
+        if docs and not dry_run:
+            for attempt in range(retries + 1):
+                ids = write(docs)
+                if not ids:
+                    break
+                # 重新讀取仍未轉換的文件 (已被刪除或其他程序轉換過的不再處理)
+                docs = list(collection.find({"_id": {"$in": ids}, VERSION_FIELD: {"$not": {"$gte": migration.version}}}))
+                if not docs:
+                    break
+                if attempt == retries:
+                    stats["conflicts"] += len(docs)
+        if not dry_run:
+            checkpoints.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"migration": migration.name, "collection": collection.full_name,
+                          "version": migration.version, "range": range_index,
+                          "lower": lower, "upper": upper, "last_id": last_id,
+                          "updated_at": datetime.now(), **stats}},
+                upsert=True,
+            )
+
+    docs = []
+    last_id = None
+    try:
+        for doc in cursor:
+            stats["scanned"] += 1
+            last_id = doc["_id"]
+            if dry_run:
+                _converted(migration, doc)
+                stats["written"] += 1
+            docs.append(doc)
+            if len(docs) >= batch_size:
+                flush(docs, last_id)
+                docs = []
+        flush(docs, last_id if last_id is not None else state.get("last_id"))
+    finally:
+        cursor.close()
+
+    if not dry_run:
+        checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"done": True, "finished_at": datetime.now()}})
+    return stats
+
+
+def _run_range(uri, database, collection_name, migration_name, range_index, lower, upper, batch_size, dry_run):
+    """子進程執行單一範圍 (每個進程使用自己的 MongoClient)"""
+    client = MongoClient(uri)
+    try:
+        db = client[database]
+        return range_index, migrate_range(db[collection_name], db[CHECKPOINT_COLLECTION], MIGRATIONS[migration_name],
+                                          range_index, lower, upper, batch_size, dry_run)
+    finally:
+        client.close()
+
+
+def run_migration(migration_name, uri="mongodb://localhost:27017/", database=None, collection=None,
+                  workers=4, parts=None, batch_size=1000, dry_run=False, client=None):
+    """
+    執行轉換
+
+    Args:
+        migration_name: MIGRATIONS 中的名稱
+        uri: MongoDB 連線字串
+        database: 資料庫 (預設為轉換定義中的資料庫)
+        collection: collection (預設為轉換定義中的 collection)
+        workers: 進程數 (0: 在目前進程依序執行)
+        parts: _id 範圍段數 (預設為進程數的 4 倍，讓較快的進程多處理幾段)
+        batch_size: 每批 bulk_write 筆數
+        dry_run: 只計算，不寫入
+        client: 已建立的 MongoClient (workers=0 時可傳入)
+
+    Returns:
+        dict: 總計 {"scanned", "written", "errors", "conflicts", "seconds"}
+    """
+    migration = MIGRATIONS[migration_name]
+    database = database or migration.database
+    collection_name = collection or migration.collection
+    client = client or MongoClient(uri)
+    db = client[database]
+    target = db[collection_name]
+    checkpoints = db[CHECKPOINT_COLLECTION]
+
+    prefix = f"{migration.name}:{target.full_name}:v{migration.version}:"
+    saved = list(checkpoints.find({"_id": {"$regex": f"^{re.escape(prefix)}"}}).sort("range", 1))
+    if saved and all(cp.get("done") for cp in saved) and not dry_run:
+        # 上次已全部完成：重新切分，只處理之後新增 (尚未帶 _schema_version) 的文件
+        reset_checkpoints(migration.name, client, database, collection_name)
+        saved = []
+    if saved and not dry_run:
+        # 續跑：沿用第一次執行時的範圍切分
+        ranges = [(cp["lower"], cp["upper"]) for cp in saved]
+        done = sum(1 for cp in saved if cp.get("done"))
+        print(f"⊙ 找到檢查點，{done}/{len(saved)} 段已完成，從上次進度繼續")
+    else:
+        ranges = split_id_ranges(target, parts or max(1, workers) * 4)
+        if not dry_run:
+            for i, (lower, upper) in enumerate(ranges):
+                checkpoints.update_one(
+                    {"_id": f"{prefix}{i}"},
+                    {"$setOnInsert": {"migration": migration.name, "collection": target.full_name,
+                                      "version": migration.version, "range": i, "lower": lower, "upper": upper}},
+                    upsert=True,
+                )
+
+    print(f"轉換 {migration.name} (v{migration.version}) → {target.full_name}，{len(ranges)} 段，{workers} 個進程"
+          + (" [dry run]" if dry_run else ""))
+    start = time.time()
+    totals = {"scanned": 0, "written": 0, "errors": 0, "conflicts": 0}
+
+    def add(range_index, stats):
+        for key in totals:
+            totals[key] += stats[key]
+        elapsed = time.time() - start
+        print(f"  ✓ 第 {range_index + 1} 段完成: 掃描 {stats['scanned']}，寫入 {stats['written']}，錯誤 {stats['errors']}，"
+              f"衝突 {stats['conflicts']} "
+              f"(累計 {totals['scanned']} 筆，{totals['scanned'] / max(elapsed, 1e-9):.0f} 筆/秒)")
+
+    if workers <= 0:
+        for i, (lower, upper) in enumerate(ranges):
+            add(i, migrate_range(target, checkpoints, migration, i, lower, upper, batch_size, dry_run))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_run_range, uri, database, collection_name, migration.name,
+                                i, lower, upper, batch_size, dry_run)
+                for i, (lower, upper) in enumerate(ranges)
+            ]
+            for future in as_completed(futures):
+                add(*future.result())
+
+    totals["seconds"] = time.time() - start
+    print(f"\n✓ 完成: 掃描 {totals['scanned']} 筆，寫入 {totals['written']} 筆，錯誤 {totals['errors']} 筆，"
+          f"衝突 {totals['conflicts']} 筆，耗時 {totals['seconds']:.1f} 秒")
+    if totals["conflicts"]:
+        print("⚠ 部分文件在轉換期間持續被改寫，未帶新版本，重新執行即可補上 (或暫停爬蟲後再執行)")
+    return totals
+
+
+def reset_checkpoints(migration_name, client, database=None, collection=None):
+    """
+    清除某轉換的檢查點 (下次執行時重新切分範圍；已轉換的文件仍會因 _schema_version 而略過)
+
+    Returns:
+        int: 刪除筆數
+    """
+    migration = MIGRATIONS[migration_name]
+    db = client[database or migration.database]
+    target = db[collection or migration.collection]
+    prefix = f"{migration.name}:{target.full_name}:v{migration.version}:"
+    return db[CHECKPOINT_COLLECTION].delete_many({"_id": {"$regex": f"^{re.escape(prefix)}"}}).deleted_count
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rewrite historical collections in parallel _id ranges.")
+    parser.add_argument("migration", nargs="?", help="migration name (see --list)")
+    parser.add_argument("--list", action="store_true", help="list available migrations")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection string")
+    parser.add_argument("--database", help="database (default: the migration's database)")
+    parser.add_argument("--collection", help="collection (default: the migration's collection)")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes (0: run in this process)")
+    parser.add_argument("--parts", type=int, help="number of _id ranges (default: workers x 4)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per bulk_write")
+    parser.add_argument("--dry-run", action="store_true", help="count documents to rewrite without writing")
+    parser.add_argument("--reset", action="store_true", help="drop saved checkpoints before running")
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    args = parse_args()
+    if args.list or not args.migration:
+        for migration in MIGRATIONS.values():
+            print(f"{migration.name:<18} v{migration.version}  {migration.database}.{migration.collection:<16} "
+                  f"{migration.description}")
+        return
+
+    if args.migration not in MIGRATIONS:
+        print(f"✗ 未知的轉換: {args.migration}")
+        sys.exit(1)
+
+    if args.reset:
+        client = MongoClient(args.uri)
+        deleted = reset_checkpoints(args.migration, client, args.database, args.collection)
+        print(f"⊙ 已清除 {deleted} 個檢查點")
+        client.close()
+
+    run_migration(args.migration, uri=args.uri, database=args.database, collection=args.collection,
+                  workers=args.workers, parts=args.parts, batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
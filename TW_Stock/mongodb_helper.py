@@ -4,8 +4,91 @@
 MongoDB 資料庫操作輔助模組
 """
 
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime
+import time
+from metrics import DB_WRITE_SECONDS, DB_BATCH_SIZE, RECORDS_TOTAL
+from coverage_index import CoverageIndex, coverage_enabled, mark_batch
+
+
+def find_existing_keys(collection, key_fields, records):
+    """
+    以單次投影查詢取得已存在於集合中的鍵值組合
+
+    Args:
+        collection: MongoDB collection
+        key_fields: 唯一鍵欄位 (例如: ("公司代號", "年度", "季別"))
+        records: 待寫入的資料字典列表
+
+    Returns:
+        set: 已存在的鍵值 tuple 集合
+    """
+    if not records:
+        return set()
+
+    query = {}
+    for field in key_fields:
+        values = list({record[field] for record in records})
+        query[field] = values[0] if len(values) == 1 else {"$in": values}
+
+    projection = {field: 1 for field in key_fields}
+    projection["_id"] = 0
+
+    existing = set()
+    for doc in collection.find(query, projection):
+        existing.add(tuple(doc.get(field) for field in key_fields))
+    return existing
+
+
+def bulk_upsert(collection, records, key_fields, written=None):
+    """
+    以單次 unordered bulk_write 批次 upsert 資料
+
+    Args:
+        collection: MongoDB collection
+        records: 資料字典列表
+        key_fields: 唯一鍵欄位
+        written: 傳入 list 時附加實際寫入成功的資料 (部分失敗時排除失敗的資料，供覆蓋率索引只標記已寫入的期間)
+
+    Returns:
+        int: 成功寫入 (新增或已比對) 的筆數
+    """
+    if not records:
+        return 0
+
+    operations = [
+        UpdateOne(
+            {field: record[field] for field in key_fields},
+            {"$set": record},
+            upsert=True
+        )
+        for record in records
+    ]
+
+    DB_BATCH_SIZE.observe(len(operations), collection=collection.name)
+    start = time.perf_counter()
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        saved_count = result.upserted_count + result.matched_count
+        RECORDS_TOTAL.inc(saved_count, collection=collection.name)
+        if written is not None:
+            written.extend(records)
+        return saved_count
+    except BulkWriteError as bwe:
+        # 即使有錯誤，部分資料可能已成功寫入
+        details = bwe.details
+        saved_count = details.get('nUpserted', 0) + details.get('nMatched', 0)
+        print(f"✗ 批次寫入部分失敗: {len(details.get('writeErrors', []))} 筆錯誤")
+        if written is not None:
+            failed = {error['index'] for error in details.get('writeErrors', [])}
+            written.extend(record for i, record in enumerate(records) if i not in failed)
+        return saved_count
+    except Exception as e:
+        print(f"✗ 批次寫入失敗: {e}")
+        return 0
+    finally:
+        DB_WRITE_SECONDS.observe(time.perf_counter() - start, collection=collection.name)
 
 
 class MongoDBHelper:
@@ -26,6 +109,9 @@ class MongoDBHelper:
         # 建立索引以提升查詢效率
         self._create_indexes()
 
+        # 覆蓋率點陣索引 (每次批次寫入後更新，COVERAGE_INDEX=0 停用)
+        self.coverage = CoverageIndex(self.db) if coverage_enabled() else None
+
     def _create_indexes(self):
         """建立索引"""
         try:
@@ -142,10 +228,12 @@ class MongoDBHelper:
         Returns:
             int: 成功插入的筆數
         """
-        success_count = 0
+        now = datetime.now()
         for data in data_list:
-            if self.insert_balance_sheet(data):
-                success_count += 1
+            data["更新時間"] = now
+        written = []
+        success_count = bulk_upsert(self.balance_sheet, data_list, ("公司代號", "年度", "季別"), written)
+        mark_batch(self.coverage, "balance_sheet", written)
         return success_count
 
     def get_missing_data(self, company_code, start_year, end_year):
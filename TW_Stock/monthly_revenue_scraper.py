@@ -5,25 +5,228 @@
 https://mopsov.twse.com.tw/nas/t21/sii/t21sc03_91_1.html
 """
 
+import os
+import sys
 import time
+import argparse
+import queue
+import threading
 import requests
 import pandas as pd
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pymongo import MongoClient, ASCENDING
 from datetime import datetime
+from mongodb_helper import find_existing_keys, bulk_upsert
+from metrics import REQUEST_SECONDS, REQUESTS_TOTAL, PARSE_SECONDS, QUEUE_DEPTH, start_from_env
+from rate_limiter import create_rate_limiter
+from coverage_index import CoverageIndex, coverage_enabled, mark_batch
 import urllib3
 
 # 關閉 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# t21sc03 靜態頁面位址 (可用環境變數改連到本機模擬伺服器)
+MOPSOV_BASE_URL = os.getenv("MOPSOV_BASE_URL", "https://mopsov.twse.com.tw").rstrip("/")
+
+# 每月營收唯一鍵
+REVENUE_KEY_FIELDS = ("公司代號", "年度", "月份")
+
+# 衍生指標與 1126_pythonAPI 的爬蟲共用同一份實作 (revenue_derived.py)
+DERIVED_MODULE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "1126_pythonAPI", "python")
+
+
+# 表頭編譯快取 {表頭簽章: (公司代號欄位位置, ((欄位位置, 欄位名稱), ...)) 或 None (無公司代號欄位)}
+# 同一市場各年月、各產業表格的表頭幾乎相同，每個行程只需解析一次
+_HEADER_CACHE = {}
+
+
+def _column_name(col):
+    """
+    將 pandas 欄位轉為儲存用欄位名稱
+    例如: ('營業收入', '當月營收') -> '營業收入_當月營收'，('Unnamed: 0_level_0', '公司名稱') -> '公司名稱'
+    """
+    if isinstance(col, tuple):
+        if len(col) >= 2:
+            col_name = str(col[1]).strip()
+            # 如果第一個元素不是 Unnamed，加上前綴
+            if not str(col[0]).startswith('Unnamed'):
+                col_name = f"{col[0]}_{col_name}"
+            return col_name
+        return str(col).strip()
+    return str(col).strip()
+
+
+def compile_revenue_header(columns):
+    """
+    編譯表頭：找出公司代號欄位並預先計算其他欄位的位置與名稱 (有快取)
+
+    Args:
+        columns: DataFrame 欄位 (df.columns)
+
+    Returns:
+        tuple | None: (公司代號欄位位置, ((欄位位置, 欄位名稱), ...))，沒有公司代號欄位時返回 None
+    """
+    signature = tuple(columns)
+    if signature in _HEADER_CACHE:
+        return _HEADER_CACHE[signature]
+
+    # 欄位可能是 tuple 格式: ('Unnamed: 0_level_0', '公司 代號')
+    code_column = None
+    code_pos = None
+    for pos, col in enumerate(signature):
+        col_str = ' '.join(str(c) for c in col) if isinstance(col, tuple) else str(col)
+        col_str = col_str.strip()
+        if '公司 代號' in col_str or '公司代號' in col_str:
+            code_column, code_pos = col, pos
+            break
+
+    if code_pos is None:
+        compiled = None
+    else:
+        fields = tuple(
+            (pos, _column_name(col))
+            for pos, col in enumerate(signature)
+            if col != code_column
+        )
+        compiled = (code_pos, fields)
+
+    _HEADER_CACHE[signature] = compiled
+    return compiled
+
+
+def parse_revenue_table(html_content, year, month, market_type):
+    """
+    解析營收表格資料 (不含資料庫檢查，可在子進程中執行)
+
+    Args:
+        html_content: HTML 內容
+        year: 年度
+        month: 月份
+        market_type: 市場別
+
+    Returns:
+        list: 所有代號為純數字的資料列表
+    """
+    # 使用 pandas 讀取 HTML 表格
+    tables = pd.read_html(StringIO(html_content))
+
+    revenue_data = []
+
+    # 處理所有表格（每個產業別一個表格）
+    for df in tables:
+        header = compile_revenue_header(df.columns)
+
+        # 如果這個表格沒有公司代號欄位，跳過
+        if header is None:
+            continue
+        code_pos, fields = header
+
+        # 逐列處理 (依預先計算的欄位位置取值)
+        for row in df.itertuples(index=False, name=None):
+            try:
+                # 取得公司代號
+                company_code = str(row[code_pos]).strip()
+
+                # 檢查是否為有效的公司代號 (純數字)
+                if not company_code.isdigit():
+                    continue
+
+                # 建立資料記錄
+                record = {
+                    "公司代號": company_code,
+                    "年度": year,
+                    "月份": month,
+                    "市場別": market_type,
+                }
+
+                # 將所有欄位加入記錄
+                for pos, col_name in fields:
+                    # 處理數值型態
+                    value = row[pos]
+                    if pd.notna(value):
+                        # 嘗試轉換為數值
+                        try:
+                            # 移除逗號並轉換
+                            if isinstance(value, str):
+                                value = value.replace(',', '')
+                                if value and value != '-':
+                                    value = float(value) if '.' in value else int(value)
+                                else:
+                                    value = None
+                        except:
+                            pass  # 保持原值
+
+                        if value is not None:
+                            record[col_name] = value
+
+                revenue_data.append(record)
+
+            except Exception as e:
+                continue
+
+    return revenue_data
+
+
+def parse_revenue_page(content, year, month, market_type, encoding='big5'):
+    """
+    解碼並解析 t21sc03 回應內容 (ProcessPoolExecutor 的工作函式)
+
+    Args:
+        content: 回應的原始 bytes
+        year: 年度
+        month: 月份
+        market_type: 市場別
+        encoding: 頁面編碼
+
+    Returns:
+        list: 解析後的資料列表
+    """
+    html_content = content.decode(encoding, errors='replace')
+    return parse_revenue_table(html_content, year, month, market_type)
+
+
+def parse_revenue_page_timed(content, year, month, market_type, encoding='big5'):
+    """
+    同 parse_revenue_page，並回傳子進程內的解析耗時
+
+    Returns:
+        tuple: (資料列表, 解析秒數)
+    """
+    start = time.perf_counter()
+    records = parse_revenue_page(content, year, month, market_type, encoding)
+    return records, time.perf_counter() - start
+
+
+def load_revenue_derived():
+    """
+    載入 revenue_derived 模組 (只在啟用衍生指標時呼叫)
+    已在 PYTHONPATH 中時直接匯入，否則才加入 1126_pythonAPI/python
+
+    Returns:
+        module: revenue_derived
+    """
+    try:
+        import revenue_derived
+    except ImportError:
+        sys.path.append(os.path.normpath(DERIVED_MODULE_DIR))
+        import revenue_derived
+    return revenue_derived
+
 
 class MonthlyRevenueScraper:
-    def __init__(self, connection_string="mongodb://localhost:27017/"):
+    def __init__(self, connection_string="mongodb://localhost:27017/", rate_limiter=None, derived=None):
         """
         初始化每月營收爬蟲
 
         Args:
             connection_string: MongoDB 連線字串
+            rate_limiter: 共用限速器 (rate_limiter.py)，設定後取代各執行緒固定的 delay
+            derived: 是否更新 每月營收_衍生 (需要 1126_pythonAPI/python/revenue_derived.py)，
+                     None 時讀取環境變數 REVENUE_DERIVED (預設 0，關閉)
         """
+        self.rate_limiter = rate_limiter
+
         # MongoDB 設定
         self.client = MongoClient(connection_string)
         self.db = self.client['TW_Stock']
@@ -33,6 +236,19 @@ class MonthlyRevenueScraper:
         # 建立索引
         self._create_indexes()
 
+        # 覆蓋率點陣索引 (每次批次寫入後更新，COVERAGE_INDEX=0 停用)
+        self.coverage = CoverageIndex(self.db) if coverage_enabled() else None
+
+        # 每月營收_衍生：記錄寫入的公司，爬取結束後只重算這些公司 (--derived 或 REVENUE_DERIVED=1 啟用)
+        if derived is None:
+            derived = os.getenv("REVENUE_DERIVED", "0") == "1"
+        self.derived = None
+        if derived:
+            revenue_derived = load_revenue_derived()
+            self.derived = revenue_derived.RevenueDerived(self.revenue_collection,
+                                                          self.db[revenue_derived.DERIVED_COLLECTION])
+            self.derived.ensure_indexes()
+
         # 取得有效公司代號列表
         self.valid_company_codes = self._get_valid_company_codes()
         print(f"✓ 載入 {len(self.valid_company_codes)} 家有效公司代號")
@@ -86,51 +302,6 @@ class MonthlyRevenueScraper:
         """
         return company_code in self.valid_company_codes
 
-    def _revenue_exists(self, company_code, year, month):
-        """
-        檢查營收資料是否已存在
-
-        Args:
-            company_code: 公司代號
-            year: 民國年度
-            month: 月份
-
-        Returns:
-            bool: 是否存在
-        """
-        return self.revenue_collection.find_one({
-            "公司代號": company_code,
-            "年度": year,
-            "月份": month
-        }) is not None
-
-    def _insert_revenue(self, data):
-        """
-        插入營收資料
-
-        Args:
-            data: 資料字典
-
-        Returns:
-            bool: 是否成功
-        """
-        try:
-
-            # 使用 upsert 避免重複
-            self.revenue_collection.update_one(
-                {
-                    "公司代號": data["公司代號"],
-                    "年度": data["年度"],
-                    "月份": data["月份"]
-                },
-                {"$set": data},
-                upsert=True
-            )
-            return True
-        except Exception as e:
-            print(f"✗ 插入資料失敗 ({data.get('公司代號', 'N/A')}): {e}")
-            return False
-
     def _build_url(self, market_type, year, month, data_type=None):
         """
         建立爬蟲網址
@@ -144,7 +315,7 @@ class MonthlyRevenueScraper:
         Returns:
             str: 完整的 URL
         """
-        base_url = "https://mopsov.twse.com.tw/nas/t21"
+        base_url = f"{MOPSOV_BASE_URL}/nas/t21"
 
         # 根據年份決定是否需要加上國內外標記
         if year < 100:
@@ -158,6 +329,29 @@ class MonthlyRevenueScraper:
 
         return url
 
+    def _filter_revenue_records(self, records, year, month):
+        """
+        過濾不在基本資料中或已存在的資料 (每頁一次投影查詢)
+
+        Args:
+            records: 解析後的資料列表
+            year: 年度
+            month: 月份
+
+        Returns:
+            tuple: (待寫入資料列表, 不在基本資料中的筆數)
+        """
+        valid_records = [r for r in records if self._is_valid_company(r["公司代號"])]
+        skip_count = len(records) - len(valid_records)
+
+        # 一次查詢該頁所有已存在的鍵值
+        existing = find_existing_keys(self.revenue_collection, REVENUE_KEY_FIELDS, valid_records)
+        new_records = [
+            r for r in valid_records
+            if tuple(r[f] for f in REVENUE_KEY_FIELDS) not in existing
+        ]
+        return new_records, skip_count
+
     def _parse_revenue_table(self, html_content, year, month, market_type):
         """
         解析營收表格資料
@@ -172,111 +366,15 @@ class MonthlyRevenueScraper:
             list: 解析後的資料列表
         """
         try:
-            # 使用 pandas 讀取 HTML 表格
-            tables = pd.read_html(html_content)
+            records = parse_revenue_table(html_content, year, month, market_type)
 
-            if not tables:
+            if not records:
                 print(f"  ✗ 未找到表格資料")
                 return []
 
-            revenue_data = []
-            valid_count = 0
-            skip_count = 0
-
-            # 處理所有表格（每個產業別一個表格）
-            for table_idx, df in enumerate(tables):
-                # 尋找公司代號欄位
-                # 欄位可能是 tuple 格式: ('Unnamed: 0_level_0', '公司 代號')
-                code_column = None
-                for col in df.columns:
-                    # 處理 tuple 格式
-                    if isinstance(col, tuple):
-                        col_str = ' '.join(str(c) for c in col)
-                    else:
-                        col_str = str(col)
-
-                    col_str = col_str.strip()
+            revenue_data, skip_count = self._filter_revenue_records(records, year, month)
 
-                    if '公司 代號' in col_str or '公司代號' in col_str:
-                        code_column = col
-                        break
-
-                # 如果這個表格沒有公司代號欄位，跳過
-                if code_column is None:
-                    continue
-
-                # 逐列處理
-                for idx, row in df.iterrows():
-                    try:
-                        # 取得公司代號
-                        company_code = str(row[code_column]).strip()
-
-                        # 檢查是否為有效的公司代號 (純數字)
-                        if not company_code.isdigit():
-                            continue
-
-                        # 檢查公司是否在基本資料中
-                        if not self._is_valid_company(company_code):
-                            skip_count += 1
-                            continue
-
-                        # 檢查是否已存在
-                        if self._revenue_exists(company_code, year, month):
-                            continue
-
-                        # 建立資料記錄
-                        record = {
-                            "公司代號": company_code,
-                            "年度": year,
-                            "月份": month,
-                            "市場別": market_type,
-                        }
-
-                        # 將所有欄位加入記錄
-                        for col in df.columns:
-                            # 處理欄位名稱
-                            if isinstance(col, tuple):
-                                # 對於 tuple，取第二個元素（實際欄位名稱）
-                                # 例如: ('營業收入', '當月營收') -> '當月營收'
-                                if len(col) >= 2:
-                                    col_name = str(col[1]).strip()
-                                    # 如果第一個元素不是 Unnamed，加上前綴
-                                    if not str(col[0]).startswith('Unnamed'):
-                                        col_name = f"{col[0]}_{col_name}"
-                                else:
-                                    col_name = str(col).strip()
-                            else:
-                                col_name = str(col).strip()
-
-                            # 跳過公司代號欄位
-                            if col == code_column:
-                                continue
-
-                            # 處理數值型態
-                            value = row[col]
-                            if pd.notna(value):
-                                # 嘗試轉換為數值
-                                try:
-                                    # 移除逗號並轉換
-                                    if isinstance(value, str):
-                                        value = value.replace(',', '')
-                                        if value and value != '-':
-                                            value = float(value) if '.' in value else int(value)
-                                        else:
-                                            value = None
-                                except:
-                                    pass  # 保持原值
-
-                                if value is not None:
-                                    record[col_name] = value
-
-                        revenue_data.append(record)
-                        valid_count += 1
-
-                    except Exception as e:
-                        continue
-
-            print(f"  ✓ 解析完成: {valid_count} 筆有效資料", end="")
+            print(f"  ✓ 解析完成: {len(revenue_data)} 筆有效資料", end="")
             if skip_count > 0:
                 print(f" (跳過 {skip_count} 筆不在基本資料中)")
             else:
@@ -288,6 +386,84 @@ class MonthlyRevenueScraper:
             print(f"  ✗ 解析表格失敗: {e}")
             return []
 
+    def _save_revenue_records(self, revenue_data):
+        """
+        以單次 unordered bulk_write 寫入營收資料
+
+        Args:
+            revenue_data: 資料列表
+
+        Returns:
+            int: 成功插入的資料筆數
+        """
+        written = []
+        success_count = bulk_upsert(self.revenue_collection, revenue_data, REVENUE_KEY_FIELDS, written)
+        mark_batch(self.coverage, "revenue", written)
+        if self.derived is not None:
+            self.derived.track(written, "t21sc03")
+        return success_count
+
+    def _flush_derived(self):
+        """
+        重算本次寫入公司的衍生指標 (失敗只顯示警告，不影響已寫入的營收)
+
+        Returns:
+            int: 更新的衍生文件數
+        """
+        if self.derived is None:
+            return 0
+        name = self.derived.derived_col.name
+        try:
+            written = self.derived.flush()
+        except Exception as e:
+            print(f"  ⚠ 更新{name}失敗: {e}")
+            return 0
+        if written:
+            print(f"  ✓ 更新 {written} 筆{name}")
+        return written
+
+    def _describe(self, market_type, year, month, data_type):
+        """產生顯示用的市場別與年月描述"""
+        market_name = {"sii": "上市", "otc": "上櫃", "rotc": "興櫃"}.get(market_type, market_type)
+        data_type_name = ""
+        if year >= 100:
+            data_type_name = " (國內)" if data_type == "0" else " (國外)"
+        return f"[{market_name}] {year}年{month}月{data_type_name}"
+
+    def _download(self, url):
+        """
+        下載頁面原始內容
+
+        Args:
+            url: 網址
+
+        Returns:
+            bytes: 回應內容，資料不存在 (404) 則返回 None
+        """
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+        # 發送請求 (跳過 SSL 驗證)
+        try:
+            with REQUEST_SECONDS.time(endpoint="t21sc03"):
+                response = requests.get(url, headers=self.headers, timeout=30, verify=False)
+        except requests.exceptions.RequestException:
+            REQUESTS_TOTAL.inc(endpoint="t21sc03", status="error")
+            if self.rate_limiter:
+                self.rate_limiter.report("error")
+            raise
+
+        REQUESTS_TOTAL.inc(endpoint="t21sc03", status=str(response.status_code))
+        if self.rate_limiter:
+            self.rate_limiter.report(response.status_code, response.headers.get("Retry-After"))
+
+        # 檢查狀態碼
+        if response.status_code == 404:
+            return None
+
+        response.raise_for_status()
+        return response.content
+
     def scrape_single_month(self, market_type, year, month, data_type=None, delay=2):
         """
         爬取單一月份的營收資料
@@ -306,47 +482,33 @@ class MonthlyRevenueScraper:
             # 建立 URL
             url = self._build_url(market_type, year, month, data_type)
 
-            # 顯示資訊
-            market_name = {"sii": "上市", "otc": "上櫃", "rotc": "興櫃"}.get(market_type, market_type)
-            data_type_name = ""
-            if year >= 100:
-                data_type_name = " (國內)" if data_type == "0" else " (國外)"
-
-            print(f"\n[{market_name}] {year}年{month}月{data_type_name}")
+            print(f"\n{self._describe(market_type, year, month, data_type)}")
             print(f"  URL: {url}")
 
-            # 發送請求 (跳過 SSL 驗證)
-            response = requests.get(url, headers=self.headers, timeout=30, verify=False)
-
-            # 檢查狀態碼
-            if response.status_code == 404:
+            content = self._download(url)
+            if content is None:
                 print(f"  ⚠ 資料不存在 (404)")
                 return 0
 
-            response.raise_for_status()
-
-            # 設定正確的編碼
-            response.encoding = 'big5'
-
-            # 解析資料
-            revenue_data = self._parse_revenue_table(
-                response.text,
-                year,
-                month,
-                market_type
-            )
+            # 解析資料 (頁面編碼為 Big5)
+            with PARSE_SECONDS.time(parser="t21sc03"):
+                revenue_data = self._parse_revenue_table(
+                    content.decode('big5', errors='replace'),
+                    year,
+                    month,
+                    market_type
+                )
 
             # 插入資料庫
-            success_count = 0
-            for data in revenue_data:
-                if self._insert_revenue(data):
-                    success_count += 1
+            success_count = self._save_revenue_records(revenue_data)
 
             if success_count > 0:
                 print(f"  ✓ 成功儲存 {success_count} 筆資料到 MongoDB")
+            self._flush_derived()
 
-            # 延遲避免請求過於頻繁
-            time.sleep(delay)
+            # 延遲避免請求過於頻繁 (使用共用限速器時由限速器控制)
+            if self.rate_limiter is None:
+                time.sleep(delay)
 
             return success_count
 
@@ -360,7 +522,125 @@ class MonthlyRevenueScraper:
             print(f"  ✗ 爬取失敗: {e}")
             return 0
 
-    def scrape_all(self, start_year=91, end_year=113, delay=2):
+    def _build_tasks(self, start_year, end_year, market_types=("sii", "otc", "rotc")):
+        """
+        建立所有年份、市場、月份的爬取任務
+
+        Returns:
+            list: [(market_type, year, month, data_type), ...]
+        """
+        tasks = []
+        for year in range(start_year, end_year + 1):
+            for market_type in market_types:
+                for month in range(1, 13):
+                    if year < 100:
+                        # 民國 91-99 年：無分國內外
+                        tasks.append((market_type, year, month, None))
+                    else:
+                        # 民國 100 年起：分國內外
+                        for data_type in ["0", "1"]:
+                            tasks.append((market_type, year, month, data_type))
+        return tasks
+
+    def scrape_pipeline(self, tasks, delay=2, download_threads=4, parse_workers=None, max_in_flight=None):
+        """
+        以管線方式爬取多個月份：下載、解析、寫入同時進行
+
+        - 下載：ThreadPoolExecutor 內的多個執行緒取得原始 bytes
+        - 解析：ProcessPoolExecutor 進行 Big5 解碼與 pd.read_html，使用所有 CPU 核心
+        - 寫入：單一寫入執行緒依序消化解析完成的批次
+        - 下載中、解析中與等待寫入的頁面合計最多 max_in_flight 頁，下載不會超前解析 / 寫入太多
+
+        Args:
+            tasks: [(market_type, year, month, data_type), ...]
+            delay: 每個下載執行緒的請求間隔秒數
+            download_threads: 下載執行緒數
+            parse_workers: 解析進程數 (None: CPU 核心數)
+            max_in_flight: 同時在記憶體中的頁面數上限 (None: 下載執行緒數 x 2)
+
+        Returns:
+            int: 成功插入的資料筆數
+        """
+        parse_workers = parse_workers or os.cpu_count() or 1
+        max_in_flight = max_in_flight or download_threads * 2
+        in_flight = threading.Semaphore(max_in_flight)
+        write_queue = queue.Queue()
+        totals = {"success": 0, "pages": 0}
+
+        def writer():
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    break
+                task, future = item
+                QUEUE_DEPTH.set(write_queue.qsize(), queue="revenue_write")
+                market_type, year, month, data_type = task
+                label = self._describe(market_type, year, month, data_type)
+                try:
+                    records, parse_seconds = future.result()
+                    PARSE_SECONDS.observe(parse_seconds, parser="t21sc03")
+                    revenue_data, skip_count = self._filter_revenue_records(records, year, month)
+                    success_count = self._save_revenue_records(revenue_data)
+                    totals["success"] += success_count
+                    totals["pages"] += 1
+                    print(f"{label} ✓ 解析 {len(records)} 筆，儲存 {success_count} 筆"
+                          + (f" (跳過 {skip_count} 筆不在基本資料中)" if skip_count else ""))
+                except Exception as e:
+                    print(f"{label} ✗ 解析或寫入失敗: {e}")
+                finally:
+                    in_flight.release()
+
+        def download(task):
+            market_type, year, month, data_type = task
+            url = self._build_url(market_type, year, month, data_type)
+            try:
+                return self._download(url)
+            finally:
+                # 延遲避免請求過於頻繁 (使用共用限速器時由限速器控制)
+                if self.rate_limiter is None:
+                    time.sleep(delay)
+
+        def downloaded(task, download_future, parse_pool):
+            # 在下載執行緒中執行：原始 bytes 交給解析進程後即不再保留
+            year, month = task[1], task[2]
+            try:
+                content = download_future.result()
+            except Exception as e:
+                print(f"{self._describe(*task)} ✗ 下載失敗: {e}")
+                in_flight.release()
+                return
+            if content is None:
+                print(f"{self._describe(*task)} ⚠ 資料不存在 (404)")
+                in_flight.release()
+                return
+            try:
+                parse_future = parse_pool.submit(parse_revenue_page_timed, content, year, month, task[0])
+            except Exception as e:
+                print(f"{self._describe(*task)} ✗ 解析失敗: {e}")
+                in_flight.release()
+                return
+            parse_future.add_done_callback(lambda f: write_queue.put((task, f)))
+            QUEUE_DEPTH.set(write_queue.qsize(), queue="revenue_write")
+
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+
+        with ProcessPoolExecutor(max_workers=parse_workers) as parse_pool, \
+                ThreadPoolExecutor(max_workers=download_threads) as download_pool:
+            for task in tasks:
+                # 寫入執行緒處理完 (或下載失敗) 才釋放名額
+                in_flight.acquire()
+                download_future = download_pool.submit(download, task)
+                download_future.add_done_callback(lambda f, t=task: downloaded(t, f, parse_pool))
+
+        # 兩個執行池關閉時所有下載與解析皆已完成並送入佇列
+        write_queue.put(None)
+        writer_thread.join()
+        self._flush_derived()
+
+        return totals["success"]
+
+    def scrape_all(self, start_year=91, end_year=113, delay=2, download_threads=4, parse_workers=None):
         """
         爬取所有年份、所有市場、所有月份的營收資料
 
@@ -368,48 +648,32 @@ class MonthlyRevenueScraper:
             start_year: 起始年度 (預設: 91)
             end_year: 結束年度 (預設: 113)
             delay: 請求間隔秒數
+            download_threads: 下載執行緒數
+            parse_workers: 解析進程數 (None: CPU 核心數)
         """
-        market_types = ["sii", "otc", "rotc"]
-        total_success = 0
-        total_requests = 0
+        tasks = self._build_tasks(start_year, end_year)
 
         print(f"\n{'='*60}")
         print(f"開始爬取每月營收資料")
         print(f"年度範圍: {start_year}-{end_year}")
         print(f"市場別: 上市、上櫃、興櫃")
+        print(f"下載執行緒: {download_threads}，解析進程: {parse_workers or os.cpu_count()}")
         print(f"{'='*60}")
 
-        for year in range(start_year, end_year + 1):
-            print(f"\n{'='*60}")
-            print(f"處理 {year} 年度資料")
-            print(f"{'='*60}")
-
-            for market_type in market_types:
-                for month in range(1, 13):
-                    if year < 100:
-                        # 民國 91-99 年：無分國內外
-                        total_requests += 1
-                        success = self.scrape_single_month(
-                            market_type, year, month,
-                            data_type=None,
-                            delay=delay
-                        )
-                        total_success += success
-                    else:
-                        # 民國 100 年起：分國內外
-                        for data_type in ["0", "1"]:
-                            total_requests += 1
-                            success = self.scrape_single_month(
-                                market_type, year, month,
-                                data_type=data_type,
-                                delay=delay
-                            )
-                            total_success += success
+        start_time = time.time()
+        total_success = self.scrape_pipeline(
+            tasks,
+            delay=delay,
+            download_threads=download_threads,
+            parse_workers=parse_workers
+        )
+        elapsed_time = time.time() - start_time
 
         print(f"\n{'='*60}")
         print(f"爬取完成!")
-        print(f"總請求次數: {total_requests}")
+        print(f"總請求次數: {len(tasks)}")
         print(f"成功儲存: {total_success} 筆資料")
+        print(f"總耗時: {elapsed_time:.2f} 秒")
         print(f"資料庫總筆數: {self.revenue_collection.count_documents({})}")
         print(f"{'='*60}")
 
@@ -446,9 +710,21 @@ class MonthlyRevenueScraper:
             print("\n✓ MongoDB 連線已關閉")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape monthly revenue (t21sc03) into MongoDB.")
+    parser.add_argument("--derived", action="store_true", default=None,
+                        help="also refresh 每月營收_衍生 for the companies written "
+                             "(needs 1126_pythonAPI/python; default: REVENUE_DERIVED=1)")
+    return parser.parse_args()
+
+
 def main():
     """主程式"""
-    scraper = MonthlyRevenueScraper()
+    args = parse_args()
+    start_from_env()
+    # 所有進程合計每秒 2 次請求 (約等於原本 4 個下載執行緒各間隔 2 秒)，遇到 429 / 5xx 自動調降
+    rate_limiter = create_rate_limiter(MOPSOV_BASE_URL, rate=2.0, burst=2)
+    scraper = MonthlyRevenueScraper(rate_limiter=rate_limiter, derived=args.derived)
 
     try:
         # 選擇執行模式
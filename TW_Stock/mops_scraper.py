@@ -5,6 +5,7 @@ MOPS 網站爬蟲 - 查詢財務報表資料
 透過 Selenium 處理動態載入和反爬蟲機制
 """
 
+import os
 import time
 import json
 from selenium import webdriver
@@ -16,6 +17,10 @@ from selenium.webdriver.chrome.options import Options
 import pandas as pd
 
 
+# MOPS 網站位址 (可用環境變數改連到本機模擬伺服器)
+MOPS_BASE_URL = os.getenv("MOPS_BASE_URL", "https://mops.twse.com.tw").rstrip("/")
+
+
 class MOPSScraper:
     def __init__(self, headless=False):
         """
@@ -24,7 +29,7 @@ class MOPSScraper:
         Args:
             headless: 是否使用無頭模式(背景執行)
         """
-        self.url = "https://mops.twse.com.tw/mops/#/web/t163sb05"
+        self.url = f"{MOPS_BASE_URL}/mops/#/web/t163sb05"
         chrome_options = Options()
 
         if headless:
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MongoDB 集合匯出為分區 Parquet (欄式儲存)
+每月營收、財務報表依 _id 順序以批次 cursor 串流匯出，
+依民國年度 / 市場別分區，支援以 _id 或 更新時間 高水位增量追加
+
+Usage:
+    python parquet_exporter.py --collections 每月營收 --output parquet
+    python parquet_exporter.py --full              # 重新完整匯出
+"""
+
+import os
+import json
+import uuid
+import shutil
+import argparse
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs as pa_fs
+from bson import ObjectId
+from pymongo import MongoClient
+
+
+# 各集合的匯出設定
+EXPORTS = {
+    "每月營收": {"partition_cols": ["年度", "市場別"]},
+    "上市櫃公司資產負債表": {"partition_cols": ["年度"]},
+    "上市櫃公司綜合損益表": {"partition_cols": ["年度"]},
+    "上市櫃公司現金流量表": {"partition_cols": ["年度"]},
+}
+
+# 不轉換為數值的欄位
+TEXT_FIELDS = {"_id", "公司代號", "公司名稱", "公司簡稱", "市場別", "產業別", "備註"}
+
+# 整數欄位
+INT_FIELDS = {"年度", "月份", "季別"}
+
+STATE_FILE = "_export_state.json"
+
+
+def _to_number(value):
+    """將單一值轉為數值，無法轉換則返回 None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        clean_value = value.replace(',', '').strip()
+        if not clean_value or clean_value == '-':
+            return None
+        try:
+            return float(clean_value)
+        except ValueError:
+            return None
+    return None
+
+
+def normalize_documents(docs, partition_cols):
+    """
+    將 MongoDB 文件正規化為型別一致的 DataFrame
+
+    - _id 轉為字串
+    - 年度、月份、季別為 Int64，其餘分區欄位為字串
+    - 其餘欄位若所有非空值皆可轉為數值則轉為 float64，否則為字串
+
+    Args:
+        docs: 文件列表
+        partition_cols: 分區欄位
+
+    Returns:
+        pd.DataFrame: 正規化後的資料
+    """
+    df = pd.DataFrame(docs)
+    if df.empty:
+        return df
+
+    df["_id"] = df["_id"].astype(str)
+
+    for col in df.columns:
+        if col in INT_FIELDS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+            continue
+        if col in partition_cols:
+            df[col] = df[col].astype(str)
+            continue
+        if col in TEXT_FIELDS:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            continue
+
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            continue
+        if series.map(lambda v: isinstance(v, datetime)).any():
+            df[col] = pd.to_datetime(series, errors="coerce")
+            continue
+
+        numbers = series.map(_to_number)
+        non_null = series.notna() & series.map(lambda v: not (isinstance(v, str) and v.strip() in ("", "-")))
+        if (numbers.notna() | ~non_null).all():
+            df[col] = numbers.astype("float64")
+        else:
+            df[col] = series.where(series.isna(), series.astype(str))
+
+    return df
+
+
+def _is_text(arrow_type):
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+class ParquetExporter:
+    def __init__(self, connection_string="mongodb://localhost:27017/", output_dir="parquet", batch_size=5000):
+        """
+        初始化 Parquet 匯出器
+
+        Args:
+            connection_string: MongoDB 連線字串
+            output_dir: 輸出目錄
+            batch_size: cursor 批次大小 (同時也是每個 Parquet 檔的最大列數)
+        """
+        self.client = MongoClient(connection_string)
+        self.db = self.client['TW_Stock']
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        os.makedirs(output_dir, exist_ok=True)
+        self.state = self._load_state()
+
+    def _state_path(self):
+        return os.path.join(self.output_dir, STATE_FILE)
+
+    def _load_state(self):
+        """讀取各集合的匯出高水位"""
+        try:
+            with open(self._state_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self):
+        with open(self._state_path(), "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+
+    def _collection_dir(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def _build_query(self, name, mode):
+        """
+        依匯出模式建立增量查詢
+
+        Args:
+            name: 集合名稱
+            mode: "id" (只匯出新文件) 或 "updated" (匯出 (更新時間, _id) 晚於高水位的文件)
+
+        Returns:
+            dict: MongoDB 查詢條件
+        """
+        state = self.state.get(name, {})
+        if mode == "updated":
+            if not state.get("last_updated"):
+                return {}
+            last_updated = datetime.fromisoformat(state["last_updated"])
+            return {"$or": [
+                {"更新時間": {"$gt": last_updated}},
+                {"更新時間": last_updated, "_id": {"$gt": ObjectId(state["last_updated_id"])}},
+            ]}
+        if state.get("last_id"):
+            return {"_id": {"$gt": ObjectId(state["last_id"])}}
+        return {}
+
+    def _write_batch(self, name, docs, partition_cols, run_id, batch_idx, state):
+        """
+        將一批文件寫入分區 Parquet
+
+        各批次各自推斷型別，同一欄位可能這批是數值、下批是字串 (例如「不適用」)；
+        曾出現字串的欄位記錄在 state["text_columns"]，之後的批次一律寫成字串
+        (更早寫成數值的檔案由 read_collection 讀取時轉為字串)
+        """
+        df = normalize_documents(docs, partition_cols)
+        if df.empty:
+            return 0
+
+        present_cols = [c for c in partition_cols if c in df.columns]
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        text_columns = set(state.get("text_columns", []))
+        text_columns.update(f.name for f in table.schema if f.name not in partition_cols and _is_text(f.type))
+        for i, field in enumerate(table.schema):
+            if field.name in text_columns and field.name not in partition_cols and not _is_text(field.type):
+                table = table.set_column(i, pa.field(field.name, pa.large_string()),
+                                         table.column(i).cast(pa.large_string()))
+        state["text_columns"] = sorted(text_columns)
+        pq.write_to_dataset(
+            table,
+            root_path=self._collection_dir(name),
+            partition_cols=present_cols or None,
+            basename_template=f"part-{run_id}-{batch_idx}-{{i}}.parquet",
+        )
+        return len(df)
+
+    def export_collection(self, name, mode="id", full=False):
+        """
+        匯出單一集合
+
+        Args:
+            name: 集合名稱
+            mode: 增量模式 ("id" 或 "updated")
+            full: 是否清除既有檔案後完整匯出
+
+        Returns:
+            int: 匯出的筆數
+        """
+        config = EXPORTS.get(name, {"partition_cols": ["年度"]})
+        partition_cols = config["partition_cols"]
+
+        if full:
+            shutil.rmtree(self._collection_dir(name), ignore_errors=True)
+            self.state.pop(name, None)
+
+        if mode == "updated" and self.db[name].find_one({"更新時間": {"$exists": False}}, {"_id": 1}):
+            # 沒有 更新時間 的文件 (例如 每月營收) 在 updated 模式永遠不會被匯出
+            print(f"✗ {name} 有文件缺少 更新時間 欄位，無法使用 updated 模式，請改用 --mode id")
+            return 0
+
+        query = self._build_query(name, mode)
+        # updated 模式依 (更新時間, _id) 排序並以此為高水位，中斷時高水位之前的文件皆已匯出
+        sort = [("更新時間", 1), ("_id", 1)] if mode == "updated" else [("_id", 1)]
+        cursor = self.db[name].find(query).sort(sort).batch_size(self.batch_size)
+
+        run_id = uuid.uuid4().hex[:8]
+        state = self.state.setdefault(name, {})
+        exported = 0
+        batch = []
+        batch_idx = 0
+
+        print(f"\n匯出 {name} (模式: {mode}{', 完整' if full else ''})")
+
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                exported += self._flush(name, batch, partition_cols, run_id, batch_idx, state, mode)
+                batch = []
+                batch_idx += 1
+
+        if batch:
+            exported += self._flush(name, batch, partition_cols, run_id, batch_idx, state, mode)
+
+        print(f"  ✓ {name} 匯出 {exported} 筆")
+        return exported
+
+    def _flush(self, name, batch, partition_cols, run_id, batch_idx, state, mode="id"):
+        """寫入一批資料並推進目前模式的高水位 (每批寫入後即保存，可中斷續跑)"""
+        count = self._write_batch(name, batch, partition_cols, run_id, batch_idx, state)
+
+        # cursor 依高水位欄位排序，批次最後一筆即為新的高水位
+        last_id = batch[-1]["_id"]
+        if mode == "updated":
+            state["last_updated"] = batch[-1]["更新時間"].isoformat()
+            state["last_updated_id"] = str(last_id)
+        else:
+            state["last_id"] = str(last_id)
+
+        state["exported_at"] = datetime.now().isoformat()
+        self._save_state()
+        print(f"  已寫入 {count} 筆 (至 _id {last_id})")
+        return count
+
+    def export_all(self, names=None, mode="id", full=False):
+        """
+        匯出多個集合
+
+        Args:
+            names: 集合名稱列表 (None: EXPORTS 中所有集合)
+            mode: 增量模式
+            full: 是否完整匯出
+        """
+        total = 0
+        for name in names or EXPORTS.keys():
+            total += self.export_collection(name, mode=mode, full=full)
+        print(f"\n✓ 共匯出 {total} 筆")
+        return total
+
+    def close(self):
+        """關閉 MongoDB 連線"""
+        if self.client:
+            self.client.close()
+
+
+def read_collection(output_dir, name, columns=None, filter=None, dedupe=True):
+    """
+    以記憶體映射方式讀取匯出的 Parquet 資料集
+
+    Args:
+        output_dir: 匯出目錄
+        name: 集合名稱
+        columns: 欲讀取的欄位 (None: 全部)
+        filter: pyarrow.dataset 篩選運算式，例如 ds.field("年度") == 113
+        dedupe: 是否依 _id 去除 "updated" 模式重複匯出的舊版本
+
+    Returns:
+        pd.DataFrame: 資料
+    """
+    path = os.path.join(output_dir, name)
+    filesystem = pa_fs.LocalFileSystem(use_mmap=True)
+
+    # 各批次欄位可能不同，先合併所有檔案的 schema；同一欄位在不同檔案為數值 / 字串時統一讀成字串
+    discovered = ds.dataset(path, format="parquet", partitioning="hive", filesystem=filesystem)
+    field_types = {}
+    for fragment in discovered.get_fragments():
+        for field in fragment.physical_schema:
+            field_types.setdefault(field.name, []).append(field)
+    fields = []
+    for name_, candidates in field_types.items():
+        try:
+            fields.append(pa.unify_schemas([pa.schema([f]) for f in candidates], promote_options="permissive")[0])
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            fields.append(pa.field(name_, pa.large_string()))
+    schema = pa.unify_schemas([pa.schema(fields), discovered.partitioning.schema], promote_options="permissive")
+    dataset = ds.dataset(path, schema=schema, format="parquet", partitioning="hive", filesystem=filesystem)
+
+    read_columns = columns
+    if columns is not None and dedupe and "_id" not in columns:
+        read_columns = list(columns) + ["_id"]
+
+    df = dataset.to_table(columns=read_columns, filter=filter).to_pandas()
+
+    if dedupe and "_id" in df.columns:
+        if "更新時間" in df.columns:
+            df = df.sort_values("更新時間", kind="stable")
+        df = df.drop_duplicates("_id", keep="last")
+        if columns is not None and "_id" not in columns:
+            df = df.drop(columns="_id")
+
+    return df.reset_index(drop=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export TW_Stock collections to partitioned Parquet.")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/", help="MongoDB connection uri")
+    parser.add_argument("--output", default="parquet", help="output directory (default: %(default)s)")
+    parser.add_argument("--collections", default=",".join(EXPORTS.keys()),
+                        help="comma separated collection names (default: all)")
+    parser.add_argument("--mode", choices=["id", "updated"], default="id",
+                        help="incremental high-water mark: _id or 更新時間 (default: %(default)s)")
+    parser.add_argument("--full", action="store_true", help="drop previous export and export everything")
+    parser.add_argument("--batch-size", type=int, default=5000, help="cursor batch size (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    args = parse_args()
+    exporter = ParquetExporter(args.mongo_uri, args.output, args.batch_size)
+    try:
+        names = [n.strip() for n in args.collections.split(",") if n.strip()]
+        exporter.export_all(names, mode=args.mode, full=args.full)
+    finally:
+        exporter.close()
+
+
+if __name__ == "__main__":
+    main()
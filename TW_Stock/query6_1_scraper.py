@@ -6,16 +6,23 @@ MOPS 網站爬蟲 - 查詢 query6_1 頁面資料
 爬取公司特定年月的資料
 """
 
+import os
 import time
 import json
+import random
 import logging
 from datetime import datetime
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
-from mops_scraper import MOPSScraper
+from mops_scraper import MOPSScraper, MOPS_BASE_URL
 from mongodb_helper import MongoDBHelper
+from metrics import REQUEST_SECONDS, REQUESTS_TOTAL, DB_WRITE_SECONDS, DB_BATCH_SIZE, RECORDS_TOTAL, start_from_env
+from stage_spans import SpanRecorder
+from empty_result_cache import EmptyResultCache, EmptyPredictor
+from insider_buckets import InsiderBucketStore, TitleSchemaCache, flatten_titles
+from coverage_index import mark_batch
 
 # 設定 logging
 logging.basicConfig(
@@ -34,11 +41,38 @@ class Query61Scraper(MOPSScraper):
     處理 query6_1 頁面
     """
 
-    def __init__(self, headless=False):
-        """初始化爬蟲"""
+    def __init__(self, headless=False, span_path="query6_1_spans.jsonl",
+                 poll_interval=0.05, result_wait=2, delay_range=(0.2, 0.6), rate_limiter=None,
+                 empty_cache=None, storage=None):
+        """
+        初始化爬蟲
+
+        Args:
+            headless: 是否使用無頭模式
+            span_path: 分段計時 JSON lines 輸出路徑 (None: 不記錄)
+            poll_interval: loading / sessionStorage 輪詢間隔秒數
+            result_wait: 等待查詢結果的最長秒數
+            delay_range: 每家公司之間的隨機延遲區間 (秒)
+            rate_limiter: 共用限速器 (rate_limiter.py)，多進程時控制所有進程合計的查詢速率
+            empty_cache: 查無資料快取 (empty_result_cache.py)，記錄空結果供下次增量執行略過
+            storage: 明細儲存方式 "rows" (每筆明細一份文件) / "bucket" (每個公司月份一份文件，insider_buckets.py)，
+                     None 時讀取環境變數 QUERY6_1_STORAGE (預設 rows)
+        """
         super().__init__(headless)
         # 覆寫 URL
-        self.url = "https://mops.twse.com.tw/mops/#/web/query6_1"
+        self.url = f"{MOPS_BASE_URL}/mops/#/web/query6_1"
+        self.poll_interval = poll_interval
+        self.result_wait = result_wait
+        self.delay_range = delay_range
+        self.rate_limiter = rate_limiter
+        self.empty_cache = empty_cache
+        self.storage = storage or os.getenv("QUERY6_1_STORAGE", "rows")
+        if self.storage not in ("rows", "bucket"):
+            raise ValueError(f"未知的儲存方式: {self.storage} (可用: rows, bucket)")
+        self.bucket_store = None
+        # 依 titles 簽章快取展開後的欄位 (分桶儲存時改用 bucket_store 的快取，與欄位表同步)
+        self.title_schemas = TitleSchemaCache()
+        self.spans = SpanRecorder(span_path)
 
     def input_company_code(self, company_code):
 
@@ -124,7 +158,7 @@ class Query61Scraper(MOPSScraper):
                     print("  已等待 loading 消失")
                     return
 
-                time.sleep(0.05)  # 縮短檢查間隔，加快響應
+                time.sleep(self.poll_interval)
 
         except Exception as e:
             print(f"  等待 loading 時發生錯誤: {e}")
@@ -139,21 +173,24 @@ class Query61Scraper(MOPSScraper):
         for attempt in range(max_retries):
             try:
                 # 等待 loading 消失
-                self.wait_for_loading_to_disappear()
+                with self.spans.span("loading_wait", attempt=attempt + 1):
+                    self.wait_for_loading_to_disappear()
 
                 # 使用 JavaScript 直接點擊，避免被遮擋
-                clicked = self.driver.execute_script("""
-                    var btn = document.getElementById('searchBtn');
-                    if (btn) {
-                        btn.click();
-                        return true;
-                    }
-                    return false;
-                """)
+                with self.spans.span("click", attempt=attempt + 1):
+                    clicked = self.driver.execute_script("""
+                        var btn = document.getElementById('searchBtn');
+                        if (btn) {
+                            btn.click();
+                            return true;
+                        }
+                        return false;
+                    """)
+                    if clicked:
+                        time.sleep(0.2)  # 進一步減少等待時間
 
                 if clicked:
                     print("✓ 已點擊查詢按鈕")
-                    time.sleep(0.2)  # 進一步減少等待時間
                     return True
                 else:
                     print(f"✗ 找不到查詢按鈕 (嘗試 {attempt + 1}/{max_retries})")
@@ -206,10 +243,36 @@ class Query61Scraper(MOPSScraper):
         """
         try:
             # 從 sessionStorage 取得 queryResultsSet
-            query_results = self.driver.execute_script(
-                "return sessionStorage.getItem('queryResultsSet');"
-            )
+            query_results = self.read_session_storage()
+            return self.parse_query_results(query_results)
+        except Exception as e:
+            print(f"✗ 取得查詢結果失敗: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def read_session_storage(self):
+        """
+        讀取 sessionStorage 中 queryResultsSet 的原始字串
+
+        Returns:
+            str: JSON 字串，尚無結果則返回 None
+        """
+        return self.driver.execute_script(
+            "return sessionStorage.getItem('queryResultsSet');"
+        )
+
+    def parse_query_results(self, query_results):
+        """
+        解析 queryResultsSet 的 JSON 字串
+
+        Args:
+            query_results: sessionStorage 中的 JSON 字串
 
+        Returns:
+            dict: 包含 data 和 titles 的字典，失敗則返回 None
+        """
+        try:
             if query_results:
                 result_data = json.loads(query_results)
                 print(f"✓ 成功取得 sessionStorage 資料")
@@ -246,15 +309,11 @@ class Query61Scraper(MOPSScraper):
         except json.JSONDecodeError as e:
             print(f"✗ JSON 解析失敗: {e}")
             return None
-        except Exception as e:
-            print(f"✗ 取得查詢結果失敗: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
 
     def scrape_company_data(self, company_code, year, month):
         """
         爬取單一公司的資料（優化版）
+        各階段耗時寫入 span 檔 (stage_spans.py 可彙整 p50/p95/p99)
 
         Args:
             company_code: 公司代號
@@ -265,6 +324,7 @@ class Query61Scraper(MOPSScraper):
             dict: 包含公司代號、年月及查詢結果的字典，失敗則返回 None
         """
         start_time = time.time()  # 記錄開始時間
+        self.spans.set_context(company_code=company_code, year=year, month=month)
         try:
             print(f"\n{'='*60}")
             print(f"開始爬取公司 {company_code} - {year}年{month}月資料")
@@ -274,56 +334,51 @@ class Query61Scraper(MOPSScraper):
             current_url = self.driver.current_url
             if "query6_1" not in current_url:
                 print("正在開啟網頁...")
-                self.driver.get(self.url)
-                time.sleep(1)  # 減少初始等待時間（從 2 秒降到 1 秒）
+                with self.spans.span("page_load"):
+                    self.driver.get(self.url)
+                    time.sleep(1)  # 減少初始等待時間（從 2 秒降到 1 秒）
 
-            # 2. 先選擇自訂時間（在輸入公司代號之前）
-            self.select_custom_date()
+            with self.spans.span("form_fill"):
+                # 2. 先選擇自訂時間（在輸入公司代號之前）
+                self.select_custom_date()
 
-            # 3. 輸入公司代號
-            self.input_company_code(company_code)
+                # 3. 輸入公司代號
+                self.input_company_code(company_code)
 
-            # 4. 輸入年度和月份
-            self.input_custom_year(year)
-            self.input_custom_month(month)
+                # 4. 輸入年度和月份
+                self.input_custom_year(year)
+                self.input_custom_month(month)
 
-            # 4.5 清空 sessionStorage（確保不會抓到舊資料）
-            self.driver.execute_script("sessionStorage.removeItem('queryResultsSet');")
-            print("  [清空] 已清空 sessionStorage")
+                # 4.5 清空 sessionStorage（確保不會抓到舊資料）
+                self.driver.execute_script("sessionStorage.removeItem('queryResultsSet');")
+                print("  [清空] 已清空 sessionStorage")
 
-            # 5. 點擊查詢按鈕（使用重試機制）
+            # 5. 點擊查詢按鈕（使用重試機制，內含 loading_wait / click 兩個 span）
+            if self.rate_limiter:
+                with self.spans.span("rate_limit_wait"):
+                    self.rate_limiter.acquire()
             self.click_query_button_with_retry()
 
             # 6. 等待 sessionStorage 更新（智能快速失敗機制）
-            max_wait = 2  
-            start_time = time.time()
-            results = None
-
-            while time.time() - start_time < max_wait:
-                # 檢查是否有「查無資料」或錯誤訊息
-                no_data = self.driver.execute_script("""
-                    var alerts = document.querySelectorAll('.alert, .error, .warning');
-                    for (var i = 0; i < alerts.length; i++) {
-                        var text = alerts[i].textContent;
-                        if (text.includes('查無資料') || text.includes('查詢無結果') || text.includes('無符合')) {
-                            return true;
-                        }
-                    }
-                    return false;
-                """)
+            results, outcome = self.wait_for_query_results()
 
-                if no_data:
-                    # 快速失敗：檢測到無資料訊息，立即返回
-                    print(f"  [快速檢測] 查無資料")
-                    break
-
-                results = self.get_query_results_from_session_storage()
+            elapsed_time = time.time() - start_time
+            REQUEST_SECONDS.observe(elapsed_time, endpoint="query6_1")
+            self.spans.record("total", elapsed_time, status="success" if results else outcome)
+            if self.rate_limiter:
+                # 逾時視為主機過載，查無資料仍是正常回應
+                self.rate_limiter.report("error" if outcome == "timeout" else "success")
+            if self.empty_cache:
                 if results:
-                    break
-                time.sleep(0.05)  # 快速檢查間隔
+                    self.empty_cache.clear(company_code, year, month)
+                elif outcome == "no_data":
+                    self.empty_cache.record_empty(company_code, year, month)
+                else:
+                    # 逾時為主機過載，結果未知：只記錄次數，不作為略過的依據
+                    self.empty_cache.record_timeout(company_code, year, month)
 
             if results:
-                elapsed_time = time.time() - start_time
+                REQUESTS_TOTAL.inc(endpoint="query6_1", status="success")
                 print(f"✓ 公司 {company_code} 查詢成功，共 {len(results['data'])} 筆明細")
                 logger.info(f"爬取成功 | 股票代碼: {company_code} | 年月: {year}年{month}月 | 花費時間: {elapsed_time:.2f}秒 | 資料筆數: {len(results['data'])}")
 
@@ -339,19 +394,89 @@ class Query61Scraper(MOPSScraper):
                     "爬取時間": elapsed_time
                 }
             else:
-                elapsed_time = time.time() - start_time
+                REQUESTS_TOTAL.inc(endpoint="query6_1", status="empty")
                 print(f"⚠ 公司 {company_code} 無資料或查詢失敗")
                 logger.warning(f"爬取失敗 | 股票代碼: {company_code} | 年月: {year}年{month}月 | 花費時間: {elapsed_time:.2f}秒 | 原因: 無資料")
                 return None
 
         except Exception as e:
             elapsed_time = time.time() - start_time
+            REQUESTS_TOTAL.inc(endpoint="query6_1", status="error")
+            self.spans.record("total", elapsed_time, status="error")
+            if self.rate_limiter:
+                self.rate_limiter.report("error")
             print(f"✗ 爬取公司 {company_code} 資料失敗: {e}")
             logger.error(f"爬取錯誤 | 股票代碼: {company_code} | 年月: {year}年{month}月 | 花費時間: {elapsed_time:.2f}秒 | 錯誤: {str(e)}")
             import traceback
             traceback.print_exc()
             return None
 
+    def wait_for_query_results(self):
+        """
+        輪詢查詢結果：頁面出現「查無資料」時快速返回，否則等待 sessionStorage 寫入結果
+        (session_poll / parse 兩個 span)
+
+        Returns:
+            tuple: (結果字典或 None, 狀態 "found" / "no_data" / "timeout")
+        """
+        poll_start = time.perf_counter()
+        parse_seconds = 0.0
+        polls = 0
+        outcome = "timeout"
+        results = None
+
+        while time.perf_counter() - poll_start < self.result_wait:
+            polls += 1
+            # 檢查是否有「查無資料」或錯誤訊息
+            no_data = self.driver.execute_script("""
+                var alerts = document.querySelectorAll('.alert, .error, .warning');
+                for (var i = 0; i < alerts.length; i++) {
+                    var text = alerts[i].textContent;
+                    if (text.includes('查無資料') || text.includes('查詢無結果') || text.includes('無符合')) {
+                        return true;
+                    }
+                }
+                return false;
+            """)
+
+            if no_data:
+                # 快速失敗：檢測到無資料訊息，立即返回
+                print(f"  [快速檢測] 查無資料")
+                outcome = "no_data"
+                break
+
+            query_results = self.read_session_storage()
+            if query_results:
+                parse_start = time.perf_counter()
+                results = self.parse_query_results(query_results)
+                parse_seconds += time.perf_counter() - parse_start
+                if results:
+                    outcome = "found"
+                    break
+            time.sleep(self.poll_interval)
+
+        poll_seconds = time.perf_counter() - poll_start - parse_seconds
+        self.spans.record("session_poll", poll_seconds, polls=polls, status=outcome,
+                          poll_interval=self.poll_interval)
+        if parse_seconds:
+            self.spans.record("parse", parse_seconds,
+                              rows=len(results['data']) if results else 0)
+        return results, outcome
+
+    def pause(self):
+        """
+        每家公司之間的隨機延遲 (區間由 delay_range 設定，實際延遲記錄為 delay span)
+
+        Returns:
+            float: 延遲秒數
+        """
+        if not self.delay_range:
+            return 0.0
+        delay = random.uniform(*self.delay_range)
+        time.sleep(delay)
+        self.spans.record("delay", delay, delay_min=self.delay_range[0], delay_max=self.delay_range[1])
+        return delay
+
     def parse_titles_to_columns(self, titles):
         """
         將 titles 轉換為欄位名稱列表（處理巢狀結構）
@@ -362,20 +487,7 @@ class Query61Scraper(MOPSScraper):
         Returns:
             list: 欄位名稱列表
         """
-        columns = []
-
-        for title in titles:
-            main = title.get('main', '')
-
-            # 如果有 sub，展開 sub
-            if title.get('sub') and len(title['sub']) > 0:
-                for sub in title['sub']:
-                    sub_main = sub.get('main', '')
-                    columns.append(f"{main}-{sub_main}")
-            else:
-                columns.append(main)
-
-        return columns
+        return flatten_titles(titles)
 
     def save_to_mongodb(self, mongo_helper, data):
         """
@@ -389,11 +501,18 @@ class Query61Scraper(MOPSScraper):
             bool: 是否成功
         """
         try:
-            collection = mongo_helper.db['內部人持股異動事後申報表']
+            if self.storage == "bucket" and self.bucket_store is None:
+                self.bucket_store = InsiderBucketStore(mongo_helper.db)
+                self.title_schemas = self.bucket_store.schemas
 
-            # 解析標題
-            columns = self.parse_titles_to_columns(data['標題'])
-            print(f"  欄位數: {len(columns)}")
+            # 解析標題 (相同 titles 只展開一次)
+            schema = self.title_schemas.get(data['標題'])
+            print(f"  欄位數: {len(schema.columns)}")
+
+            if self.storage == "bucket":
+                return self.save_bucket(mongo_helper, data)
+
+            collection = mongo_helper.db['內部人持股異動事後申報表']
 
             # 基本資訊
             base_info = {
@@ -406,15 +525,10 @@ class Query61Scraper(MOPSScraper):
 
             # 處理每一筆明細資料
             success_count = 0
+            write_start = time.perf_counter()
             for row_index, row_data in enumerate(data['明細資料']):
-                # 建立單筆明細文件
-                document = base_info.copy()
-
-                # 將 row_data 與 columns 對應
-                for col_index, value in enumerate(row_data):
-                    if col_index < len(columns):
-                        column_name = columns[col_index]
-                        document[column_name] = value
+                # 建立單筆明細文件 (row_data 依位置對應欄位)
+                document = schema.to_document(base_info, row_data)
 
                 try:
                     # 直接插入，不使用唯一鍵，讓 MongoDB 使用預設的 _id
@@ -423,6 +537,14 @@ class Query61Scraper(MOPSScraper):
                 except Exception as e:
                     print(f"  ✗ 第 {row_index + 1} 筆明細存入失敗: {e}")
 
+            write_seconds = time.perf_counter() - write_start
+            DB_WRITE_SECONDS.observe(write_seconds, collection=collection.name)
+            self.spans.record("mongo_save", write_seconds, rows=len(data['明細資料']), saved=success_count)
+            DB_BATCH_SIZE.observe(len(data['明細資料']), collection=collection.name)
+            RECORDS_TOTAL.inc(success_count, collection=collection.name)
+            if success_count:
+                mark_batch(mongo_helper.coverage, "insider", [base_info])
+
             print(f"✓ 公司 {data['公司代號']} 共存入 {success_count}/{len(data['明細資料'])} 筆明細")
             return True
 
@@ -432,6 +554,40 @@ class Query61Scraper(MOPSScraper):
             traceback.print_exc()
             return False
 
+    def save_bucket(self, mongo_helper, data):
+        """
+        分桶儲存：整個公司月份的明細存成單一文件 (單次寫入)
+
+        Args:
+            mongo_helper: MongoDBHelper 實例
+            data: 要儲存的資料字典
+
+        Returns:
+            bool: 是否成功
+        """
+        if self.bucket_store is None:
+            self.bucket_store = InsiderBucketStore(mongo_helper.db)
+            self.title_schemas = self.bucket_store.schemas
+        collection_name = self.bucket_store.collection.name
+
+        write_start = time.perf_counter()
+        saved = self.bucket_store.save(data)
+        write_seconds = time.perf_counter() - write_start
+
+        DB_WRITE_SECONDS.observe(write_seconds, collection=collection_name)
+        self.spans.record("mongo_save", write_seconds, rows=saved, saved=saved, storage="bucket")
+        DB_BATCH_SIZE.observe(saved, collection=collection_name)
+        RECORDS_TOTAL.inc(saved, collection=collection_name)
+        mark_batch(mongo_helper.coverage, "insider_bucket", [data])
+
+        print(f"✓ 公司 {data['公司代號']} 共存入 {saved} 筆明細 (分桶)")
+        return True
+
+    def close(self):
+        """關閉瀏覽器與 span 檔"""
+        self.spans.close()
+        super().close()
+
 
 def generate_year_month_list(start_year, start_month, end_year, end_month):
     """
@@ -457,6 +613,8 @@ def generate_year_month_list(start_year, start_month, end_year, end_month):
 
 def main():
     """主程式"""
+    start_from_env()
+
     # 初始化
     print("\n" + "="*60)
     print("MOPS Query6_1 爬蟲程式 - 內部人持股異動事後申報表")
@@ -554,8 +712,16 @@ def main():
     print(f"總共 {len(year_month_list)} 個月份")
     logger.info(f"爬取時間範圍: {start_year}/{start_month} - {end_year}/{end_month}，共 {len(year_month_list)} 個月份")
 
+    # 略過已確認查無資料且已結案的月份，長期查無資料的公司排到每月最後
+    empty_cache = EmptyResultCache(mongo_helper.db)
+    predictor = EmptyPredictor(empty_cache.load(all_codes))
+    skip_tasks, low_priority = predictor.plan(all_codes, year_month_list)
+    all_codes = sorted(all_codes, key=lambda code: code in low_priority)
+    print(f"⊙ 略過已知查無資料: {len(skip_tasks)} 筆，降低優先順序: {len(low_priority)} 家公司")
+
     # 初始化爬蟲（headless=True 用於背景執行）
-    scraper = Query61Scraper(headless=False)
+    scraper = Query61Scraper(headless=False, empty_cache=empty_cache)
+    total_skip_count = 0
 
     # 全域統計變數
     total_success_count = 0
@@ -588,6 +754,10 @@ def main():
 
             # 批次爬取該月所有公司
             for i, company_code in enumerate(all_codes, 1):
+                if (company_code, year, month) in skip_tasks:
+                    total_skip_count += 1
+                    continue
+
                 print(f"\n[{year}年{month}月] 進度: {i}/{len(all_codes)} - 公司代號: {company_code}")
 
                 try:
@@ -606,10 +776,8 @@ def main():
                         month_fail_codes.append(company_code)
 
                     # 每爬取一家公司後暫停一下，避免被封鎖
-                    # 優化隨機延遲時間，在速度與穩定性間取得平衡
-                    import random
-                    delay = random.uniform(0.2, 0.6)  # 0.2-0.6 秒隨機延遲（進一步優化）
-                    time.sleep(delay)
+                    # 延遲區間由 delay_range 設定 (預設 0.2-0.6 秒)
+                    scraper.pause()
 
                 except Exception as e:
                     print(f"✗ 處理公司 {company_code} 時發生錯誤: {e}")
@@ -653,6 +821,7 @@ def main():
         print(f"總成功爬取: {total_success_count} 筆")
         print(f"總成功存入 MongoDB: {total_mongodb_success_count} 筆")
         print(f"總失敗: {total_fail_count} 筆")
+        print(f"略過 (已知查無資料): {total_skip_count} 筆")
         print(f"總計: {len(all_codes) * len(year_month_list)} 筆（{len(all_codes)} 家公司 × {len(year_month_list)} 個月）")
         print("="*80)
 
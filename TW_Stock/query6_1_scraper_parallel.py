@@ -3,17 +3,25 @@
 """
 MOPS 網站爬蟲 - 查詢 query6_1 頁面資料（多進程並行版本）
 針對 https://mops.twse.com.tw/mops/#/web/query6_1
-使用 3 個並行進程爬取公司特定年月的資料
+使用多個並行進程爬取公司特定年月的資料，任務由 work stealing 排程器分配 (task_scheduler.py)
 """
 
+import os
 import time
 import json
 import logging
-import random
 from datetime import datetime
 from multiprocessing import Process, Queue, Manager
 from query6_1_scraper import Query61Scraper, generate_year_month_list
 from mongodb_helper import MongoDBHelper
+from mops_scraper import MOPS_BASE_URL
+from rate_limiter import create_rate_limiter
+from task_scheduler import SchedulerManager, build_tasks, load_company_costs
+from empty_result_cache import EmptyResultCache, EmptyPredictor
+from insider_buckets import BUCKET_COLLECTION
+from metrics import QUEUE_DEPTH, WORKER_ALIVE, WORKER_HEARTBEAT, REGISTRY, start_from_env, start_snapshot_writer
+
+TASKS_TOTAL = REGISTRY.counter("query6_1_tasks_total", "Completed query6_1 tasks by outcome", ("status",))
 
 
 def setup_logger(process_id):
@@ -35,23 +43,31 @@ def setup_logger(process_id):
     return logger
 
 
-def worker_process(process_id, task_queue, result_queue, year_month_list, stop_event):
+def worker_process(process_id, scheduler, result_queue, year_month_list, stop_event, rate_limit=2.0):
     """
-    工作進程：從隊列中取得公司代號並爬取資料
+    工作進程：從排程器取得 (公司代號, 年, 月) 任務並爬取資料
 
     Args:
         process_id: 進程編號
-        task_queue: 任務隊列（公司代號）
+        scheduler: WorkStealingScheduler proxy（自己的佇列空了會從其他進程偷任務）
         result_queue: 結果隊列（統計資訊）
         year_month_list: 年月列表
         stop_event: 停止事件
+        rate_limit: 所有進程合計每秒查詢次數 (透過 MongoDB 共用限速狀態)
     """
     logger = setup_logger(process_id)
     logger.info(f"進程 {process_id} 啟動")
 
+    # 每個進程寫入自己的監控快照 (請求延遲、MongoDB 寫入等)
+    stop_metrics = start_snapshot_writer(f'metrics_p{process_id}.json', interval=15)
+
     # 初始化爬蟲和 MongoDB（每個進程獨立）
-    scraper = Query61Scraper(headless=True)
+    # 查詢速率由共用限速器控制 (不隨進程數增加)，只保留少量隨機延遲
+    rate_limiter = create_rate_limiter(MOPS_BASE_URL, rate=rate_limit, burst=1)
     mongo_helper = MongoDBHelper()
+    scraper = Query61Scraper(headless=True, span_path=f'query6_1_spans_p{process_id}.jsonl',
+                             delay_range=(0, 0.2), rate_limiter=rate_limiter,
+                             empty_cache=EmptyResultCache(mongo_helper.db))
 
     try:
         # 開啟網頁
@@ -66,14 +82,14 @@ def worker_process(process_id, task_queue, result_queue, year_month_list, stop_e
         # 取得公司代號
         while not stop_event.is_set():
             try:
-                # 非阻塞式取得任務（timeout=1秒）
-                task = task_queue.get(timeout=1)
+                task = scheduler.get(process_id)
 
-                if task is None:  # 結束信號
-                    logger.info(f"進程 {process_id} 收到結束信號")
+                if task is None:  # 所有佇列皆已清空
+                    logger.info(f"進程 {process_id} 沒有剩餘任務")
                     break
 
                 company_code, year, month = task
+                WORKER_HEARTBEAT.set(time.time(), worker=str(process_id))
 
                 logger.info(f"進程 {process_id} 開始處理: {company_code} - {year}年{month}月")
 
@@ -92,9 +108,8 @@ def worker_process(process_id, task_queue, result_queue, year_month_list, stop_e
                     process_fail_count += 1
                     result_queue.put(('fail', company_code, year, month))
 
-                # 隨機延遲（每個進程獨立）
-                delay = random.uniform(0.3, 0.8)  # 稍微增加延遲以保持穩定
-                time.sleep(delay)
+                # 隨機延遲（每個進程獨立，稍微增加延遲以保持穩定）
+                scraper.pause()
 
             except Exception as e:
                 if not stop_event.is_set():
@@ -110,11 +125,14 @@ def worker_process(process_id, task_queue, result_queue, year_month_list, stop_e
     finally:
         scraper.close()
         mongo_helper.close()
+        stop_metrics.set()
         logger.info(f"進程 {process_id} 關閉")
 
 
 def main():
     """主程式"""
+    start_from_env(snapshot_path='metrics_main.json')
+
     # 設定主日誌（確保立即寫入）
     file_handler = logging.FileHandler('query6_1_scraper_main.log', encoding='utf-8')
     file_handler.setLevel(logging.INFO)
@@ -234,33 +252,56 @@ def main():
     print(f"\n使用 {num_processes} 個並行進程")
     main_logger.info(f"使用 {num_processes} 個並行進程")
 
+    # 任務排序方式 (最近 12 個月的任務一律優先)
+    print("\n請選擇任務排序方式：")
+    print("1. 依公司（同一家公司的月份由同一進程處理，預設）")
+    print("2. 依年月")
+    print("3. 依歷史明細筆數估計成本（筆數多的先做）")
+    ordering = {"1": "company", "2": "month", "3": "cost"}.get(input("\n請輸入選項 (1/2/3): ").strip(), "company")
+    costs = None
+    if ordering == "cost":
+        if os.getenv("QUERY6_1_STORAGE") == "bucket":
+            costs = load_company_costs(mongo_helper.db[BUCKET_COLLECTION], rows_field="筆數")
+        else:
+            costs = load_company_costs(mongo_helper.db['內部人持股異動事後申報表'])
+        print(f"✓ 載入 {len(costs)} 家公司的歷史筆數")
+    main_logger.info(f"任務排序方式: {ordering}")
+
+    # 略過已確認查無資料且已結案的月份，長期查無資料的公司排到最後
+    predictor = EmptyPredictor(EmptyResultCache(mongo_helper.db).load(all_codes))
+    skip_tasks, low_priority = predictor.plan(all_codes, year_month_list)
+    print(f"⊙ 略過已知查無資料: {len(skip_tasks)} 筆，降低優先順序: {len(low_priority)} 家公司")
+    main_logger.info(f"略過已知查無資料: {len(skip_tasks)} 筆，降低優先順序: {len(low_priority)} 家公司")
+
+    # 所有進程合計的查詢速率 (每秒)，遇到逾時會自動調降、連續成功後逐步調升
+    rate_limit = 2.0
+    print(f"共用限速: 每秒 {rate_limit} 次查詢")
+    main_logger.info(f"共用限速: 每秒 {rate_limit} 次查詢")
+
     # 關閉主進程的 MongoDB 連接
     mongo_helper.close()
 
-    # 創建任務隊列和結果隊列
+    # 創建排程器和結果隊列
     manager = Manager()
-    task_queue = manager.Queue()
     result_queue = manager.Queue()
     stop_event = manager.Event()
 
-    # 將所有任務放入隊列
-    total_tasks = 0
-    for year, month in year_month_list:
-        for company_code in all_codes:
-            task_queue.put((company_code, year, month))
-            total_tasks += 1
+    scheduler_manager = SchedulerManager()
+    scheduler_manager.start()
+    scheduler = scheduler_manager.WorkStealingScheduler(num_processes)
 
-    print(f"\n總任務數: {total_tasks}")
-    main_logger.info(f"總任務數: {total_tasks}")
+    # 將所有任務分配到各進程的本地佇列
+    tasks = build_tasks(all_codes, year_month_list, ordering=ordering, costs=costs, recent_months=12,
+                        exclude=skip_tasks, low_priority=low_priority)
+    total_tasks = scheduler.assign(tasks, ordering)
 
-    # 添加結束信號
-    for _ in range(num_processes):
-        task_queue.put(None)
+    print(f"\n總任務數: {total_tasks}")
+    main_logger.info(f"總任務數: {total_tasks}，各進程分配: {scheduler.sizes()}")
 
     # 啟動工作進程
     processes = []
     for i in range(num_processes):
-        p = Process(target=worker_process, args=(i+1, task_queue, result_queue, year_month_list, stop_event))
+        p = Process(target=worker_process, args=(i+1, scheduler, result_queue, year_month_list, stop_event, rate_limit))
         p.start()
         processes.append(p)
         print(f"進程 {i+1} 已啟動")
@@ -273,12 +314,24 @@ def main():
     start_time = time.time()
 
     try:
+        last_metrics_update = 0
         while completed_tasks < total_tasks:
+            # 更新佇列深度與進程存活狀態 (每秒一次)
+            if time.time() - last_metrics_update >= 1:
+                last_metrics_update = time.time()
+                QUEUE_DEPTH.set(total_tasks - completed_tasks, queue="query6_1_pending")
+                QUEUE_DEPTH.set(result_queue.qsize(), queue="query6_1_results")
+                for worker_id, size in scheduler.sizes().items():
+                    QUEUE_DEPTH.set(size, queue=f"query6_1_worker_{worker_id}")
+                for i, p in enumerate(processes, 1):
+                    WORKER_ALIVE.set(1 if p.is_alive() else 0, worker=str(i))
+
             try:
                 result = result_queue.get(timeout=1)
                 status, company_code, year, month = result
 
                 completed_tasks += 1
+                TASKS_TOTAL.inc(status=status)
                 if status == 'success':
                     success_count += 1
                 else:
@@ -312,6 +365,7 @@ def main():
         print(f"失敗: {fail_count}")
         print(f"總耗時: {elapsed_time:.2f} 秒 ({elapsed_time/60:.2f} 分鐘)")
         print(f"平均速度: {total_tasks/elapsed_time:.2f} 筆/秒")
+        print(f"偷取任務數: {scheduler.steals()}")
         print("="*80)
 
         main_logger.info("="*60)
@@ -330,6 +384,9 @@ def main():
             p.terminate()
             p.join(timeout=2)
 
+    finally:
+        scheduler_manager.shutdown()
+
     print("\n程式結束")
 
 
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨進程共用的請求限速器 (依主機名稱)
+以 GCRA (token bucket 的等價演算法) 控制每秒請求數，狀態存於 MongoDB 的 _rate_limits 集合，
+所有進程 / 執行緒以 find_one_and_update 原子地預約下一個請求時間，總請求速率不會隨工作進程數增加
+
+遇到 429 / 5xx / 逾時時速率減半 (並依 Retry-After 暫停)，連續成功時逐步調升，
+讓工作進程數可以安全地增加到主機實際能承受的程度
+"""
+
+import time
+import threading
+from urllib.parse import urlparse
+from pymongo import MongoClient, ReturnDocument
+from metrics import REGISTRY
+
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    "scraper_rate_limit_wait_seconds", "Time spent waiting for the rate limiter", ("host",))
+RATE_LIMIT_RATE = REGISTRY.gauge(
+    "scraper_rate_limit_rate", "Current allowed requests per second", ("host",))
+RATE_LIMIT_BACKOFFS = REGISTRY.counter(
+    "scraper_rate_limit_backoffs_total", "Rate decreases after throttle or error responses", ("host", "reason"))
+
+# 視為主機過載的狀態碼
+THROTTLE_STATUS = {429, 503}
+ERROR_STATUS = {500, 502, 504}
+
+
+def host_key(url_or_host):
+    """由 URL 取得主機名稱 (已是主機名稱則原樣返回)"""
+    if "://" in url_or_host:
+        return urlparse(url_or_host).netloc
+    return url_or_host
+
+
+class _AdaptiveLimiter:
+    def __init__(self, host, rate=1.0, burst=1, min_rate=0.1, max_rate=None,
+                 increase_step=0.1, increase_every=20, decrease_factor=0.5, cooldown=5.0):
+        """
+        限速器共用設定
+
+        Args:
+            host: 主機名稱或 URL
+            rate: 初始每秒請求數 (所有進程合計)
+            burst: 可連續立即送出的請求數
+            min_rate: 速率下限
+            max_rate: 速率上限 (None: 初始速率的 4 倍)
+            increase_step: 每次調升的每秒請求數
+            increase_every: 連續成功幾次後調升一次
+            decrease_factor: 遇到限流或錯誤時的速率乘數
+            cooldown: 兩次調降之間的最短秒數 (避免同一波錯誤重複減半)
+        """
+        self.host = host_key(host)
+        self.initial_rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.increase_step = increase_step
+        self.increase_every = increase_every
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        等待直到可以送出下一個請求
+
+        Returns:
+            float: 實際等待秒數
+        """
+        wait = self._reserve(time.time())
+        if wait > 0:
+            time.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(max(wait, 0.0), host=self.host)
+        return max(wait, 0.0)
+
+    def report(self, status, retry_after=None):
+        """
+        回報請求結果以調整速率
+
+        Args:
+            status: HTTP 狀態碼，或 "success" / "error" (逾時、連線錯誤、Selenium 查詢失敗)
+            retry_after: 伺服器回應的 Retry-After 秒數
+        """
+        if status in THROTTLE_STATUS or status in ERROR_STATUS or status == "error":
+            reason = "throttle" if status in THROTTLE_STATUS else "error"
+            with self._lock:
+                self._successes = 0
+            try:
+                pause = float(retry_after) if retry_after else 0.0
+            except ValueError:
+                # Retry-After 也可能是 HTTP 日期，此時只調降速率
+                pause = 0.0
+            if self._decrease(time.time(), pause):
+                RATE_LIMIT_BACKOFFS.inc(host=self.host, reason=reason)
+            return
+
+        with self._lock:
+            self._successes += 1
+            if self._successes < self.increase_every:
+                return
+            self._successes = 0
+        self._increase()
+
+    def _interval_wait(self, tat, rate, now):
+        """依 GCRA 計算預約後需等待的秒數"""
+        interval = 1.0 / rate
+        tolerance = (self.burst - 1) * interval
+        return tat - interval - tolerance - now
+
+
+class MongoRateLimiter(_AdaptiveLimiter):
+    def __init__(self, collection, host, **kwargs):
+        """
+        以 MongoDB 文件共享狀態的限速器 (多進程 / 多機器共用同一個 collection)
+
+        Args:
+            collection: 存放限速狀態的 collection (每個主機一份文件，_id 為主機名稱)
+            host: 主機名稱或 URL
+            **kwargs: 見 _AdaptiveLimiter
+        """
+        super().__init__(host, **kwargs)
+        self.collection = collection
+
+    def _reserve(self, now):
+        # tat (theoretical arrival time): 下一個請求理論上可送出的時間
+        doc = self.collection.find_one_and_update(
+            {"_id": self.host},
+            [
+                {"$set": {"rate": {"$ifNull": ["$rate", self.initial_rate]}}},
+                {"$set": {"tat": {"$add": [
+                    {"$max": [{"$ifNull": ["$tat", now]}, now]},
+                    {"$divide": [1, "$rate"]},
+                ]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        RATE_LIMIT_RATE.set(doc["rate"], host=self.host)
+        return self._interval_wait(doc["tat"], doc["rate"], now)
+
+    def _decrease(self, now, pause):
+        # 只有距離上次調降超過 cooldown 才減半；Retry-After 則一律延後 tat
+        doc = self.collection.find_one_and_update(
+            {"_id": self.host},
+            [
+                {"$set": {"decreased": {"$gt": [
+                    {"$subtract": [now, {"$ifNull": ["$decreased_at", 0]}]}, self.cooldown]}}},
+                {"$set": {
+                    "rate": {"$cond": [
+                        "$decreased",
+                        {"$max": [self.min_rate, {"$multiply": [
+                            {"$ifNull": ["$rate", self.initial_rate]}, self.decrease_factor]}]},
+                        {"$ifNull": ["$rate", self.initial_rate]},
+                    ]},
+                    "decreased_at": {"$cond": ["$decreased", now, "$decreased_at"]},
+                    "tat": {"$max": [{"$ifNull": ["$tat", now]}, now + pause]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        RATE_LIMIT_RATE.set(doc["rate"], host=self.host)
+        changed = bool(doc.get("decreased"))
+        if changed:
+            print(f"⚠ {self.host} 限速調降為每秒 {doc['rate']:.2f} 次")
+        return changed
+
+    def _increase(self):
+        doc = self.collection.find_one_and_update(
+            {"_id": self.host},
+            [{"$set": {"rate": {"$min": [
+                self.max_rate,
+                {"$add": [{"$ifNull": ["$rate", self.initial_rate]}, self.increase_step]},
+            ]}}}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        RATE_LIMIT_RATE.set(doc["rate"], host=self.host)
+
+    def reset(self):
+        """清除此主機的限速狀態 (下次請求時以初始速率重新開始)"""
+        self.collection.delete_one({"_id": self.host})
+
+
+class LocalRateLimiter(_AdaptiveLimiter):
+    def __init__(self, host, **kwargs):
+        """
+        單一進程內的限速器 (無法連線 MongoDB 時使用，只限制本進程內的執行緒)
+
+        Args:
+            host: 主機名稱或 URL
+            **kwargs: 見 _AdaptiveLimiter
+        """
+        super().__init__(host, **kwargs)
+        self.rate = self.initial_rate
+        self.tat = 0.0
+        self.decreased_at = 0.0
+        self._state_lock = threading.Lock()
+
+    def _reserve(self, now):
+        with self._state_lock:
+            self.tat = max(self.tat, now) + 1.0 / self.rate
+            tat, rate = self.tat, self.rate
+        RATE_LIMIT_RATE.set(rate, host=self.host)
+        return self._interval_wait(tat, rate, now)
+
+    def _decrease(self, now, pause):
+        with self._state_lock:
+            self.tat = max(self.tat, now + pause)
+            if now - self.decreased_at <= self.cooldown:
+                return False
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.decreased_at = now
+            rate = self.rate
+        RATE_LIMIT_RATE.set(rate, host=self.host)
+        print(f"⚠ {self.host} 限速調降為每秒 {rate:.2f} 次")
+        return True
+
+    def _increase(self):
+        with self._state_lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+            rate = self.rate
+        RATE_LIMIT_RATE.set(rate, host=self.host)
+
+    def reset(self):
+        with self._state_lock:
+            self.rate = self.initial_rate
+            self.tat = 0.0
+
+
+def create_rate_limiter(host, rate=1.0, burst=1, mongodb_uri="mongodb://localhost:27017/",
+                        database="TW_Stock", collection="_rate_limits", **kwargs):
+    """
+    建立限速器：優先使用 MongoDB 共享狀態，無法連線時改用單一進程限速器
+
+    Args:
+        host: 主機名稱或 URL
+        rate: 初始每秒請求數 (所有進程合計)
+        burst: 可連續立即送出的請求數
+        mongodb_uri: MongoDB 連線字串 (None: 直接使用單一進程限速器)
+        database: 資料庫名稱
+        collection: 限速狀態 collection 名稱
+        **kwargs: 其他調整參數 (min_rate, max_rate, increase_step ...)
+
+    Returns:
+        MongoRateLimiter | LocalRateLimiter
+    """
+    if mongodb_uri:
+        try:
+            client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=2000)
+            client.admin.command("ping")
+            return MongoRateLimiter(client[database][collection], host, rate=rate, burst=burst, **kwargs)
+        except Exception as e:
+            print(f"⚠ 無法使用 MongoDB 共享限速 ({e})，改用單一進程限速")
+    return LocalRateLimiter(host, rate=rate, burst=burst, **kwargs)
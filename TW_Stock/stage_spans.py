@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+爬蟲分段計時 (span) 記錄與統計
+每個階段 (表單填寫、點擊、loading 等待、sessionStorage 輪詢、解析、MongoDB 儲存...)
+各寫入一行 JSON，執行後以統計工具彙整各階段 p50/p95/p99，用來調整輪詢間隔與隨機延遲
+
+Usage:
+    python stage_spans.py query6_1_spans.jsonl
+    python stage_spans.py query6_1_spans_p*.jsonl --by status
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+
+
+class SpanRecorder:
+    def __init__(self, path=None):
+        """
+        初始化 span 記錄器
+
+        Args:
+            path: JSON lines 輸出路徑 (None: 不記錄)
+        """
+        self.path = path
+        self.context = {}
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def set_context(self, **context):
+        """設定之後每個 span 都會附帶的欄位 (例如公司代號、年月)"""
+        self.context = context
+
+    def record(self, stage, seconds, **extra):
+        """
+        寫入一筆 span
+
+        Args:
+            stage: 階段名稱
+            seconds: 耗時秒數
+            **extra: 其他欄位 (例如輪詢次數、結果狀態)
+        """
+        if self._file is None:
+            return
+        entry = {"ts": time.time(), "pid": os.getpid(), "stage": stage, "seconds": round(seconds, 6)}
+        entry.update(self.context)
+        entry.update(extra)
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    @contextmanager
+    def span(self, stage, **extra):
+        """以 with 區塊計時並寫入 span (發生例外時 status 為 error)"""
+        start = time.perf_counter()
+        try:
+            yield extra
+        except Exception:
+            extra.setdefault("status", "error")
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, **extra)
+
+    def close(self):
+        """關閉輸出檔"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_spans(paths):
+    """
+    讀取一或多個 span 檔 (支援萬用字元)
+
+    Args:
+        paths: 路徑列表
+
+    Returns:
+        list: span 字典列表
+    """
+    spans = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        spans.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # 中斷時可能留下寫一半的最後一行
+                        continue
+    return spans
+
+
+def percentile(sorted_values, pct):
+    """以線性內插計算百分位數 (sorted_values 需已排序)"""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def summarize(spans, by=None):
+    """
+    依階段彙整耗時統計
+
+    Args:
+        spans: span 字典列表
+        by: 額外分組欄位 (例如 "status")
+
+    Returns:
+        list: 每個分組的統計字典，依總耗時由大到小排序
+    """
+    groups = {}
+    for span in spans:
+        key = span.get("stage", "?")
+        if by:
+            key = f"{key}[{span.get(by, '-')}]"
+        groups.setdefault(key, []).append(float(span.get("seconds", 0)))
+
+    summary = []
+    for key, values in groups.items():
+        values.sort()
+        total = sum(values)
+        summary.append({
+            "stage": key,
+            "count": len(values),
+            "total": total,
+            "mean": total / len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1],
+        })
+    summary.sort(key=lambda s: s["total"], reverse=True)
+    return summary
+
+
+def print_summary(summary):
+    """以表格輸出統計結果 (毫秒)"""
+    # "total" 為整筆請求的耗時，不計入各階段佔比的分母
+    grand_total = sum(s["total"] for s in summary if not s["stage"].startswith("total")) or 1
+    header = f"{'stage':<28}{'count':>8}{'share':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    print(header)
+    print("-" * len(header))
+    for s in summary:
+        print(
+            f"{s['stage']:<28}{s['count']:>8}{s['total'] / grand_total:>8.1%}"
+            f"{s['mean'] * 1000:>10.1f}{s['p50'] * 1000:>10.1f}{s['p95'] * 1000:>10.1f}"
+            f"{s['p99'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}"
+        )
+    print("(單位: ms，share 為該階段佔所有階段 span 總時間的比例)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Summarize per-stage scraper spans (p50/p95/p99).")
+    parser.add_argument("paths", nargs="+", help="span JSON lines files (glob patterns allowed)")
+    parser.add_argument("--by", help="additional field to group by, e.g. status")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    args = parse_args()
+    spans = load_spans(args.paths)
+    if not spans:
+        print("✗ 沒有可用的 span 資料")
+        sys.exit(1)
+
+    summary = summarize(spans, by=args.by)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(f"共 {len(spans)} 筆 span\n")
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
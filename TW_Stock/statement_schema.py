@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+財務報表文件結構正規化
+將 MOPS 表頭 (全形/半形括號、空白、不同年度用詞) 對應到固定的欄位名稱，
+金額 (仟元) 存為 Int64、非整數 (每股盈餘、比率) 存為 Decimal128，並移除空值 / NaN
+
+兩種儲存模式:
+    typed:  每個欄位一個 key (正規化後的欄位名稱)，值為型別化數值
+    packed: 欄位名稱只存一次於 _statement_columns，文件以「欄位表」id + 「數值」陣列儲存
+"""
+
+import math
+import hashlib
+from decimal import Decimal, InvalidOperation
+from bson.int64 import Int64
+from bson.decimal128 import Decimal128
+
+SCHEMA_MODES = ("raw", "typed", "packed")
+
+# 不轉換、保留在文件最上層的欄位 (唯一鍵欄位另外保留)
+META_FIELDS = ("爬取時間", "更新時間")
+
+# 不同年度 / 報表用詞不同但意義相同的表頭 (正規化後) → 固定欄位名稱
+FIELD_ALIASES = {
+    "資產總額": "資產總計",
+    "負債總額": "負債總計",
+    "權益總額": "權益總計",
+    "股東權益總計": "權益總計",
+    "股東權益總額": "權益總計",
+    "歸屬於母公司業主之權益": "歸屬於母公司業主之權益合計",
+    "歸屬於母公司業主權益合計": "歸屬於母公司業主之權益合計",
+    "營業收入合計": "營業收入",
+    "營業成本合計": "營業成本",
+    "營業費用合計": "營業費用",
+    "營業毛利(毛損)淨額": "營業毛利(毛損)",
+    "本期稅後淨利(淨損)": "本期淨利(淨損)",
+    "基本每股盈餘": "基本每股盈餘(元)",
+    "每股參考淨值(元)": "每股參考淨值",
+    "營業活動之現金流入(流出)": "營業活動之淨現金流入(流出)",
+}
+
+_HEADER_TRANSLATION = str.maketrans({
+    "（": "(", "）": ")", "：": ":", "，": ",", "　": "", " ": "", "\t": "", "\n": "", "\r": "",
+})
+
+
+def normalize_header(header):
+    """
+    正規化表頭 (全形符號轉半形、移除空白) 並對應到固定欄位名稱
+
+    Args:
+        header: 原始表頭
+
+    Returns:
+        str: 欄位名稱
+    """
+    name = str(header).translate(_HEADER_TRANSLATION)
+    return FIELD_ALIASES.get(name, name)
+
+
+def typed_value(value):
+    """
+    將數值轉為 MongoDB 型別：整數 (仟元) 為 Int64，非整數為 Decimal128，空值 / NaN / 無限大為 None
+
+    Args:
+        value: float / int / str / None
+
+    Returns:
+        Int64 | Decimal128 | str | None
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        if value.is_integer():
+            return Int64(int(value))
+        return Decimal128(Decimal(repr(value)))
+    if isinstance(value, int):
+        return Int64(value)
+    if isinstance(value, str):
+        text = value.replace(",", "").strip()
+        if not text or text in ("-", "--", "NaN", "nan"):
+            return None
+        try:
+            number = Decimal(text)
+        except InvalidOperation:
+            # 非數值欄位 (例如公司名稱) 保留原字串
+            return value.strip()
+        if not number.is_finite():
+            # "Infinity" / "inf" / "sNaN" 與 float 的 inf / NaN 相同視為空值
+            return None
+        if number == number.to_integral_value():
+            return Int64(int(number))
+        return Decimal128(number)
+    return value
+
+
+def to_python(value):
+    """將 Int64 / Decimal128 轉回 Python int / Decimal (分析時使用)"""
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, Int64):
+        return int(value)
+    return value
+
+
+class StatementSchema:
+    def __init__(self, db=None, collection="_statement_columns"):
+        """
+        初始化報表結構正規化器
+
+        Args:
+            db: MongoDB database 物件 (packed 模式需要，用來存放共用欄位表)
+            collection: 欄位表 collection 名稱
+        """
+        self.columns_collection = db[collection] if db is not None else None
+        # 欄位表快取 {欄位表 id: (欄位名稱, ...)}
+        self._columns = {}
+
+    def normalize_record(self, record, key_fields):
+        """
+        typed 模式：正規化欄位名稱與數值型別，移除空值
+
+        Args:
+            record: 原始資料字典
+            key_fields: 唯一鍵欄位 (原樣保留)
+
+        Returns:
+            dict: 正規化後的文件
+        """
+        document = {}
+        for field, value in record.items():
+            if field in key_fields or field in META_FIELDS or field == "_id":
+                document[field] = value
+                continue
+            value = typed_value(value)
+            if value is not None:
+                document[normalize_header(field)] = value
+        return document
+
+    def columns_id(self, columns):
+        """
+        取得 (必要時建立) 欄位表 id
+
+        Args:
+            columns: 欄位名稱 tuple
+
+        Returns:
+            str: 欄位表 id (欄位名稱的雜湊值，相同欄位組合共用同一個 id)
+        """
+        columns = tuple(columns)
+        columns_id = hashlib.sha1("\x1f".join(columns).encode("utf-8")).hexdigest()[:12]
+        if columns_id not in self._columns:
+            if self.columns_collection is not None:
+                self.columns_collection.update_one(
+                    {"_id": columns_id},
+                    {"$setOnInsert": {"欄位": list(columns)}},
+                    upsert=True,
+                )
+            self._columns[columns_id] = columns
+        return columns_id
+
+    def pack_records(self, records, key_fields):
+        """
+        packed 模式：同一批資料共用一個欄位表，每份文件只存數值陣列 (缺值為 None)
+
+        Args:
+            records: 原始資料字典列表 (通常為同一市場、年度、季別的表格)
+            key_fields: 唯一鍵欄位 (原樣保留)
+
+        Returns:
+            list: 緊湊文件列表 {唯一鍵..., 欄位表, 數值}
+        """
+        normalized = [self.normalize_record(record, key_fields) for record in records]
+        keep = set(key_fields) | set(META_FIELDS) | {"_id"}
+
+        columns = []
+        seen = set()
+        for document in normalized:
+            for field in document:
+                if field not in keep and field not in seen:
+                    seen.add(field)
+                    columns.append(field)
+        columns_id = self.columns_id(columns)
+
+        packed = []
+        for document in normalized:
+            compact = {field: document[field] for field in document if field in keep}
+            compact["欄位表"] = columns_id
+            compact["數值"] = [document.get(field) for field in columns]
+            packed.append(compact)
+        return packed
+
+    def load_columns(self, columns_id):
+        """由欄位表 collection 載入欄位名稱 (有快取)"""
+        if columns_id not in self._columns:
+            doc = self.columns_collection.find_one({"_id": columns_id}) if self.columns_collection is not None else None
+            if doc is None:
+                raise KeyError(f"找不到欄位表: {columns_id}")
+            self._columns[columns_id] = tuple(doc["欄位"])
+        return self._columns[columns_id]
+
+    def unpack_document(self, document):
+        """
+        將 packed 文件展開為 {欄位名稱: 數值} (非 packed 文件原樣返回)
+
+        Args:
+            document: MongoDB 文件
+
+        Returns:
+            dict: 展開後的文件 (省略 None)
+        """
+        if "欄位表" not in document:
+            return document
+        columns = self.load_columns(document["欄位表"])
+        unpacked = {field: value for field, value in document.items() if field not in ("欄位表", "數值")}
+        for field, value in zip(columns, document["數值"]):
+            if value is not None:
+                unpacked[field] = value
+        return unpacked
+
+    def field_index(self, columns_id, field):
+        """
+        取得欄位在 packed 數值陣列中的位置 (查詢時可用 {"數值.<位置>": ...})
+
+        Args:
+            columns_id: 欄位表 id
+            field: 欄位名稱 (會先正規化)
+
+        Returns:
+            int: 位置，不存在則為 -1
+        """
+        columns = self.load_columns(columns_id)
+        name = normalize_header(field)
+        return columns.index(name) if name in columns else -1
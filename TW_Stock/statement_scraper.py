@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+財務報表通用批次爬蟲引擎
+資產負債表、綜合損益表、現金流量表共用同一套查詢、解析與儲存流程，
+各報表只需提供報表描述 (URL、collection、唯一鍵欄位)
+"""
+
+import os
+import re
+import time
+from datetime import datetime
+from mops_scraper import MOPSScraper, MOPS_BASE_URL
+from mongodb_helper import MongoDBHelper, find_existing_keys, bulk_upsert
+from coverage_index import mark_batch
+from table_extractor import extract_tables, to_number
+from metrics import REQUEST_SECONDS, REQUESTS_TOTAL, PARSE_SECONDS
+from statement_schema import StatementSchema, SCHEMA_MODES
+
+
+class StatementDescriptor:
+    def __init__(self, name, url, collection, key_fields=("公司代號", "年度", "季別"),
+                 code_keywords=("公司代號", "代號", "公司代碼", "股票代號"), start_year=102):
+        """
+        財務報表描述
+
+        Args:
+            name: 報表名稱 (例如: 綜合損益表)
+            url: MOPS 查詢頁面 URL
+            collection: 儲存的 MongoDB collection 名稱
+            key_fields: 唯一鍵欄位
+            code_keywords: 用來辨識公司代號欄位的關鍵字
+            start_year: scrape_all_history 預設的起始年度
+        """
+        self.name = name
+        self.url = url
+        self.endpoint = url.rstrip('/').split('/')[-1]
+        self.collection = collection
+        self.key_fields = tuple(key_fields)
+        self.code_keywords = tuple(code_keywords)
+        self.start_year = start_year
+
+
+# 已支援的財務報表，新增報表只需在此加入描述
+STATEMENTS = {
+    "balance_sheet": StatementDescriptor(
+        name="資產負債表",
+        url=f"{MOPS_BASE_URL}/mops/#/web/t163sb05",
+        collection="上市櫃公司資產負債表",
+        code_keywords=("公司代號", "公司代碼", "股票代號"),
+        start_year=100,
+    ),
+    "income": StatementDescriptor(
+        name="綜合損益表",
+        url=f"{MOPS_BASE_URL}/mops/#/web/t163sb04",
+        collection="上市櫃公司綜合損益表",
+    ),
+    "cashflow": StatementDescriptor(
+        name="現金流量表",
+        url=f"{MOPS_BASE_URL}/mops/#/web/t163sb20",
+        collection="上市櫃公司現金流量表",
+        start_year=100,
+    ),
+}
+
+MARKET_NAMES = {"sii": "上市", "otc": "上櫃", "rotc": "興櫃"}
+
+
+class StatementScraper:
+    def __init__(self, descriptor, mongodb_uri="mongodb://localhost:27017/", headless=True, schema_mode=None):
+        """
+        初始化財務報表爬蟲
+
+        Args:
+            descriptor: StatementDescriptor 或 STATEMENTS 中的鍵值
+            mongodb_uri: MongoDB 連線字串
+            headless: 是否使用無頭模式
+            schema_mode: 文件結構 "raw" (原始表頭) / "typed" / "packed" (statement_schema.py)，
+                         None 時讀取環境變數 STATEMENT_SCHEMA_MODE (預設 raw)
+        """
+        if isinstance(descriptor, str):
+            descriptor = STATEMENTS[descriptor]
+        self.descriptor = descriptor
+
+        self.schema_mode = schema_mode or os.getenv("STATEMENT_SCHEMA_MODE", "raw")
+        if self.schema_mode not in SCHEMA_MODES:
+            raise ValueError(f"未知的文件結構模式: {self.schema_mode} (可用: {', '.join(SCHEMA_MODES)})")
+
+        self.scraper = MOPSScraper(headless=headless)
+        self.scraper.url = descriptor.url
+
+        self.db_helper = MongoDBHelper(mongodb_uri)
+        self.client = self.db_helper.client
+        self.db = self.client['TW_Stock']
+        self.company_basic = self.db['公司基本資料']
+        self.collection = self.db[descriptor.collection]
+        self.schema = StatementSchema(self.db) if self.schema_mode != "raw" else None
+
+        # 有效公司代號 (第一次使用時才從資料庫載入)
+        self.valid_company_codes = None
+
+        # 建立索引
+        self._create_indexes()
+
+    def _create_indexes(self):
+        """建立索引"""
+        try:
+            self.collection.create_index(
+                [(field, 1) for field in self.descriptor.key_fields],
+                unique=True
+            )
+            print(f"✓ MongoDB 索引建立完成 ({self.descriptor.collection})")
+        except Exception as e:
+            print(f"建立索引時發生錯誤: {e}")
+
+    def _get_valid_company_codes(self):
+        """
+        從公司基本資料中一次取得所有有效的公司代號
+
+        Returns:
+            set: 公司代號集合
+        """
+        try:
+            companies = self.company_basic.find({}, {"公司 代號": 1, "_id": 0})
+            return {c["公司 代號"] for c in companies if "公司 代號" in c}
+        except Exception as e:
+            print(f"✗ 取得公司代號失敗: {e}")
+            return set()
+
+    def company_exists(self, company_code):
+        """檢查公司是否存在於基本資料中"""
+        if self.valid_company_codes is None:
+            self.valid_company_codes = self._get_valid_company_codes()
+            print(f"✓ 載入 {len(self.valid_company_codes)} 家有效公司代號")
+        return company_code in self.valid_company_codes
+
+    def record_exists(self, company_code, year, season):
+        """檢查報表資料是否已存在"""
+        return self.collection.find_one({
+            "公司代號": company_code,
+            "年度": year,
+            "季別": season
+        }) is not None
+
+    def insert_record(self, data):
+        """插入單筆報表資料"""
+        return self.insert_records_batch([data]) == 1
+
+    def insert_records_batch(self, data_list):
+        """
+        批次插入報表資料 (單次 bulk_write)
+
+        Args:
+            data_list: 資料字典列表
+
+        Returns:
+            int: 成功插入的筆數
+        """
+        now = datetime.now()
+        for data in data_list:
+            data["更新時間"] = now
+        key_fields = self.descriptor.key_fields
+        if self.schema_mode == "typed":
+            data_list = [self.schema.normalize_record(data, key_fields) for data in data_list]
+        elif self.schema_mode == "packed":
+            data_list = self.schema.pack_records(data_list, key_fields)
+        written = []
+        success_count = bulk_upsert(self.collection, data_list, key_fields, written)
+        mark_batch(self.db_helper.coverage, self.descriptor.collection, written)
+        return success_count
+
+    def filter_new_records(self, records):
+        """
+        以單次查詢過濾掉資料庫中已存在的資料
+
+        Args:
+            records: 資料字典列表
+
+        Returns:
+            list: 尚未存在的資料
+        """
+        key_fields = self.descriptor.key_fields
+        existing = find_existing_keys(self.collection, key_fields, records)
+        return [r for r in records if tuple(r[f] for f in key_fields) not in existing]
+
+    def parse_all_companies_from_table(self, html_content, year, season):
+        """
+        從表格中解析所有公司的資料
+        只解析表頭含有公司代號欄位的結果表格 (table_extractor)
+
+        Args:
+            html_content: HTML 內容
+            year: 年度
+            season: 季別
+
+        Returns:
+            list: 包含所有公司資料的字典列表
+        """
+        try:
+            tables = extract_tables(html_content, self.descriptor.code_keywords)
+
+            if not tables:
+                print(f"  ✗ 未找到含公司代號欄位的表格")
+                return []
+
+            print(f"  找到 {len(tables)} 個結果表格")
+
+            all_records = []
+            skip_count = 0
+            crawl_time = datetime.now()
+
+            for table_idx, table in enumerate(tables):
+                print(f"\n  分析表格 {table_idx + 1}, 維度: {table.shape}")
+
+                # 尋找公司代號欄位
+                code_idx = table.column_index(self.descriptor.code_keywords)
+
+                if code_idx < 0:
+                    print(f"  ⊙ 表格 {table_idx + 1} 沒有公司代號欄位,跳過")
+                    continue
+
+                print(f"  ✓ 找到公司代號欄位: {table.columns[code_idx]}")
+
+                # 欄位名稱只需處理一次
+                value_columns = [
+                    (i, str(col).strip())
+                    for i, col in enumerate(table.columns)
+                    if i != code_idx
+                ]
+
+                # 逐列處理
+                for idx, row in enumerate(table.rows):
+                    # 取得公司代號
+                    company_code = row[code_idx].strip()
+
+                    # 過濾無效的代號
+                    if not company_code or len(company_code) < 4:
+                        continue
+
+                    # 清理公司代號 (只保留數字)
+                    company_code = re.sub(r'[^0-9]', '', company_code)
+
+                    if not company_code:
+                        continue
+
+                    # 檢查公司是否存在於基本資料
+                    if not self.company_exists(company_code):
+                        skip_count += 1
+                        continue
+
+                    # 建立記錄
+                    record = {
+                        "公司代號": company_code,
+                        "年度": year,
+                        "季別": season,
+                        "爬取時間": crawl_time
+                    }
+
+                    # 將每一欄的資料加入記錄 (數值欄位轉為 float)
+                    for col_idx, col_name in value_columns:
+                        value = to_number(row[col_idx])
+                        if value is not None:
+                            record[col_name] = value
+
+                    all_records.append(record)
+
+            if skip_count > 0:
+                print(f"\n  ⊙ {skip_count} 筆不在「公司基本資料」中,跳過")
+            print(f"\n  ✓ 總共解析出 {len(all_records)} 筆有效資料")
+            return all_records
+
+        except Exception as e:
+            print(f"  ✗ 解析表格失敗: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    def scrape_and_save_batch(self, market_type, year, season):
+        """
+        一次爬取並儲存某市場、年度、季別的所有公司資料
+
+        Args:
+            market_type: 市場類型 ("sii", "otc")
+            year: 年度
+            season: 季別
+
+        Returns:
+            int: 成功儲存的筆數
+        """
+        market_name = MARKET_NAMES.get(market_type, market_type)
+
+        print(f"\n{'='*60}")
+        print(f"爬取 {self.descriptor.name} {market_name} {year}Q{season}")
+        print(f"{'='*60}")
+
+        try:
+            # 執行查詢
+            print("正在查詢...")
+            endpoint = self.descriptor.endpoint
+            with REQUEST_SECONDS.time(endpoint=endpoint):
+                result_url = self.scraper.scrape_data(market_type, year, season)
+
+            if not result_url:
+                REQUESTS_TOTAL.inc(endpoint=endpoint, status="fail")
+                print("✗ 查詢失敗")
+                return 0
+
+            REQUESTS_TOTAL.inc(endpoint=endpoint, status="success")
+
+            # 等待頁面完全載入
+            time.sleep(3)
+
+            # 取得頁面內容
+            html_content = self.scraper.driver.page_source
+
+            # 解析所有公司資料
+            print("\n解析表格資料...")
+            with PARSE_SECONDS.time(parser=endpoint):
+                all_records = self.parse_all_companies_from_table(html_content, year, season)
+
+            if not all_records:
+                print("✗ 未解析到任何資料")
+                return 0
+
+            # 過濾已存在的資料 (單次查詢)
+            print("\n檢查重複資料...")
+            new_records = self.filter_new_records(all_records)
+            skip_count = len(all_records) - len(new_records)
+
+            print(f"  已存在: {skip_count} 筆")
+            print(f"  需新增: {len(new_records)} 筆")
+
+            # 批次儲存到 MongoDB
+            if new_records:
+                print("\n儲存到 MongoDB...")
+                success_count = self.insert_records_batch(new_records)
+                print(f"✓ 成功儲存 {success_count}/{len(new_records)} 筆")
+                return success_count
+            else:
+                print("⊙ 所有資料已存在,無需新增")
+                return 0
+
+        except Exception as e:
+            print(f"\n✗ 爬取失敗: {e}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+    def scrape_all_history(self, market_types=["sii", "otc"], start_year=None, end_year=113):
+        """
+        按市場別+年度+季別批次爬取所有歷史資料
+
+        Args:
+            market_types: 市場類型列表
+            start_year: 起始年度 (None: 報表描述的預設起始年度)
+            end_year: 結束年度
+        """
+        if start_year is None:
+            start_year = self.descriptor.start_year
+        print("\n" + "="*60)
+        print(f"{self.descriptor.name}批次爬蟲")
+        print("="*60)
+
+        total_success = 0
+        total_requests = 0
+
+        for market_type in market_types:
+            market_name = MARKET_NAMES.get(market_type, market_type)
+
+            print(f"\n\n{'#'*60}")
+            print(f"# {market_name}公司")
+            print(f"{'#'*60}")
+
+            for year in range(start_year, end_year + 1):
+                for season in range(1, 5):
+                    total_requests += 1
+
+                    print(f"\n[請求 {total_requests}] {market_name} {year}Q{season}")
+
+                    success_count = self.scrape_and_save_batch(market_type, year, season)
+                    total_success += success_count
+
+                    # 避免請求過於頻繁
+                    print("\n休息 5 秒...")
+                    time.sleep(5)
+
+        print(f"\n\n{'='*60}")
+        print("爬取完成!")
+        print(f"{'='*60}")
+        print(f"總請求次數: {total_requests}")
+        print(f"成功儲存: {total_success} 筆")
+        print(f"{'='*60}\n")
+
+    def close(self):
+        """關閉連線"""
+        self.scraper.close()
+        self.db_helper.close()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MOPS 結果表格快速解析模組
+以 lxml XPath 依表頭特徵 (例如「公司代號」) 定位結果表格，只解析需要的表格，
+取代對整份 page_source 執行 pd.read_html 再丟棄大部分表格的做法
+"""
+
+import re
+from lxml import html as lxml_html
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class ExtractedTable:
+    def __init__(self, columns, rows):
+        """
+        解析後的表格
+
+        Args:
+            columns: 欄位名稱列表 (單層表頭為字串，多層表頭為 tuple，與 pd.read_html 相同)
+            rows: 資料列列表，每列為與 columns 等長的字串列表
+        """
+        self.columns = columns
+        self.rows = rows
+
+    @property
+    def shape(self):
+        return (len(self.rows), len(self.columns))
+
+    def column_index(self, keywords):
+        """
+        依關鍵字尋找欄位位置
+
+        Args:
+            keywords: 欄位名稱關鍵字
+
+        Returns:
+            int: 欄位位置，找不到則返回 -1
+        """
+        for i, col in enumerate(self.columns):
+            col_str = str(col).strip()
+            if any(keyword in col_str for keyword in keywords):
+                return i
+        return -1
+
+
+def _cell_text(cell):
+    """取得儲存格文字 (與 pd.read_html 相同：合併空白並去除前後空白)"""
+    return _WHITESPACE_RE.sub(' ', cell.text_content()).strip()
+
+
+def _expand_spans(tr_list):
+    """
+    將 tr 列表展開為文字方格，處理 colspan / rowspan
+
+    Args:
+        tr_list: lxml tr 元素列表
+
+    Returns:
+        list: 每列為文字列表
+    """
+    grid = []
+    pending = {}  # 欄位位置 -> (剩餘列數, 文字)
+
+    for tr in tr_list:
+        row = []
+        col = 0
+        cells = [c for c in tr if c.tag in ('td', 'th')]
+        cell_idx = 0
+
+        while cell_idx < len(cells) or col in pending:
+            if col in pending:
+                remaining, text = pending[col]
+                row.append(text)
+                if remaining <= 1:
+                    del pending[col]
+                else:
+                    pending[col] = (remaining - 1, text)
+                col += 1
+                continue
+
+            cell = cells[cell_idx]
+            cell_idx += 1
+            text = _cell_text(cell)
+            colspan = int(cell.get('colspan', 1) or 1)
+            rowspan = int(cell.get('rowspan', 1) or 1)
+            for _ in range(colspan):
+                row.append(text)
+                if rowspan > 1:
+                    pending[col] = (rowspan - 1, text)
+                col += 1
+
+        grid.append(row)
+
+    return grid
+
+
+def _build_columns(header_grid, width):
+    """
+    將表頭方格轉換為欄位名稱 (與 pd.read_html 的命名方式一致)
+
+    Args:
+        header_grid: 表頭文字方格
+        width: 欄位數
+
+    Returns:
+        list: 欄位名稱列表
+    """
+    if not header_grid:
+        return list(range(width))
+
+    levels = []
+    for level, row in enumerate(header_grid):
+        row = row + [''] * (width - len(row))
+        names = []
+        for i, text in enumerate(row[:width]):
+            if not text:
+                if len(header_grid) == 1:
+                    text = f"Unnamed: {i}"
+                else:
+                    text = f"Unnamed: {i}_level_{level}"
+            names.append(text)
+        levels.append(names)
+
+    if len(levels) == 1:
+        return levels[0]
+    return [tuple(level[i] for level in levels) for i in range(width)]
+
+
+def _split_header_rows(table):
+    """
+    區分表頭列與資料列
+
+    Returns:
+        tuple: (表頭 tr 列表, 資料 tr 列表)
+    """
+    thead_rows = table.xpath('./thead/tr')
+    body_rows = table.xpath('./tbody/tr | ./tr')
+
+    if thead_rows:
+        return thead_rows, body_rows
+
+    # 沒有 thead 時，開頭全部由 th 組成的列視為表頭
+    header_rows = []
+    for tr in body_rows:
+        cells = [c for c in tr if c.tag in ('td', 'th')]
+        if cells and all(c.tag == 'th' for c in cells):
+            header_rows.append(tr)
+        else:
+            break
+    return header_rows, body_rows[len(header_rows):]
+
+
+def _build_xpath(header_keywords):
+    """依表頭關鍵字建立定位結果表格的 XPath"""
+    conditions = " or ".join(
+        f'contains(normalize-space(.), "{keyword}")' for keyword in header_keywords
+    )
+    return (
+        f'//table[(./thead/tr/*[{conditions}])'
+        f' or (./tr[1]/*[{conditions}])'
+        f' or (./tbody/tr[1]/*[{conditions}])]'
+    )
+
+
+def extract_tables(html_content, header_keywords=("公司代號",)):
+    """
+    只解析表頭含有指定關鍵字的表格
+
+    Args:
+        html_content: HTML 內容 (str 或 bytes)
+        header_keywords: 用來辨識結果表格的表頭關鍵字
+
+    Returns:
+        list: ExtractedTable 列表
+    """
+    if not html_content:
+        return []
+
+    doc = lxml_html.fromstring(html_content)
+    tables = []
+
+    for table in doc.xpath(_build_xpath(header_keywords)):
+        header_rows, body_rows = _split_header_rows(table)
+        header_grid = _expand_spans(header_rows)
+        body_grid = [row for row in _expand_spans(body_rows) if row]
+
+        width = max([len(r) for r in header_grid] + [len(r) for r in body_grid] + [0])
+        columns = _build_columns(header_grid, width)
+        rows = [row + [''] * (width - len(row)) for row in body_grid]
+
+        tables.append(ExtractedTable(columns, rows))
+
+    return tables
+
+
+def to_number(text):
+    """
+    將儲存格文字轉換為數值
+
+    Args:
+        text: 儲存格文字
+
+    Returns:
+        float | str | None: 可轉換則為 float，空值為 None，其餘保留原字串
+    """
+    if text is None:
+        return None
+    clean_value = text.replace(',', '').replace('$', '').strip()
+    if not clean_value or clean_value == '-':
+        return None
+    try:
+        return float(clean_value)
+    except ValueError:
+        return text
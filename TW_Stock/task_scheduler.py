@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多進程爬蟲任務排程器 (work stealing)
+每個工作進程各有一個本地 deque，從自己的佇列前端取任務；
+自己的佇列空了就從剩餘工作量最大的進程佇列尾端偷一個任務，
+避免某家公司查詢特別慢時其他進程閒置
+
+任務排序可選:
+    company: 依公司排序 (同一家公司的月份集中在同一進程)
+    month:   依年月排序 (原本的排法)
+    cost:    依歷史明細筆數估計成本，成本高的先排 (LPT)
+並可讓最近 N 個月的任務優先於較舊的月份，略過已知為空的任務 (empty_result_cache.py)
+"""
+
+import threading
+from collections import deque
+from multiprocessing.managers import BaseManager
+
+ORDERINGS = ("company", "month", "cost")
+
+
+def load_company_costs(collection, company_field="公司代號", rows_field=None):
+    """
+    由歷史資料估計每家公司每次查詢的成本 (每月平均明細筆數)
+
+    Args:
+        collection: 已存在的明細 collection (例如: 內部人持股異動事後申報表)
+        company_field: 公司代號欄位名稱
+        rows_field: 分桶文件的明細筆數欄位 (None: 每份文件為一筆明細)
+
+    Returns:
+        dict: {公司代號: 每月平均筆數}
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {"code": f"${company_field}", "year": "$查詢年度", "month": "$查詢月份"},
+            "rows": {"$sum": f"${rows_field}" if rows_field else 1},
+        }},
+        {"$group": {"_id": "$_id.code", "rows": {"$avg": "$rows"}}},
+    ]
+    return {doc["_id"]: doc["rows"] for doc in collection.aggregate(pipeline, allowDiskUse=True)}
+
+
+def build_tasks(company_codes, year_month_list, ordering="company", costs=None, recent_months=12,
+                exclude=None, low_priority=None):
+    """
+    產生排序後的任務列表
+
+    Args:
+        company_codes: 公司代號列表
+        year_month_list: [(year, month), ...]
+        ordering: "company" / "month" / "cost"
+        costs: {公司代號: 成本}，cost 排序使用 (缺少的公司視為成本 1)
+        recent_months: 最近幾個月的任務優先排程 (0: 不分優先)
+        exclude: 不需排程的任務 set[(公司代號, 年度, 月份)]
+        low_priority: 排在所有任務最後的公司代號 set (例如長期查無資料的公司)
+
+    Returns:
+        list: [(cost, (company_code, year, month)), ...]
+    """
+    if ordering not in ORDERINGS:
+        raise ValueError(f"未知的排序方式: {ordering} (可用: {', '.join(ORDERINGS)})")
+
+    costs = costs or {}
+    exclude = exclude or set()
+    low_priority = low_priority or set()
+    # 新的月份在前
+    months = sorted(year_month_list, reverse=True)
+    tiers = [months[:recent_months], months[recent_months:]] if recent_months else [months]
+    normal_codes = [code for code in company_codes if code not in low_priority]
+    low_codes = [code for code in company_codes if code in low_priority]
+
+    tasks = []
+    for codes, code_tiers in ((normal_codes, tiers), (low_codes, [months])):
+        for tier in code_tiers:
+            if ordering == "company":
+                tier_tasks = [(code, year, month) for code in codes for year, month in tier]
+            elif ordering == "month":
+                tier_tasks = [(code, year, month) for year, month in tier for code in codes]
+            else:
+                # 成本高的先做，同成本時新的月份在前
+                rank = {ym: i for i, ym in enumerate(tier)}
+                tier_tasks = sorted(
+                    ((code, year, month) for year, month in tier for code in codes),
+                    key=lambda t: (-costs.get(t[0], 1), rank[(t[1], t[2])]),
+                )
+            tasks.extend((1 + costs.get(task[0], 0), task) for task in tier_tasks if task not in exclude)
+    return tasks
+
+
+class WorkStealingScheduler:
+    def __init__(self, num_workers):
+        """
+        初始化排程器
+
+        Args:
+            num_workers: 工作進程數 (worker_id 為 1..num_workers)
+        """
+        self.num_workers = num_workers
+        self._queues = {i: deque() for i in range(1, num_workers + 1)}
+        self._loads = {i: 0.0 for i in self._queues}
+        self._steals = 0
+        self._lock = threading.Lock()
+
+    def assign(self, tasks, ordering="company"):
+        """
+        將任務分配到各進程的本地佇列
+        同一組任務 (company 排序: 同公司；month 排序: 同年月；cost: 單一任務) 交給目前負載最小的進程
+
+        Args:
+            tasks: build_tasks 的結果
+            ordering: 與 build_tasks 相同的排序方式
+
+        Returns:
+            int: 分配的任務數
+        """
+        with self._lock:
+            group, group_key, group_cost = [], None, 0.0
+            for cost, task in tasks:
+                if ordering == "company":
+                    key = task[0]
+                elif ordering == "month":
+                    key = (task[1], task[2])
+                else:
+                    key = task
+                if group and key != group_key:
+                    self._push_group(group, group_cost)
+                    group, group_cost = [], 0.0
+                group_key = key
+                group.append((cost, task))
+                group_cost += cost
+            if group:
+                self._push_group(group, group_cost)
+        return len(tasks)
+
+    def _push_group(self, group, group_cost):
+        worker_id = min(self._loads, key=self._loads.get)
+        self._queues[worker_id].extend(group)
+        self._loads[worker_id] += group_cost
+
+    def get(self, worker_id):
+        """
+        取得下一個任務：先從自己的佇列前端取，沒有時從負載最大的進程佇列尾端偷
+
+        Args:
+            worker_id: 進程編號
+
+        Returns:
+            tuple | None: (company_code, year, month)，所有佇列皆空時返回 None
+        """
+        with self._lock:
+            own = self._queues[worker_id]
+            if own:
+                cost, task = own.popleft()
+                self._loads[worker_id] -= cost
+                return task
+
+            victim = max(self._loads, key=self._loads.get)
+            if not self._queues[victim]:
+                return None
+            cost, task = self._queues[victim].pop()
+            self._loads[victim] -= cost
+            self._steals += 1
+            return task
+
+    def sizes(self):
+        """各進程佇列剩餘任務數 {worker_id: 數量}"""
+        with self._lock:
+            return {worker_id: len(queue) for worker_id, queue in self._queues.items()}
+
+    def remaining(self):
+        """所有佇列剩餘任務數"""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def steals(self):
+        """累計被偷取的任務數"""
+        with self._lock:
+            return self._steals
+
+
+class SchedulerManager(BaseManager):
+    """在 manager 進程中共用 WorkStealingScheduler，各工作進程透過 proxy 呼叫"""
+
+
+SchedulerManager.register("WorkStealingScheduler", WorkStealingScheduler)
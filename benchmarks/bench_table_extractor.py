@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+結果表格解析效能比較: pd.read_html vs table_extractor (lxml XPath)
+
+Usage:
+    python benchmarks/bench_table_extractor.py --rows 2000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from io import StringIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TW_Stock"))
+
+from fixtures import make_statement_page, read_saved_page  # noqa: E402
+from table_extractor import extract_tables  # noqa: E402
+
+CODE_KEYWORDS = ("公司代號", "公司代碼", "股票代號")
+
+
+def parse_with_read_html(html_content):
+    """原本的做法：解析所有表格後只保留有公司代號欄位的表格"""
+    tables = pd.read_html(StringIO(html_content))
+    kept = []
+    for df in tables:
+        if any(any(k in str(col) for k in CODE_KEYWORDS) for col in df.columns):
+            kept.append(df)
+    return sum(len(df) for df in kept)
+
+
+def parse_with_extractor(html_content):
+    """只解析表頭含有公司代號欄位的表格"""
+    tables = extract_tables(html_content, CODE_KEYWORDS)
+    return sum(len(t.rows) for t in tables)
+
+
+def best_of(func, html_content, repeat):
+    """取多次執行中的最短時間 (秒) 與解析列數"""
+    best = float("inf")
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func(html_content)
+        best = min(best, time.perf_counter() - start)
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pd.read_html against table_extractor.")
+    parser.add_argument("--rows", type=int, default=2000, help="rows in the synthetic quarterly page")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per case (best is reported)")
+    parser.add_argument("--json", type=str, default="", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    pages = {
+        f"statement_{args.rows}_rows": make_statement_page(args.rows),
+        "mops_page": read_saved_page("mops_page"),
+        "mops_playwright": read_saved_page("mops_playwright"),
+    }
+
+    results = []
+    for name, html_content in pages.items():
+        read_html_time, read_html_rows = best_of(parse_with_read_html, html_content, args.repeat)
+        extractor_time, extractor_rows = best_of(parse_with_extractor, html_content, args.repeat)
+        result = {
+            "page": name,
+            "read_html_seconds": round(read_html_time, 6),
+            "extractor_seconds": round(extractor_time, 6),
+            "speedup": round(read_html_time / extractor_time, 2) if extractor_time else None,
+            "read_html_rows": read_html_rows,
+            "extractor_rows": extractor_rows,
+        }
+        results.append(result)
+        print(f"{name:<28} read_html {read_html_time*1000:8.1f} ms | "
+              f"extractor {extractor_time*1000:8.1f} ms | x{result['speedup']} | "
+              f"rows {read_html_rows}/{extractor_rows}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
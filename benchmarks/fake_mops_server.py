@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本機 MOPS / TWSE 模擬伺服器 (壓力測試與限速器測試用)
+回應內容來自 benchmarks/fixtures/ 錄製檔或 fixtures.py 以固定種子產生的頁面，
+可設定延遲、錯誤率與 429 限流，讓爬蟲併發與限速行為可以離線重現
+
+提供的端點:
+    GET  /nas/t21/<market>/t21sc03_<年>_<月>[_<0|1>].html   每月營收 (big5)
+    POST /mops/web/ajax_t163sb05                             資產負債表
+    POST /mops/web/ajax_t21sc04_ifrs                         每月營收查詢
+    GET  /mops/web/t163sb05, /mops/web/t21sc04_ifrs          取得 cookies 用的頁面
+    GET  .../t187ap05_L|P|O|R                                OpenAPI 每月營業收入彙總表 (JSON)
+    GET  /mops/                                              query6_1 查詢頁面 (Selenium 用)
+    POST /mops/api/query6_1                                  query6_1 查詢結果 (JSON)
+    GET  /_stats                                             各端點請求次數與狀態碼
+
+Usage:
+    python benchmarks/fake_mops_server.py --port 8800 --latency 0.1 --jitter 0.05 \\
+        --error-rate 0.02 --rate 5 --burst 10
+
+    # 讓爬蟲改連到模擬伺服器
+    export MOPS_BASE_URL=http://127.0.0.1:8800
+    export MOPSOV_BASE_URL=http://127.0.0.1:8800
+    export TWSE_API_BASE=http://127.0.0.1:8800/v1
+    export TPEX_API_BASE=http://127.0.0.1:8800/openapi/v1
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures  # noqa: E402
+
+T21SC03_RE = re.compile(r"^/nas/t21/(\w+)/t21sc03_(\d+)_(\d+)(?:_(\d))?\.html$")
+T187AP05_RE = re.compile(r"t187ap05_([LPOR])$")
+
+QUERY6_1_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>公開資訊觀測站 (模擬)</title></head>
+<body>
+<input type="radio" id="dataType_1" name="dataType" checked> 最近
+<input type="radio" id="dataType_2" name="dataType"> 自訂
+<input id="companyId"> <input id="year">
+<select id="month">%s</select>
+<button id="searchBtn">查詢</button>
+<div class="loadingElement" style="display:none">loading</div>
+<div id="message"></div>
+<script>
+document.getElementById('searchBtn').addEventListener('click', function () {
+  var loading = document.querySelector('.loadingElement');
+  var message = document.getElementById('message');
+  var month = document.getElementById('month');
+  loading.style.display = 'block';
+  message.innerHTML = '';
+  var body = 'companyId=' + encodeURIComponent(document.getElementById('companyId').value)
+    + '&year=' + encodeURIComponent(document.getElementById('year').value)
+    + '&month=' + encodeURIComponent(month.options[month.selectedIndex].value);
+  fetch('/mops/api/query6_1', {method: 'POST', body: body,
+        headers: {'Content-Type': 'application/x-www-form-urlencoded'}})
+    .then(function (r) { if (!r.ok) { throw new Error('HTTP ' + r.status); } return r.json(); })
+    .then(function (payload) {
+      loading.style.display = 'none';
+      if (!payload.result.result.data.length) {
+        message.innerHTML = '<div class="alert">查無資料</div>';
+        return;
+      }
+      sessionStorage.setItem('queryResultsSet', JSON.stringify(payload));
+    })
+    .catch(function (e) {
+      loading.style.display = 'none';
+      message.innerHTML = '<div class="error">' + e + '</div>';
+    });
+});
+</script>
+</body></html>""" % "".join(f'<option value="{m}">{m}月</option>' for m in range(1, 13))
+
+COOKIE_PAGE = "<html><body><form id='form1'>公開資訊觀測站 (模擬)</form></body></html>"
+
+
+def _seed(*parts):
+    """以請求參數產生穩定的亂數種子 (同一查詢每次回應相同)"""
+    return sum(ord(c) * (i + 1) for i, c in enumerate("|".join(str(p) for p in parts)))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        """
+        每個用戶端的 token bucket (超過時回應 429)
+
+        Args:
+            rate: 每秒補充的 token 數 (0: 不限流)
+            burst: bucket 容量
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def acquire(self, client):
+        """
+        嘗試取得一個 token
+
+        Returns:
+            float: 0 表示允許，否則為建議的 Retry-After 秒數
+        """
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[client] = (tokens - 1, now)
+                return 0
+            self._buckets[client] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+
+class FakeMOPSConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate=0.0, burst=10,
+                 empty_rate=0.2, companies=900, statement_rows=1000, seed=0):
+        """
+        模擬伺服器設定
+
+        Args:
+            latency: 每個回應的基本延遲秒數
+            jitter: 額外隨機延遲上限 (秒)
+            error_rate: 回應 500/503 的機率
+            rate: 每個用戶端每秒允許的請求數 (0: 不限流)
+            burst: 限流 bucket 容量
+            empty_rate: query6_1 查無資料的比例
+            companies: 每月營收頁面公司數
+            statement_rows: 財報頁面列數
+            seed: 錯誤注入用的亂數種子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.empty_rate = empty_rate
+        self.companies = companies
+        self.statement_rows = statement_rows
+        self.bucket = TokenBucket(rate, burst)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = defaultdict(lambda: defaultdict(int))
+        self.stats_lock = threading.Lock()
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def count(self, route, status):
+        with self.stats_lock:
+            self.stats[route][str(status)] += 1
+
+    def snapshot(self):
+        with self.stats_lock:
+            return {route: dict(counts) for route, counts in self.stats.items()}
+
+
+@lru_cache(maxsize=256)
+def revenue_page(market, year, month, data_type, companies):
+    """t21sc03 頁面 (有錄製檔時使用錄製檔)"""
+    content, _ = fixtures.load_recorded(
+        f"t21sc03_{market}.html",
+        lambda: fixtures.make_revenue_page(companies, seed=_seed(market, year, month, data_type)).encode("big5"),
+    )
+    return content
+
+
+@lru_cache(maxsize=64)
+def statement_page(typek, year, season, rows):
+    return fixtures.make_statement_page(rows, seed=_seed(typek, year, season)).encode("utf-8")
+
+
+@lru_cache(maxsize=64)
+def t21sc04_page(typek, year, month, companies):
+    content, _ = fixtures.load_recorded(
+        f"t21sc04_{typek}.html",
+        lambda: fixtures.make_t21sc04_page(companies, seed=_seed(typek, year, month)),
+        mode="r",
+    )
+    return content.encode("utf-8")
+
+
+@lru_cache(maxsize=16)
+def t187ap05_json(category, companies):
+    return json.dumps(fixtures.make_t187ap05_records(companies, seed=_seed(category)),
+                      ensure_ascii=False).encode("utf-8")
+
+
+class FakeMOPSHandler(BaseHTTPRequestHandler):
+    config = FakeMOPSConfig()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, route, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+        self.config.count(route, status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _read_form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8", errors="ignore") if length else ""
+        return {k: v[0] for k, v in parse_qs(raw).items()}
+
+    def _route(self, path):
+        """對應到統計用的路由名稱"""
+        if T21SC03_RE.match(path):
+            return "t21sc03"
+        match = T187AP05_RE.search(path)
+        if match:
+            return f"t187ap05_{match.group(1)}"
+        return path
+
+    def _handle(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        route = self._route(path)
+        # 先讀完 POST 內容，限流或錯誤回應後連線才能繼續重用
+        form = self._read_form() if self.command == "POST" else {}
+
+        if path == "/_stats":
+            body = json.dumps(self.config.snapshot(), ensure_ascii=False, indent=2).encode("utf-8")
+            return self._send(route, 200, body, "application/json; charset=utf-8")
+
+        # 限流
+        retry_after = self.config.bucket.acquire(self.client_address[0])
+        if retry_after:
+            return self._send(route, 429, b"Too Many Requests",
+                              headers={"Retry-After": str(max(1, round(retry_after)))})
+
+        # 延遲
+        delay = self.config.latency + self.config.jitter * self.config.random()
+        if delay > 0:
+            time.sleep(delay)
+
+        # 錯誤注入
+        if self.config.error_rate and self.config.random() < self.config.error_rate:
+            return self._send(route, 503 if self.config.random() < 0.5 else 500, b"Server Error")
+
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        params = {**query, **form}
+
+        match = T21SC03_RE.match(path)
+        if match:
+            market, year, month, data_type = match.groups()
+            body = revenue_page(market, int(year), int(month), data_type, self.config.companies)
+            return self._send(route, 200, body, "text/html; charset=big5")
+
+        if path.endswith("/ajax_t163sb05"):
+            body = statement_page(params.get("TYPEK", "sii"), params.get("year", ""),
+                                  params.get("season", ""), self.config.statement_rows)
+            return self._send(route, 200, body)
+
+        if path.endswith("/ajax_t21sc04_ifrs"):
+            body = t21sc04_page(params.get("TYPEK", "sii"), params.get("year", ""),
+                                params.get("month", ""), self.config.companies)
+            return self._send(route, 200, body)
+
+        if path in ("/mops/web/t163sb05", "/mops/web/t21sc04_ifrs"):
+            return self._send(route, 200, COOKIE_PAGE.encode("utf-8"),
+                              headers={"Set-Cookie": "jcsession=fake; Path=/"})
+
+        match = T187AP05_RE.search(path)
+        if match:
+            body = t187ap05_json(match.group(1), self.config.companies)
+            return self._send(route, 200, body, "application/json; charset=utf-8")
+
+        if path == "/mops/api/query6_1":
+            company_code = params.get("companyId", "")
+            year, month = params.get("year", "0"), params.get("month", "1")
+            seed = _seed(company_code, year, month)
+            rows = 0 if random.Random(seed).random() < self.config.empty_rate else 1 + seed % 20
+            body = fixtures.make_query6_1_payload(
+                rows, seed=seed, company_code=company_code,
+                year=int(year or 0), month=int(month or 1)).encode("utf-8")
+            return self._send(route, 200, body, "application/json; charset=utf-8")
+
+        if path in ("/mops", "/mops/"):
+            return self._send(route, 200, QUERY6_1_PAGE.encode("utf-8"))
+
+        return self._send(route, 404, b"Not Found")
+
+    do_GET = _handle
+    do_POST = _handle
+    do_HEAD = _handle
+
+
+def start_server(port=8800, host="127.0.0.1", config=None):
+    """
+    在背景執行緒啟動模擬伺服器 (供效能測試程式直接使用)
+
+    Args:
+        port: 連接埠 (0: 自動選擇)
+        host: 綁定位址
+        config: FakeMOPSConfig
+
+    Returns:
+        ThreadingHTTPServer: 伺服器實例 (server.server_address 為實際位址)
+    """
+    handler = type("Handler", (FakeMOPSHandler,), {"config": config or FakeMOPSConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local MOPS/TWSE stand-in server for crawler load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="base response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay upper bound in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 500/503 response")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second per client before 429 (0: off)")
+    parser.add_argument("--burst", type=int, default=10, help="token bucket size for --rate")
+    parser.add_argument("--empty-rate", type=float, default=0.2, help="share of query6_1 lookups with no data")
+    parser.add_argument("--companies", type=int, default=900, help="companies per monthly revenue page")
+    parser.add_argument("--statement-rows", type=int, default=1000, help="rows per statement page")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = FakeMOPSConfig(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate=args.rate, burst=args.burst, empty_rate=args.empty_rate,
+        companies=args.companies, statement_rows=args.statement_rows, seed=args.seed,
+    )
+    server = start_server(args.port, args.host, config)
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"✓ 模擬 MOPS 伺服器: {base}")
+    print(f"  export MOPS_BASE_URL={base}")
+    print(f"  export MOPSOV_BASE_URL={base}")
+    print(f"  export TWSE_API_BASE={base}/v1")
+    print(f"  export TPEX_API_BASE={base}/openapi/v1")
+    print("  Ctrl+C 結束\n")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n請求統計:")
+        print(json.dumps(config.snapshot(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+效能測試用 MOPS 頁面樣本
+已存檔的頁面直接讀取，fixtures/ 目錄中有錄製的回應時優先使用，
+其餘以固定亂數種子產生與 MOPS 結構相同的頁面
+
+錄製 t21sc03 頁面:
+    python benchmarks/fixtures.py --record-t21sc03 sii 113 1
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# 已提交的 MOPS 頁面
+SAVED_PAGES = {
+    "mops_page": os.path.join(ROOT_DIR, "1204_mops", "mops_page.html"),
+    "mops_playwright": os.path.join(ROOT_DIR, "1204_mops", "mops_playwright.html"),
+}
+
+# 資產負債表 (t163sb05) 結果頁面欄位
+STATEMENT_COLUMNS = [
+    "現金及約當現金", "透過損益按公允價值衡量之金融資產－流動", "應收帳款淨額", "存貨",
+    "流動資產", "不動產、廠房及設備", "使用權資產", "無形資產", "非流動資產", "資產總額",
+    "短期借款", "應付帳款", "流動負債", "長期借款", "非流動負債", "負債總額",
+    "股本", "資本公積", "保留盈餘", "權益總額",
+]
+
+
+def read_saved_page(name):
+    """讀取已提交的 MOPS 頁面"""
+    with open(SAVED_PAGES[name], encoding="utf-8") as f:
+        return f.read()
+
+
+def make_statement_page(rows=2000, seed=0):
+    """
+    產生與 MOPS 財報結果頁面結構相同的 HTML
+
+    頁面包含導覽用表格 (無公司代號欄位) 與一個結果表格，
+    模擬 driver.page_source 中大量無關表格的情況
+
+    Args:
+        rows: 結果表格列數
+        seed: 亂數種子
+
+    Returns:
+        str: HTML 內容
+    """
+    rng = random.Random(seed)
+    parts = ["<html><head><meta charset='utf-8'><title>公開資訊觀測站</title></head><body>"]
+
+    # 導覽與查詢條件表格
+    for t in range(12):
+        parts.append("<table class='nav'><tr><th>項目</th><th>說明</th></tr>")
+        for i in range(30):
+            parts.append(f"<tr><td>選單 {t}-{i}</td><td><a href='#'>連結 {i}</a></td></tr>")
+        parts.append("</table>")
+
+    header = "".join(f"<th>{c}</th>" for c in ["公司代號", "公司名稱"] + STATEMENT_COLUMNS)
+    parts.append(f"<table class='hasBorder'><thead><tr>{header}</tr></thead><tbody>")
+    for i in range(rows):
+        code = str(1101 + i)
+        cells = [f"<td>{code}</td>", f"<td>公司{code}</td>"]
+        for _ in STATEMENT_COLUMNS:
+            cells.append(f"<td>{rng.randint(-10**6, 10**9):,}</td>")
+        parts.append("<tr>" + "".join(cells) + "</tr>")
+    parts.append("</tbody></table></body></html>")
+    return "".join(parts)
+
+
+# 每月營收 (t21sc03) 產業別表格欄位
+REVENUE_SUB_COLUMNS = ["當月營收", "上月營收", "去年當月營收", "上月比較 增減(%)", "去年同月 增減(%)"]
+CUMULATIVE_SUB_COLUMNS = ["當月累計營收", "去年累計營收", "前期比較 增減(%)"]
+
+
+def make_revenue_page(companies=900, industries=30, seed=0):
+    """
+    產生與 t21sc03 每月營收頁面結構相同的 HTML (每個產業別一個兩層表頭表格)
+
+    Args:
+        companies: 公司數
+        industries: 產業別數
+        seed: 亂數種子
+
+    Returns:
+        str: HTML 內容
+    """
+    rng = random.Random(seed)
+    parts = ["<html><head><meta http-equiv='Content-Type' content='text/html; charset=big5'></head><body>"]
+    per_industry = max(1, companies // industries)
+    code = 1101
+
+    for industry in range(industries):
+        parts.append(f"<table><tr><th align=left class='tt'>產業別：產業{industry}</th></tr></table>")
+        parts.append("<table class='hasBorder'>")
+        parts.append("<tr><th rowspan=2>公司 代號</th><th rowspan=2>公司名稱</th>"
+                     f"<th colspan={len(REVENUE_SUB_COLUMNS)}>營業收入</th>"
+                     f"<th colspan={len(CUMULATIVE_SUB_COLUMNS)}>累計營業收入</th>"
+                     "<th rowspan=2>備註</th></tr>")
+        parts.append("<tr>" + "".join(f"<th>{c}</th>" for c in REVENUE_SUB_COLUMNS + CUMULATIVE_SUB_COLUMNS) + "</tr>")
+        for _ in range(per_industry):
+            current = rng.randint(1000, 10**8)
+            last_month = rng.randint(1000, 10**8)
+            last_year = rng.randint(1000, 10**8)
+            cumulative = current * rng.randint(1, 12)
+            cumulative_last = last_year * rng.randint(1, 12)
+            values = [
+                f"{current:,}", f"{last_month:,}", f"{last_year:,}",
+                f"{(current - last_month) / last_month * 100:.2f}",
+                f"{(current - last_year) / last_year * 100:.2f}",
+                f"{cumulative:,}", f"{cumulative_last:,}",
+                f"{(cumulative - cumulative_last) / cumulative_last * 100:.2f}",
+            ]
+            parts.append(f"<tr><td>{code}</td><td>公司{code}</td>"
+                         + "".join(f"<td align=right>{v}</td>" for v in values)
+                         + "<td>-</td></tr>")
+            code += 1
+        parts.append("<tr><th colspan=2>合計</th>" + "<td>0</td>" * 8 + "<td></td></tr>")
+        parts.append("</table>")
+
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+# ajax_t21sc04_ifrs 每月營收查詢結果欄位 (fetch_monthly_revenue.py)
+T21SC04_COLUMNS = ["公司代號", "公司名稱", "當月營收", "去年同月營收", "增減百分比",
+                   "本年累計營收", "去年累計營收", "累計增減百分比"]
+
+
+def make_t21sc04_page(companies=900, seed=0):
+    """
+    產生與 ajax_t21sc04_ifrs 回應結構相同的 HTML (單層表頭，最後一列為合計)
+
+    Args:
+        companies: 公司數
+        seed: 亂數種子
+
+    Returns:
+        str: HTML 內容
+    """
+    rng = random.Random(seed)
+    parts = ["<html><body><table class='hasBorder'><tr>"]
+    parts.append("".join(f"<th>{c}</th>" for c in T21SC04_COLUMNS) + "</tr>")
+    for i in range(companies):
+        code = 1101 + i
+        current, last_year = rng.randint(1000, 10**8), rng.randint(1000, 10**8)
+        cumulative, cumulative_last = current * rng.randint(1, 12), last_year * rng.randint(1, 12)
+        values = [
+            f"{current:,}", f"{last_year:,}", f"{(current - last_year) / last_year * 100:.2f}",
+            f"{cumulative:,}", f"{cumulative_last:,}",
+            f"{(cumulative - cumulative_last) / cumulative_last * 100:.2f}",
+        ]
+        parts.append(f"<tr><td>{code}</td><td>公司{code}</td>"
+                     + "".join(f"<td align=right>{v}</td>" for v in values) + "</tr>")
+    parts.append("<tr><td>合計</td><td></td>" + "<td>0</td>" * 6 + "</tr>")
+    parts.append("</table></body></html>")
+    return "".join(parts)
+
+
+def make_t187ap05_records(companies=900, year=113, month=1, seed=0):
+    """
+    產生與 OpenAPI t187ap05_* (每月營業收入彙總表) 相同欄位的 JSON 資料
+
+    Args:
+        companies: 公司數
+        year: 民國年度
+        month: 月份
+        seed: 亂數種子
+
+    Returns:
+        list: 資料字典列表 (數值皆為字串，與 OpenAPI 相同)
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(companies):
+        code = str(1101 + i)
+        current, last_month, last_year = (rng.randint(1000, 10**8) for _ in range(3))
+        cumulative, cumulative_last = current * month, last_year * month
+        records.append({
+            "出表日期": f"{year}{month + 1 if month < 12 else 1:02d}10",
+            "資料年月": f"{year}{month:02d}",
+            "公司代號": code,
+            "公司名稱": f"公司{code}",
+            "產業別": f"產業{i % 30}",
+            "營業收入-當月營收": str(current),
+            "營業收入-上月營收": str(last_month),
+            "營業收入-去年當月營收": str(last_year),
+            "營業收入-上月比較增減(%)": f"{(current - last_month) / last_month * 100:.2f}",
+            "營業收入-去年同月增減(%)": f"{(current - last_year) / last_year * 100:.2f}",
+            "累計營業收入-當月累計營收": str(cumulative),
+            "累計營業收入-去年累計營收": str(cumulative_last),
+            "累計營業收入-前期比較增減(%)": f"{(cumulative - cumulative_last) / cumulative_last * 100:.2f}",
+            "備註": "-",
+        })
+    return records
+
+
+# 內部人持股異動 (query6_1) 查詢結果欄位
+QUERY6_1_TITLES = [
+    {"main": "申報日期"},
+    {"main": "身分別"},
+    {"main": "姓名"},
+    {"main": "預定轉讓方式及股數", "sub": [{"main": "轉讓方式"}, {"main": "股數"}]},
+    {"main": "受讓人"},
+    {"main": "目前持有股數", "sub": [{"main": "自有持股"}, {"main": "保留運用決定權信託股數"}]},
+    {"main": "預定轉讓總股數", "sub": [{"main": "自有持股"}, {"main": "保留運用決定權信託股數"}]},
+    {"main": "預定轉讓期間"},
+]
+
+
+def make_query6_1_payload(rows=200, seed=0, company_code="2330", year=113, month=1):
+    """
+    產生與 query6_1 sessionStorage queryResultsSet 結構相同的 JSON 字串
+
+    Args:
+        rows: 明細筆數
+        seed: 亂數種子
+        company_code: 公司代號
+        year: 民國年度
+        month: 月份
+
+    Returns:
+        str: JSON 字串
+    """
+    rng = random.Random(seed)
+    data = []
+    for i in range(rows):
+        day = rng.randint(1, 28)
+        data.append([
+            f"{year}/{month:02d}/{day:02d}", rng.choice(["董事本人", "經理人本人", "大股東本人"]),
+            f"姓名{i}", rng.choice(["一般交易", "贈與", "信託"]), f"{rng.randint(1, 500) * 1000:,}",
+            "-", f"{rng.randint(1, 10**7):,}", "0", f"{rng.randint(1, 10**6):,}", "0",
+            f"{year}/{month:02d}/{day:02d}~{year}/{month:02d}/28",
+        ])
+    return json.dumps({
+        "result": {
+            "result": {
+                "data": data,
+                "titles": QUERY6_1_TITLES,
+                "year": str(year),
+                "month": str(month),
+                "marketName": "上市",
+                "companyAbbreviation": f"公司{company_code}",
+            }
+        }
+    }, ensure_ascii=False)
+
+
+def make_finmind_frame(quarters=40, items=120, stock_id="2330", seed=0):
+    """
+    產生與 FinMind TaiwanStockBalanceSheet 相同的長格式 DataFrame
+
+    Args:
+        quarters: 季數
+        items: 每季財務項目數
+        stock_id: 股票代碼
+        seed: 亂數種子
+
+    Returns:
+        pd.DataFrame: 欄位 date / stock_id / type / value / origin_name
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    rows = []
+    for q in range(quarters):
+        year = 2013 + q // 4
+        month = (q % 4) * 3 + 3
+        date = f"{year}-{month:02d}-{28 if month != 3 else 31}"
+        for i in range(items):
+            rows.append({
+                "date": date,
+                "stock_id": stock_id,
+                "type": f"Item{i}",
+                "value": float(rng.randint(-10**6, 10**9)),
+                "origin_name": f"項目{i}",
+            })
+    return pd.DataFrame(rows)
+
+
+def make_revenue_records(count=5000, year=113, month=1, seed=0):
+    """
+    產生每月營收文件 (供 MongoDB 批次寫入測試)
+
+    Args:
+        count: 筆數
+        year: 年度
+        month: 月份
+        seed: 亂數種子
+
+    Returns:
+        list: 資料字典列表
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "公司代號": str(1101 + i),
+            "公司名稱": f"公司{1101 + i}",
+            "年度": year,
+            "月份": month,
+            "市場別": "sii",
+            "營業收入_當月營收": float(rng.randint(1000, 10**8)),
+            "營業收入_上月營收": float(rng.randint(1000, 10**8)),
+            "營業收入_去年當月營收": float(rng.randint(1000, 10**8)),
+            "累計營業收入_當月累計營收": float(rng.randint(1000, 10**9)),
+        }
+        for i in range(count)
+    ]
+
+
+def fixture_path(name):
+    """錄製回應的路徑"""
+    return os.path.join(FIXTURE_DIR, name)
+
+
+def load_recorded(name, maker, mode="rb"):
+    """
+    讀取錄製的回應，沒有錄製檔時改用產生器
+
+    Args:
+        name: fixtures/ 下的檔名
+        maker: 無錄製檔時呼叫的產生函式
+        mode: 讀取模式
+
+    Returns:
+        tuple: (內容, 來源 "recorded" 或 "synthetic")
+    """
+    path = fixture_path(name)
+    if os.path.exists(path):
+        with open(path, mode) as f:
+            return f.read(), "recorded"
+    return maker(), "synthetic"
+
+
+def record_t21sc03(market_type, year, month):
+    """
+    下載 t21sc03 每月營收頁面並存入 fixtures/ (原始 big5 位元組)
+
+    Args:
+        market_type: 市場別 (sii / otc)
+        year: 民國年度
+        month: 月份
+
+    Returns:
+        str: 檔案路徑
+    """
+    import requests
+
+    # 民國 100 年起分國內 (_0) / 國外 (_1)
+    suffix = "_0" if year >= 100 else ""
+    url = f"https://mopsov.twse.com.tw/nas/t21/{market_type}/t21sc03_{year}_{month}{suffix}.html"
+    response = requests.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0"})
+    response.raise_for_status()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = fixture_path(f"t21sc03_{market_type}.html")
+    with open(path, "wb") as f:
+        f.write(response.content)
+    print(f"✓ 已錄製 {url} -> {path} ({len(response.content):,} bytes)")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record MOPS responses for offline benchmarks.")
+    parser.add_argument("--record-t21sc03", nargs=3, metavar=("MARKET", "YEAR", "MONTH"),
+                        help="download a t21sc03 monthly revenue page into benchmarks/fixtures/")
+    parser.add_argument("--record-query6-1", metavar="JSON_FILE",
+                        help="store a queryResultsSet JSON copied from the browser as fixtures/query6_1.json")
+    args = parser.parse_args()
+
+    if args.record_t21sc03:
+        market_type, year, month = args.record_t21sc03
+        record_t21sc03(market_type, int(year), int(month))
+    elif args.record_query6_1:
+        with open(args.record_query6_1, encoding="utf-8") as f:
+            payload = json.load(f)
+        os.makedirs(FIXTURE_DIR, exist_ok=True)
+        with open(fixture_path("query6_1.json"), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        print(f"✓ 已儲存 {fixture_path('query6_1.json')}")
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+離線效能測試：解析器與 MongoDB 批次寫入
+使用已存檔 / 錄製 / 固定種子產生的 MOPS 回應，不需連線到 MOPS
+
+測試項目:
+    statement_parse      StatementScraper.parse_all_companies_from_table
+    revenue_parse        MonthlyRevenueScraper._parse_revenue_table
+    fetch_parse_table    fetch_monthly_revenue.parse_table (含 BeautifulSoup 解析)
+    fetch_parse_html     fetch_monthly_revenue.parse_html (預設後端: selectolax > lxml > bs4)
+    query6_1_parse       Query61Scraper.parse_query_results + parse_titles_to_columns
+    finmind_convert      FinMindScraper._convert_df_to_records (需安裝 FinMind)
+    bulk_upsert          mongodb_helper.bulk_upsert (mongomock 或 --mongo-uri)
+    existing_keys        mongodb_helper.find_existing_keys
+    query6_1_save        Query61Scraper.save_to_mongodb
+
+Usage:
+    python benchmarks/run_benchmarks.py --json bench.json
+    python benchmarks/run_benchmarks.py --only revenue_parse,bulk_upsert --repeat 10
+    python benchmarks/run_benchmarks.py --mongo-uri mongodb://localhost:27017/
+    python benchmarks/run_benchmarks.py --baseline bench.json --threshold 0.25   # 回歸時 exit 1
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import platform
+import argparse
+import statistics
+import subprocess
+import importlib.util
+from contextlib import redirect_stdout
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "TW_Stock"))
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures  # noqa: E402
+
+BENCH_DB = "TW_Stock_bench"
+
+
+class SkipBenchmark(Exception):
+    """測試項目缺少相依套件或資料時略過"""
+
+
+def load_module(name, relative_path):
+    """
+    以檔案路徑載入模組
+    (1204_mops 與 TW_Stock 有同名模組，模組所在目錄加在 sys.path 最後，同名時仍優先使用 TW_Stock 的模組；
+    模組本身的相依模組 (例如 fetch_monthly_revenue 的 revenue_coverage) 由該目錄載入)
+
+    Args:
+        name: 模組名稱
+        relative_path: 相對於專案根目錄的路徑
+
+    Returns:
+        module: 載入的模組
+    """
+    path = os.path.join(ROOT_DIR, relative_path)
+    module_dir = os.path.dirname(path)
+    if module_dir not in sys.path:
+        sys.path.append(module_dir)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def get_database(mongo_uri):
+    """
+    取得測試用資料庫 (指定 --mongo-uri 時使用本機 mongod，否則使用 mongomock)
+
+    Returns:
+        tuple: (資料庫, 後端名稱)
+    """
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+        client.drop_database(BENCH_DB)
+        return client[BENCH_DB], "mongod"
+    try:
+        import mongomock
+    except ImportError:
+        raise SkipBenchmark("未安裝 mongomock 且未指定 --mongo-uri")
+    return mongomock.MongoClient()[BENCH_DB], "mongomock"
+
+
+# ---------------------------------------------------------------------------
+# 測試項目：每個函式返回 (setup 後的可重複呼叫函式, 每次處理的項目數, 資料來源)
+# ---------------------------------------------------------------------------
+
+def bench_statement_parse(args):
+    from statement_scraper import StatementScraper, STATEMENTS
+
+    html_content = fixtures.make_statement_page(args.rows)
+    scraper = StatementScraper.__new__(StatementScraper)
+    scraper.descriptor = STATEMENTS["balance_sheet"]
+    scraper.valid_company_codes = {str(1101 + i) for i in range(args.rows)}
+
+    def run():
+        return len(scraper.parse_all_companies_from_table(html_content, 113, 1))
+
+    return run, args.rows, "synthetic"
+
+
+def bench_statement_parse_saved(args):
+    from statement_scraper import StatementScraper, STATEMENTS
+
+    html_content = fixtures.read_saved_page("mops_page")
+    scraper = StatementScraper.__new__(StatementScraper)
+    scraper.descriptor = STATEMENTS["balance_sheet"]
+    scraper.valid_company_codes = None
+    scraper._get_valid_company_codes = lambda: set()
+
+    def run():
+        return len(scraper.parse_all_companies_from_table(html_content, 113, 1))
+
+    return run, 1, "saved:1204_mops/mops_page.html"
+
+
+def _revenue_page(args):
+    content, source = fixtures.load_recorded(
+        "t21sc03_sii.html",
+        lambda: fixtures.make_revenue_page(args.companies).encode("big5"),
+    )
+    return content.decode("big5", errors="ignore"), source
+
+
+def bench_revenue_parse(args):
+    from monthly_revenue_scraper import MonthlyRevenueScraper, parse_revenue_table
+
+    html_content, source = _revenue_page(args)
+    db, _ = get_database(args.mongo_uri)
+    scraper = MonthlyRevenueScraper.__new__(MonthlyRevenueScraper)
+    scraper.revenue_collection = db["每月營收"]
+    items = len(parse_revenue_table(html_content, 113, 1, "sii"))
+    scraper.valid_company_codes = {str(1101 + i) for i in range(max(items, args.companies) * 2)}
+
+    def run():
+        with redirect_stdout(open(os.devnull, "w")):
+            return len(scraper._parse_revenue_table(html_content, 113, 1, "sii"))
+
+    return run, items, source
+
+
+def bench_fetch_parse_table(args):
+    fetch_monthly_revenue = load_module("fetch_monthly_revenue", "1126_pythonAPI/python/fetch_monthly_revenue.py")
+    from bs4 import BeautifulSoup
+
+    html_content, source = fixtures.load_recorded(
+        "t21sc04_sii.html", lambda: fixtures.make_t21sc04_page(args.companies), mode="r")
+    meta = {"year": 2024, "month": 1, "market": "sii"}
+
+    def run():
+        soup = BeautifulSoup(html_content, "html.parser")
+        count = 0
+        for table in soup.find_all("table"):
+            count += len(fetch_monthly_revenue.parse_table(table, meta))
+        return count
+
+    return run, run(), source
+
+
+def bench_fetch_parse_html(args):
+    fetch_monthly_revenue = load_module("fetch_monthly_revenue", "1126_pythonAPI/python/fetch_monthly_revenue.py")
+
+    html_content, source = fixtures.load_recorded(
+        "t21sc04_sii.html", lambda: fixtures.make_t21sc04_page(args.companies), mode="r")
+    meta = {"year": 2024, "month": 1, "market": "sii"}
+    backend = fetch_monthly_revenue.resolve_backend()
+
+    def run():
+        return len(fetch_monthly_revenue.parse_html(html_content, meta, backend))
+
+    return run, run(), f"{source}/{backend}"
+
+
+def bench_query6_1_parse(args):
+    from query6_1_scraper import Query61Scraper
+
+    payload, source = fixtures.load_recorded(
+        "query6_1.json", lambda: fixtures.make_query6_1_payload(args.rows // 10), mode="r")
+    scraper = Query61Scraper.__new__(Query61Scraper)
+
+    def run():
+        with redirect_stdout(open(os.devnull, "w")):
+            results = scraper.parse_query_results(payload)
+        scraper.parse_titles_to_columns(results["titles"])
+        return len(results["data"])
+
+    return run, run(), source
+
+
+def bench_finmind_convert(args):
+    try:
+        finmind_scraper = load_module("finmind_scraper", "1204_mops/finmind_scraper.py")
+    except ImportError as e:
+        raise SkipBenchmark(f"無法載入 finmind_scraper: {e}")
+    import logging
+    logging.getLogger("finmind_scraper").setLevel(logging.WARNING)
+
+    df = fixtures.make_finmind_frame()
+    scraper = finmind_scraper.FinMindScraper.__new__(finmind_scraper.FinMindScraper)
+
+    def run():
+        return len(scraper._convert_df_to_records(df, "2330"))
+
+    return run, len(df), "synthetic"
+
+
+def bench_bulk_upsert(args):
+    from mongodb_helper import bulk_upsert
+    from monthly_revenue_scraper import REVENUE_KEY_FIELDS
+
+    db, backend = get_database(args.mongo_uri)
+    collection = db["每月營收"]
+    collection.create_index([(f, 1) for f in REVENUE_KEY_FIELDS], unique=True)
+    records = fixtures.make_revenue_records(args.records)
+
+    def run():
+        # 每次寫入新的月份，測試插入而非更新
+        run.month += 1
+        for r in records:
+            r["月份"] = run.month
+        return bulk_upsert(collection, records, REVENUE_KEY_FIELDS)
+    run.month = 0
+
+    return run, len(records), backend
+
+
+def bench_existing_keys(args):
+    from mongodb_helper import bulk_upsert, find_existing_keys
+    from monthly_revenue_scraper import REVENUE_KEY_FIELDS
+
+    db, backend = get_database(args.mongo_uri)
+    collection = db["每月營收_existing"]
+    collection.create_index([(f, 1) for f in REVENUE_KEY_FIELDS], unique=True)
+    records = fixtures.make_revenue_records(args.records)
+    bulk_upsert(collection, records[::2], REVENUE_KEY_FIELDS)
+
+    def run():
+        return len(find_existing_keys(collection, REVENUE_KEY_FIELDS, records))
+
+    return run, len(records), backend
+
+
+def bench_query6_1_save(args):
+    from query6_1_scraper import Query61Scraper
+    from insider_buckets import TitleSchemaCache
+    from stage_spans import SpanRecorder
+
+    db, backend = get_database(args.mongo_uri)
+    payload, source = fixtures.load_recorded(
+        "query6_1.json", lambda: fixtures.make_query6_1_payload(args.rows // 10), mode="r")
+    scraper = Query61Scraper.__new__(Query61Scraper)
+    scraper.spans = SpanRecorder(None)
+    scraper.storage = "rows"
+    scraper.bucket_store = None
+    scraper.title_schemas = TitleSchemaCache()
+    with redirect_stdout(open(os.devnull, "w")):
+        results = scraper.parse_query_results(payload)
+    data = {
+        "公司代號": "2330", "查詢年度": 113, "查詢月份": 1, "市場別": "上市", "公司簡稱": "公司2330",
+        "標題": results["titles"], "明細資料": results["data"],
+    }
+    mongo_helper = types.SimpleNamespace(db=db, coverage=None)
+
+    def run():
+        with redirect_stdout(open(os.devnull, "w")):
+            scraper.save_to_mongodb(mongo_helper, data)
+        return len(data["明細資料"])
+
+    return run, len(data["明細資料"]), f"{source}/{backend}"
+
+
+BENCHMARKS = {
+    "statement_parse": bench_statement_parse,
+    "statement_parse_saved": bench_statement_parse_saved,
+    "revenue_parse": bench_revenue_parse,
+    "fetch_parse_table": bench_fetch_parse_table,
+    "fetch_parse_html": bench_fetch_parse_html,
+    "query6_1_parse": bench_query6_1_parse,
+    "finmind_convert": bench_finmind_convert,
+    "bulk_upsert": bench_bulk_upsert,
+    "existing_keys": bench_existing_keys,
+    "query6_1_save": bench_query6_1_save,
+}
+
+
+def measure(run, repeat, warmup=1):
+    """
+    執行多次並返回各次耗時 (秒)
+
+    Args:
+        run: 測試函式
+        repeat: 執行次數
+        warmup: 不計入結果的暖身次數
+    """
+    with redirect_stdout(open(os.devnull, "w")):
+        for _ in range(warmup):
+            run()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def git_revision():
+    """取得目前的 git commit (非 git 目錄時返回 None)"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    與基準結果比較中位數耗時
+
+    Returns:
+        list: 變慢超過門檻的項目名稱
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+
+    regressions = []
+    print(f"\n與基準比較 ({baseline_path}, 門檻 +{threshold:.0%})")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "median" not in base or "median" not in result:
+            continue
+        change = result["median"] / base["median"] - 1 if base["median"] else 0.0
+        mark = "✗" if change > threshold else "✓"
+        print(f"  {mark} {name:<24} {base['median']*1000:9.2f} ms -> {result['median']*1000:9.2f} ms ({change:+.1%})")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline parser and MongoDB write benchmarks.")
+    parser.add_argument("--only", help="comma separated benchmark names (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per benchmark")
+    parser.add_argument("--rows", type=int, default=2000, help="rows in the synthetic statement page")
+    parser.add_argument("--companies", type=int, default=900, help="companies in the synthetic t21sc03 page")
+    parser.add_argument("--records", type=int,
+                        help="documents per bulk write (default: 5000 with --mongo-uri, 500 with mongomock)")
+    parser.add_argument("--mongo-uri", help="benchmark writes against this mongod instead of mongomock")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare medians against a previous --json result")
+    parser.add_argument("--require-recorded", action="store_true",
+                        help="skip benchmarks that would run on synthetic pages instead of benchmarks/fixtures/")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed median slowdown before failing (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.records is None:
+        # mongomock 的 upsert 為線性搜尋，筆數過多時只是在測 mongomock 本身
+        args.records = 5000 if args.mongo_uri else 500
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(BENCHMARKS)
+
+    results = {}
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"✗ 未知的測試項目: {name}")
+            sys.exit(2)
+        try:
+            with redirect_stdout(open(os.devnull, "w")):
+                run, items, source = BENCHMARKS[name](args)
+            if args.require_recorded and source.startswith("synthetic"):
+                raise SkipBenchmark("沒有錄製的回應 (benchmarks/fixtures/)")
+            timings = measure(run, args.repeat)
+        except SkipBenchmark as e:
+            results[name] = {"skipped": str(e)}
+            print(f"⊙ {name:<24} 略過: {e}")
+            continue
+        except ImportError as e:
+            # 單一項目的相依模組無法載入時只略過該項目，其餘項目照常執行並寫出 JSON
+            results[name] = {"skipped": f"無法載入模組: {e}"}
+            print(f"⊙ {name:<24} 略過: 無法載入模組: {e}")
+            continue
+
+        median = statistics.median(timings)
+        results[name] = {
+            "best": min(timings),
+            "median": median,
+            "mean": statistics.mean(timings),
+            "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            "repeat": len(timings),
+            "items": items,
+            "items_per_second": items / median if median else None,
+            "source": source,
+        }
+        print(f"✓ {name:<24} median {median*1000:9.2f} ms | best {min(timings)*1000:9.2f} ms | "
+              f"{items} items | {source}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongo_backend": "mongod" if args.mongo_uri else "mongomock",
+            "params": {"rows": args.rows, "companies": args.companies, "records": args.records},
+        },
+        "results": results,
+    }
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ 結果已寫入 {args.json}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ 效能回歸: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
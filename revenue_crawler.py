@@ -14,6 +14,7 @@ from __future__ import annotations
 
 import argparse
 import logging
+import os
 import ssl
 import urllib3
 from typing import Dict, List
@@ -26,9 +27,9 @@ from pymongo.collection import Collection
 ssl._create_default_https_context = ssl._create_unverified_context
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# TWSE and TPEx OpenAPI base URLs
-TWSE_API_BASE = "https://openapi.twse.com.tw/v1"
-TPEX_API_BASE = "https://www.tpex.org.tw/openapi/v1"
+# TWSE and TPEx OpenAPI base URLs (overridable to point at a local stand-in server)
+TWSE_API_BASE = os.getenv("TWSE_API_BASE", "https://openapi.twse.com.tw/v1").rstrip("/")
+TPEX_API_BASE = os.getenv("TPEX_API_BASE", "https://www.tpex.org.tw/openapi/v1").rstrip("/")
 
 # Revenue endpoints
 REVENUE_ENDPOINTS = {
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 測試直接匯入各目錄中的腳本模組
+for path in ("TW_Stock", os.path.join("1126_pythonAPI", "python"), "benchmarks"):
+    sys.path.insert(0, os.path.join(ROOT_DIR, path))
@@ -0,0 +1,97 @@
+import mongomock
+import numpy as np
+import pytest
+from bson.int64 import Int64
+
+import coverage_index
+from coverage_index import CoverageIndex, CoverageMatrix, DATASETS
+from mongodb_helper import bulk_upsert
+
+
+class RecordingCollection:
+    """只記錄 bulk_write 的操作 (mongomock 不支援 $bit)"""
+
+    def __init__(self):
+        self.operations = []
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+@pytest.fixture
+def index():
+    return CoverageIndex({coverage_index.COVERAGE_COLLECTION: RecordingCollection()})
+
+
+def test_mark_builds_bit_or_per_company(index):
+    records = [
+        {"公司代號": "2330", "年度": 90, "月份": 1},    # 位元 0
+        {"公司代號": "2330", "年度": 95, "月份": 4},    # 位元 63 (字組 0 最高位元)
+        {"公司代號": "2330", "年度": 95, "月份": 5},    # 位元 64 (字組 1)
+        {"公司代號": 2317, "年度": 113, "月份": 12},
+        {"公司代號": "1101", "年度": 89, "月份": 12},   # BASE_YEAR 之前，略過
+        {"公司代號": "1102", "年度": None, "月份": 1},  # 缺欄位，略過
+    ]
+    assert index.mark("revenue", records) == 2
+
+    ops = {op._filter["_id"]: op for op in index.collection.operations}
+    assert sorted(ops) == ["revenue:2317", "revenue:2330"]
+
+    update = ops["revenue:2330"]._doc
+    assert update["$bit"] == {"位元.0": {"or": Int64(1 - (1 << 63))}, "位元.1": {"or": Int64(1)}}
+    assert update["$set"]["資料集"] == "revenue" and update["$set"]["公司代號"] == "2330"
+    assert ops["revenue:2330"]._upsert
+
+    word, bit = divmod((113 - 90) * 12 + 11, 64)
+    assert ops["revenue:2317"]._doc["$bit"] == {f"位元.{word}": {"or": Int64(1 << bit)}}
+
+
+def test_mark_batch_skips_empty_and_disabled(index):
+    assert coverage_index.mark_batch(index, "revenue", []) == 0
+    assert coverage_index.mark_batch(None, "revenue", [{"公司代號": "2330", "年度": 113, "月份": 1}]) == 0
+    assert index.collection.operations == []
+
+
+def test_matrix_has_and_missing():
+    dataset = DATASETS["balance_sheet"]
+    bits = [[False] * 8 for _ in range(2)]
+    bits[0][dataset.period_index(90, 1)] = True
+    bits[0][dataset.period_index(91, 2)] = True
+    bits[1][dataset.period_index(90, 1)] = True
+    matrix = CoverageMatrix(dataset, ["2330", "2317"], np.array(bits))
+
+    assert matrix.has("2330", 91, 2)
+    assert not matrix.has("2317", 91, 2)
+    assert not matrix.has("9999", 90, 1)
+    assert not matrix.has("2330", 120, 1)  # 超出矩陣範圍
+
+    periods = [(90, 1), (91, 2), (120, 4)]
+    assert matrix.missing(periods) == [("2330", 120, 4), ("2317", 91, 2), ("2317", 120, 4)]
+    assert matrix.missing([(90, 1)], company_codes=["2317", "9999"]) == [("9999", 90, 1)]
+    assert matrix.progress(periods) == {(90, 1): 2, (91, 2): 1, (120, 4): 0}
+
+
+def test_load_unpacks_signed_words():
+    db = mongomock.MongoClient()["TW_Stock"]
+    db[coverage_index.COVERAGE_COLLECTION].insert_one(
+        {"_id": "revenue:2330", "資料集": "revenue", "公司代號": "2330", "位元": {"0": Int64(1 - (1 << 63))}})
+    matrix = CoverageIndex(db).load("revenue", ["2330", "2317"])
+    assert matrix.has("2330", 90, 1) and matrix.has("2330", 95, 4)
+    assert not matrix.has("2330", 90, 2)
+    assert matrix.company_counts() == {"2330": 2, "2317": 0}
+
+
+def test_bulk_upsert_reports_written_records():
+    collection = mongomock.MongoClient()["TW_Stock"]["每月營收"]
+    collection.create_index("名稱", unique=True)
+    collection.insert_one({"公司代號": "1101", "年度": 113, "月份": 1, "名稱": "台泥"})
+    records = [
+        {"公司代號": "2330", "年度": 113, "月份": 1, "名稱": "台積電"},
+        {"公司代號": "2317", "年度": 113, "月份": 1, "名稱": "台泥"},  # 唯一索引衝突
+    ]
+    written = []
+    assert bulk_upsert(collection, records, ("公司代號", "年度", "月份"), written) == 1
+    assert written == [records[0]]
@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+import mongomock
+
+from empty_result_cache import EmptyPredictor, EmptyResultCache
+
+TODAY = date(2025, 1, 1)
+
+
+def make_cache():
+    return EmptyResultCache(mongomock.MongoClient()["TW_Stock"])
+
+
+def test_timeouts_never_skip():
+    cache = make_cache()
+    for _ in range(5):
+        cache.record_timeout("2330", 113, 1)
+    predictor = EmptyPredictor(cache.load(), today=TODAY)
+
+    assert not predictor.is_known_empty("2330", 113, 1)
+    assert predictor.plan(["2330"], [(113, 1)]) == (set(), set())
+    doc = cache.collection.find_one()
+    assert doc["逾時次數"] == 5 and "狀態" not in doc
+
+
+def test_confirmed_empty_is_skipped_after_close_and_kept_through_timeouts():
+    cache = make_cache()
+    cache.record_empty("2330", 113, 1)
+    cache.record_timeout("2330", 113, 1)
+    predictor = EmptyPredictor(cache.load(), today=TODAY)
+    assert predictor.is_known_empty("2330", 113, 1)
+    assert predictor.should_skip("2330", 113, 1)
+
+
+def test_legacy_timeout_status_is_not_empty():
+    entries = {("2330", 113, 1): ("timeout", 3, datetime(2024, 12, 31))}
+    assert not EmptyPredictor(entries, today=TODAY).should_skip("2330", 113, 1)
+
+
+def test_clear_removes_entry():
+    cache = make_cache()
+    cache.record_empty("2330", 113, 1)
+    cache.clear("2330", 113, 1)
+    assert cache.load() == {}
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import mongomock
+
+import financial_ratios
+
+
+def make_engine(monkeypatch, **kwargs):
+    monkeypatch.setattr(financial_ratios, "MongoClient", mongomock.MongoClient)
+    return financial_ratios.FinancialRatioEngine(**kwargs)
+
+
+def balance_sheet(code, updated):
+    return {"公司代號": code, "年度": 113, "季別": 2, "流動資產": 200.0, "流動負債": 100.0,
+            "資產總額": 500.0, "負債總額": 250.0, "更新時間": updated}
+
+
+def test_late_write_with_earlier_timestamp_is_not_skipped(monkeypatch):
+    engine = make_engine(monkeypatch, ratios=["流動比率"])
+    sheets = engine.db[financial_ratios.STATEMENT_COLLECTIONS["balance_sheet"][1]]
+    now = datetime.now()
+    sheets.insert_one(balance_sheet("2330", now - timedelta(seconds=1)))
+
+    assert engine.update() == 1
+    mark = engine.state_collection.find_one({"_id": "watermark"})["balance_sheet"]
+    assert mark <= now - financial_ratios.WATERMARK_MARGIN + timedelta(seconds=5)
+
+    # 另一個爬蟲在上次掃描前設定 更新時間，但掃描後才寫入完成
+    sheets.insert_one(balance_sheet("2317", now - timedelta(seconds=2)))
+    changed, _ = engine._changed_since_watermark()
+    assert "2317" in changed[(113, 2)]
+    assert engine.update() >= 1
+    assert engine.ratio_collection.find_one({"公司代號": "2317"})["流動比率"] is not None
+
+
+def test_watermark_does_not_move_backwards(monkeypatch):
+    engine = make_engine(monkeypatch, ratios=["流動比率"], watermark_margin=timedelta(days=1))
+    future = (datetime.now() + timedelta(hours=1)).replace(microsecond=0)
+    engine.state_collection.insert_one({"_id": "watermark", "balance_sheet": future})
+    _, marks = engine._changed_since_watermark()
+    assert marks["balance_sheet"] == future
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import mongomock
+from bson.decimal128 import Decimal128
+import pytest
+
+import migrate_collections
+from statement_schema import typed_value
+
+
+def revenue_doc(_id, stock_id, updated):
+    return {"_id": _id, "stockId": stock_id, "year": "2024", "month": "1", "營業收入": "100",
+            "更新時間": updated}
+
+
+@pytest.fixture
+def client():
+    return mongomock.MongoClient()
+
+
+def test_concurrent_write_is_not_overwritten(client, monkeypatch):
+    target = client["TW_Stock"]["每月營收"]
+    first = datetime(2024, 2, 1)
+    target.insert_many([revenue_doc(1, "2330", first), revenue_doc(2, "2317", first)])
+
+    bulk_write = target.bulk_write
+    calls = []
+
+    def racing_bulk_write(operations, **kwargs):
+        if not calls:
+            # 爬蟲在讀取後、寫回前改寫了文件 1
+            target.update_one({"_id": 1}, {"$set": {"營業收入": "200", "更新時間": datetime(2024, 2, 2)}})
+        calls.append(len(operations))
+        return bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(target, "bulk_write", racing_bulk_write)
+    stats = migrate_collections.migrate_range(target, client["TW_Stock"]["_migrations"],
+                                              migrate_collections.MIGRATIONS["revenue_keys"], 0, None, None)
+
+    assert calls == [2, 1]
+    assert stats["written"] == 2 and stats["conflicts"] == 0
+    doc = target.find_one({"_id": 1})
+    assert doc["營業收入"] == 200
+    assert doc["公司代號"] == "2330"
+    assert doc[migrate_collections.VERSION_FIELD] == 1
+
+
+def test_persistent_conflict_is_left_for_next_run(client, monkeypatch):
+    target = client["TW_Stock"]["每月營收"]
+    target.insert_one(revenue_doc(1, "2330", datetime(2024, 2, 1)))
+    bulk_write = target.bulk_write
+    ticks = iter(range(1, 100))
+
+    def racing_bulk_write(operations, **kwargs):
+        target.update_one({"_id": 1}, {"$set": {"更新時間": datetime(2024, 3, next(ticks))}})
+        return bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(target, "bulk_write", racing_bulk_write)
+    stats = migrate_collections.migrate_range(target, client["TW_Stock"]["_migrations"],
+                                              migrate_collections.MIGRATIONS["revenue_keys"], 0, None, None,
+                                              retries=2)
+
+    assert stats["conflicts"] == 1 and stats["written"] == 0
+    assert migrate_collections.VERSION_FIELD not in target.find_one({"_id": 1})
+
+
+def test_checkpoint_prefix_is_escaped(client):
+    db = client["TW_Stock"]
+    db["營收(測試)"].insert_many([revenue_doc(i, str(i), datetime(2024, 2, 1)) for i in range(5)])
+    totals = migrate_collections.run_migration("revenue_keys", collection="營收(測試)", workers=0, parts=2,
+                                               client=client)
+    assert totals["written"] == 5
+    assert migrate_collections.reset_checkpoints("revenue_keys", client, collection="營收(測試)") == 2
+
+
+@pytest.mark.parametrize("value", ["Infinity", "-inf", "NaN", "sNaN", float("inf")])
+def test_typed_value_drops_non_finite(value):
+    assert typed_value(value) is None
+
+
+def test_mops1204_items_skips_non_finite_values():
+    doc = {"_id": 1, "stock_code": "2330", "year": "112", "season": "1",
+           "items": {"流動資產": "1,234", "每股淨值": "12.50", "異常": "Infinity"}}
+    migrated = migrate_collections.MIGRATIONS["mops1204_items"].transform(doc)
+    assert migrated["items"] == {"流動資產": 1234, "每股淨值": Decimal128("12.50")}
+    assert migrated["公司代號"] == "2330" and migrated["季別"] == 1
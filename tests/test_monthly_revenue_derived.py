@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import mongomock
+
+import monthly_revenue_scraper
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_touch_sys_path():
+    code = (
+        "import sys\n"
+        "before = list(sys.path)\n"
+        "import monthly_revenue_scraper\n"
+        "assert sys.path == before, set(sys.path) - set(before)\n"
+        "assert 'revenue_derived' not in sys.modules\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "TW_Stock"))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=ROOT_DIR, env=env)
+
+
+def make_scraper(monkeypatch, **kwargs):
+    monkeypatch.setattr(monthly_revenue_scraper, "MongoClient", mongomock.MongoClient)
+    monkeypatch.setenv("COVERAGE_INDEX", "0")
+    return monthly_revenue_scraper.MonthlyRevenueScraper(**kwargs)
+
+
+def test_derived_is_opt_in(monkeypatch):
+    monkeypatch.delenv("REVENUE_DERIVED", raising=False)
+    assert make_scraper(monkeypatch).derived is None
+    monkeypatch.setenv("REVENUE_DERIVED", "1")
+    assert make_scraper(monkeypatch).derived is not None
+
+
+def test_derived_tracks_written_records(monkeypatch):
+    scraper = make_scraper(monkeypatch, derived=True)
+    records = [{"公司代號": "2330", "年度": 113, "月份": month, "營業收入_當月營收": 100.0 + month}
+               for month in range(1, 4)]
+    assert scraper._save_revenue_records(records) == 3
+    assert scraper._flush_derived() == 3
+    doc = scraper.derived.get("2330", 2024, 3)
+    assert doc["營收"] == 103.0
+    assert round(doc["營收月增率"], 4) == round((103 - 102) / 102 * 100, 4)
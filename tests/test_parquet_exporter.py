@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+import parquet_exporter
+from parquet_exporter import ParquetExporter, read_collection
+
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_exporter, "MongoClient", mongomock.MongoClient)
+    exporter = ParquetExporter(output_dir=str(tmp_path), batch_size=2)
+    yield exporter
+    exporter.close()
+
+
+def _revenue(code, change):
+    return {"公司代號": code, "年度": 113, "月份": 1, "市場別": "sii", "營業收入_當月營收": 100.0, "增減": change}
+
+
+def test_mixed_type_batches_round_trip(exporter, tmp_path):
+    collection = exporter.db["每月營收"]
+    # 第一批全為數值、第二批含「不適用」、第三批又全為數值
+    collection.insert_many([
+        _revenue("1101", 1.5), _revenue("1102", 2.0),
+        _revenue("1103", "不適用"), _revenue("1104", "3"),
+        _revenue("1105", 4.5), _revenue("1106", -1.0),
+    ])
+    assert exporter.export_collection("每月營收") == 6
+
+    df = read_collection(str(tmp_path), "每月營收")
+    assert sorted(df["公司代號"]) == ["1101", "1102", "1103", "1104", "1105", "1106"]
+    changes = dict(zip(df["公司代號"], df["增減"]))
+    assert changes["1103"] == "不適用"
+    assert float(changes["1101"]) == 1.5 and float(changes["1105"]) == 4.5
+    assert df["營業收入_當月營收"].dtype.kind == "f"
+
+
+def test_incremental_id_export_appends(exporter, tmp_path):
+    collection = exporter.db["每月營收"]
+    collection.insert_many([_revenue("1101", 1.0), _revenue("1102", 2.0), _revenue("1103", 3.0)])
+    assert exporter.export_collection("每月營收") == 3
+    assert exporter.export_collection("每月營收") == 0
+
+    collection.insert_one(_revenue("1104", "不適用"))
+    assert exporter.export_collection("每月營收") == 1
+    assert len(read_collection(str(tmp_path), "每月營收")) == 4
+
+
+def test_updated_mode_checkpoints_time_and_id(exporter, tmp_path):
+    collection = exporter.db["上市櫃公司資產負債表"]
+    base = datetime(2024, 1, 1)
+    # _id 順序與 更新時間 順序相反：依 _id 掃描時中斷會漏掉較早的文件
+    collection.insert_many([
+        {"公司代號": str(1101 + i), "年度": 113, "季別": 1, "資產總額": float(i), "更新時間": base - timedelta(minutes=i)}
+        for i in range(5)
+    ])
+    assert exporter.export_collection("上市櫃公司資產負債表", mode="updated") == 5
+    state = exporter.state["上市櫃公司資產負債表"]
+    assert state["last_updated"] == base.isoformat()
+
+    # 同一 更新時間 的新文件以 _id 區分
+    collection.insert_one({"公司代號": "1200", "年度": 113, "季別": 1, "資產總額": 9.0, "更新時間": base})
+    assert exporter.export_collection("上市櫃公司資產負債表", mode="updated") == 1
+    assert exporter.export_collection("上市櫃公司資產負債表", mode="updated") == 0
+    assert len(read_collection(str(tmp_path), "上市櫃公司資產負債表")) == 6
+
+
+def test_updated_mode_refuses_collections_without_update_time(exporter):
+    exporter.db["每月營收"].insert_many([_revenue("1101", 1.0)])
+    assert exporter.export_collection("每月營收", mode="updated") == 0
+    assert "每月營收" not in exporter.state or not exporter.state["每月營收"].get("last_updated")
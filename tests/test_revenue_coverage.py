@@ -0,0 +1,62 @@
+import importlib.util
+import os
+
+import mongomock
+
+from revenue_coverage import RevenueCoverage
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeRevenue:
+    """記錄 aggregate 的 pipeline (mongomock 不支援 $setDifference)，依序回傳預設結果"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.pipelines = []
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        return iter(self.results.pop(0) if self.results else [])
+
+    def create_index(self, keys):
+        return "_".join(f"{field}_{order}" for field, order in keys)
+
+
+def companies(*docs):
+    collection = mongomock.MongoClient()["TW_Stock"]["公司基本資料"]
+    collection.insert_many([dict(doc) for doc in docs])
+    return collection
+
+
+def test_default_splits_by_market_and_checks_unassigned_companies():
+    company_col = companies({"stock_id": "2330", "market": "sii"}, {"stock_id": "6488", "market": "otc"},
+                            {"stock_id": "9999"})
+    revenue = FakeRevenue(
+        [{"_id": {"year": 2024, "month": 11, "market": "sii"}, "have": 1, "companies": 1, "missing": []}],
+        [{"_id": {"year": 2024, "month": 11}, "markets": {"sii": 1}, "have": 1, "companies": 1,
+          "missing": ["9999"]}],
+    )
+    rows = RevenueCoverage(revenue, company_col).report([(2024, 11)], markets=["sii", "otc"])
+
+    assert [(row["market"], row["missing"]) for row in rows] == [
+        ("otc", ["6488"]), ("sii", []), (None, ["9999"])]
+    split, unassigned = revenue.pipelines
+    assert split[0] == {"$match": {"$or": [{"year": 2024, "month": 11}], "market": {"$in": ["sii", "otc"]}}}
+    assert any("$switch" in str(stage) for stage in split)
+    assert unassigned[-3]["$project"]["_expected"] == {"$literal": ["9999"]}
+
+
+def test_revenue_crawler_checks_only_fetched_periods():
+    spec = importlib.util.spec_from_file_location(
+        "revenue_crawler", os.path.join(ROOT_DIR, "1126_pythonAPI", "revenue_crawler.py"))
+    revenue_crawler = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(revenue_crawler)
+
+    company_col = companies({"公司 代號": "2330"})
+    revenue = FakeRevenue()
+    revenue_crawler.check_data_coverage(revenue, company_col, {"11311", "11310"}, markets=["listed", "otc"])
+
+    assert len(revenue.pipelines) == 1
+    assert revenue.pipelines[0][0] == {"$match": {
+        "$or": [{"資料年月": "11310"}, {"資料年月": "11311"}], "市場別": {"$in": ["listed", "otc"]}}}
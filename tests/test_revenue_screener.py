@@ -0,0 +1,135 @@
+import math
+
+import mongomock
+import numpy as np
+import pytest
+
+import revenue_screener as rs
+
+
+def random_values(seed, rows=6, months=40, missing=0.1):
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(50, 150, size=(rows, months)).round()
+    values[rng.random(values.shape) < missing] = np.nan
+    return values
+
+
+def same(actual, expected):
+    np.testing.assert_allclose(actual, np.array(expected, dtype=float), equal_nan=True)
+
+
+def naive_rolling_sum(values, window):
+    out = np.full_like(values, np.nan)
+    for r in range(values.shape[0]):
+        for c in range(window - 1, values.shape[1]):
+            part = values[r, c - window + 1: c + 1]
+            if not np.isnan(part).any():
+                out[r, c] = part.sum()
+    return out
+
+
+def naive_year_to_date(values, start):
+    out = np.full_like(values, np.nan)
+    for r in range(values.shape[0]):
+        for c in range(values.shape[1]):
+            month = (start + c) % 12
+            if c - month < 0:
+                continue
+            part = values[r, c - month: c + 1]
+            if not np.isnan(part).any():
+                out[r, c] = part.sum()
+    return out
+
+
+def naive_streak(mask):
+    out = np.zeros(mask.shape)
+    for r in range(mask.shape[0]):
+        run = 0
+        for c in range(mask.shape[1]):
+            run = run + 1 if mask[r, c] else 0
+            out[r, c] = run
+    return out
+
+
+@pytest.mark.parametrize("window", [1, 3, 12, 40, 41])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_rolling_sum_matches_loop(window, seed):
+    values = random_values(seed)
+    same(rs.rolling_sum(values, window), naive_rolling_sum(values, window))
+
+
+def test_rolling_sum_needs_full_window():
+    values = np.array([[1.0, 2.0, np.nan, 4.0, 5.0, 6.0]])
+    same(rs.rolling_sum(values, 3), [[np.nan, np.nan, np.nan, np.nan, np.nan, 15.0]])
+
+
+@pytest.mark.parametrize("first_month", [1, 6, 12])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_year_to_date_matches_loop(first_month, seed):
+    start = rs.month_key(2020, first_month)
+    values = random_values(seed)
+    same(rs.year_to_date(values, start), naive_year_to_date(values, start))
+
+
+def test_year_to_date_resets_in_january():
+    start = rs.month_key(2023, 11)
+    values = np.array([[1.0, 2.0, 3.0, 4.0]])  # 2023-11 .. 2024-02
+    # 2023 is missing January-October, so its cumulative revenue is unknown
+    same(rs.year_to_date(values, start), [[np.nan, np.nan, 3.0, 7.0]])
+
+
+def test_streak_matches_loop():
+    rng = np.random.default_rng(3)
+    mask = rng.random((5, 30)) < 0.6
+    same(rs.streak(mask), naive_streak(mask))
+    same(rs.streak(np.array([[True, True, False, True, True, True]])), [[1, 2, 0, 1, 2, 3]])
+
+
+def test_yoy_streak_stops_at_missing_month():
+    values = np.array([[100.0] * 12 + [110.0, 120.0, np.nan, 130.0]])
+    same(rs.METRICS["yoy_streak"](values, 0)[0, 12:], [1, 2, 0, 1])
+
+
+def test_pct_change_and_yoy():
+    values = np.array([[0.0, 10.0, 15.0, np.nan, -20.0, -10.0]])
+    same(rs.mom(values), [[np.nan, np.nan, 50.0, np.nan, np.nan, 50.0]])
+    values = np.arange(1.0, 26.0).reshape(1, -1)
+    same(rs.yoy(values)[0, 12:], (values[0, 12:] - values[0, :13]) / values[0, :13] * 100)
+    assert np.isnan(rs.yoy(values)[0, :12]).all()
+
+
+def test_rank_keeps_nan():
+    same(rs.rank(np.array([3.0, np.nan, 5.0, 1.0])), [2, np.nan, 1, 3])
+    same(rs.rank(np.array([3.0, np.nan, 5.0, 1.0]), descending=False), [2, np.nan, 3, 1])
+
+
+def test_to_matrix():
+    cells = [("2330", rs.month_key(2024, 1), 10.0), ("2317", rs.month_key(2024, 3), 5.0)]
+    codes, start, values = rs.to_matrix(cells)
+    assert codes == ["2317", "2330"] and rs.month_of(start) == (2024, 1)
+    same(values, [[np.nan, np.nan, 5.0], [10.0, np.nan, np.nan]])
+
+
+def test_cube_reads_every_layout_and_screens(tmp_path):
+    collection = mongomock.MongoClient()["TW_Stock"]["每月營收"]
+    docs = []
+    for month in range(1, 13):
+        docs.append({"stockId": "2330", "year": 2023, "month": month, "營業收入": 100})
+        docs.append({"公司代號": "2317", "資料年月": f"112{month:02d}", "營業收入-當月營收": "200"})
+        docs.append({"公司代號": "1101", "年度": 112, "月份": month, "營業收入_當月營收": 50.0})
+    docs += [
+        {"stockId": "2330", "year": 2024, "month": 1, "營業收入": 150},
+        {"公司代號": "2317", "資料年月": "11301", "營業收入-當月營收": "1,80"},
+        {"公司代號": "1101", "年度": 113, "月份": 1, "營業收入_當月營收": 60.0},
+    ]
+    collection.insert_many(docs)
+
+    cube = rs.RevenueCube(str(tmp_path / "cube"))
+    assert cube.refresh(collection, full=True) == len(docs)
+    assert sorted(cube.codes) == ["1101", "2317", "2330"]
+
+    top = cube.top("yoy", 2024, 1, n=2)
+    assert [code for code, _ in top] == ["2330", "1101"]
+    assert math.isclose(top[0][1], 50.0) and math.isclose(top[1][1], 20.0)
+    assert cube.rank("yoy", 2024, 1) == {"2330": 1.0, "1101": 2.0, "2317": 3.0}
+    assert math.isclose(cube.cross_section("ttm", 2024, 1)[cube.codes.index("2330")], 1250.0)
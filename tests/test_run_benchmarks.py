@@ -0,0 +1,16 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_runner_loads_1126_modules(tmp_path):
+    # fetch_monthly_revenue 匯入同目錄的 revenue_coverage / revenue_derived，需在乾淨的行程中由 load_module 載入
+    output = tmp_path / "bench.json"
+    subprocess.run([sys.executable, os.path.join(ROOT_DIR, "benchmarks", "run_benchmarks.py"),
+                    "--only", "fetch_parse_html", "--repeat", "1", "--rows", "100", "--json", str(output)],
+                   check=True, cwd=tmp_path, stdout=subprocess.DEVNULL)
+    result = json.loads(output.read_text(encoding="utf-8"))["results"]["fetch_parse_html"]
+    assert "skipped" not in result and result["items"] > 0
@@ -0,0 +1,46 @@
+from io import StringIO
+
+import pandas as pd
+import pytest
+
+from fixtures import make_revenue_page, make_statement_page, read_saved_page
+from table_extractor import extract_tables
+
+CODE_KEYWORDS = ("公司代號", "公司 代號", "公司代碼", "股票代號")
+
+
+def _cell(value):
+    """read_html 會把數值欄位轉成數字，比較時兩邊都先轉成數值"""
+    text = str(value).replace(",", "").strip()
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _read_html_tables(html_content):
+    tables = pd.read_html(StringIO(html_content), keep_default_na=False, thousands=None)
+    return [df for df in tables if any(any(k in str(col) for k in CODE_KEYWORDS) for col in df.columns)]
+
+
+@pytest.mark.parametrize("html_content", [
+    make_statement_page(rows=50),
+    make_revenue_page(companies=60, industries=3),  # 兩層表頭 (rowspan / colspan)
+    read_saved_page("mops_page"),
+    read_saved_page("mops_playwright"),
+], ids=["statement", "t21sc03", "mops_page", "mops_playwright"])
+def test_matches_read_html(html_content):
+    ours = extract_tables(html_content, CODE_KEYWORDS)
+    expected = _read_html_tables(html_content)
+
+    assert len(ours) == len(expected) > 0
+    for table, df in zip(ours, expected):
+        assert list(table.columns) == list(df.columns)
+        assert [[_cell(v) for v in row] for row in table.rows] == \
+               [[_cell(v) for v in row] for row in df.values.tolist()]
+
+
+def test_skips_tables_without_code_column():
+    html_content = "<table><tr><th>項目</th></tr><tr><td>a</td></tr></table>"
+    assert extract_tables(html_content, CODE_KEYWORDS) == []
+    assert extract_tables("", CODE_KEYWORDS) == []